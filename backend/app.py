@@ -1,67 +1,253 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-from tensorflow.keras.models import load_model
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
-from PIL import Image
 import numpy as np
 import io
+import json
+import logging
 import os
 import sys
+import threading
+import time
+import zipfile
 from pathlib import Path
-from typing import List, Tuple, Dict, Union, Optional, Any
+from typing import Iterator, List, Tuple, Dict, Union, Optional, Any
 
 # Add shared directory to path for disease mapping
 sys.path.append(str(Path(__file__).parent.parent))
-from shared.disease_mapping import map_cnn_to_kb, get_human_readable_name
+from shared.knowledge_bundle import load_bundle
+from shared.metrics import CONTENT_TYPE, Registry, Trace
+from backend.batching import BULK, INTERACTIVE, MicroBatcher
+from backend.jobs import JobRunner, JobStore
+from backend.preprocessing import ImagePreprocessor
+from backend.prediction_cache import PredictionCache, model_version
+from backend.runtime import default_model_path, load_runtime, preload_imports
 
 app = Flask(__name__)
 CORS(app)
 
-MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'model', 'mainModel.keras')
+# MODEL_RUNTIME picks keras (default), tflite or onnx; see scripts/convert_model.py
+MODEL_RUNTIME = os.getenv('MODEL_RUNTIME', 'keras').lower()
+MODEL_PATH = os.getenv('MODEL_PATH') or str(default_model_path(MODEL_RUNTIME))
 IMAGE_SIZE: Tuple[int, int] = (224, 224)
-CLASS_NAMES: List[str] = [
-    'Tomato_Bacterial_spot',
-    'Tomato_Early_blight',
-    'Tomato_Late_blight',
-    'Tomato_Leaf_Mold',
-    'Tomato_Septoria_leaf_spot',
-    'Tomato_Spider_mites_Two-spotted_spider_mite',
-    'Tomato_Target_Spot',
-    'Tomato_Yellow_Leaf_Curl_Virus',
-    'Tomato_mosaic_virus',
-    'Tomato_healthy',
-    'Tomato_Leaf_Curl_Virus'
-]
+# Intra-op threads for the model; serve.py divides the cores between workers
+MODEL_THREADS = int(os.getenv('MODEL_THREADS', '0')) or None
 
+# Micro-batching: concurrent requests share one forward pass
+MAX_BATCH_SIZE = int(os.getenv('PREDICT_MAX_BATCH_SIZE', '16'))
+MAX_WAIT_MS = float(os.getenv('PREDICT_MAX_WAIT_MS', '10'))
+PREDICT_TIMEOUT_S = float(os.getenv('PREDICT_TIMEOUT_S', '30'))
+
+# /predict/batch limits
+BATCH_CHUNK_SIZE = int(os.getenv('PREDICT_BATCH_CHUNK_SIZE', str(MAX_BATCH_SIZE)))
+MAX_BATCH_FILES = int(os.getenv('PREDICT_MAX_BATCH_FILES', '500'))
+MAX_ARCHIVE_ENTRY_BYTES = 25 * 1024 * 1024
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+PREPROCESS_WORKERS = int(os.getenv('PREPROCESS_WORKERS', str(min(8, os.cpu_count() or 1))))
+
+# Prediction cache; set PREDICTION_CACHE_PATH to keep entries across restarts
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', '2048'))
+PREDICTION_CACHE_TTL_S = float(os.getenv('PREDICTION_CACHE_TTL_S', str(7 * 24 * 3600)))
+PREDICTION_CACHE_PATH = os.getenv('PREDICTION_CACHE_PATH') or None
+PREDICTION_CACHE_DISK_SIZE = int(os.getenv('PREDICTION_CACHE_DISK_SIZE', '100000'))
+
+# Async jobs (POST /jobs): a SQLite queue drained by in-process runner threads
+JOBS_PATH = os.getenv('JOBS_PATH', str(Path(__file__).parent / 'data' / 'jobs.sqlite'))
+JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', '1'))
+JOBS_MAX_FILES = int(os.getenv('JOBS_MAX_FILES', '5000'))
+JOBS_MAX_WAIT_S = float(os.getenv('JOBS_MAX_WAIT_S', '30'))
+JOBS_RETENTION_S = float(os.getenv('JOBS_RETENTION_S', str(24 * 3600)))
+
+# A failed model load is retried on the next request after MODEL_INIT_RETRY_S, doubling up to the max
+MODEL_INIT_RETRY_S = float(os.getenv('MODEL_INIT_RETRY_S', '5'))
+MODEL_INIT_RETRY_MAX_S = float(os.getenv('MODEL_INIT_RETRY_MAX_S', '300'))
+
+# TRACE_LOG=1 logs one JSON line per request with its stage timings
+TRACE_LOG = os.getenv('TRACE_LOG', '0').lower() in ('1', 'true', 'yes')
+
+# Loaded by init_backend(), not at import time, so importing this module is cheap
 model: Optional[Any] = None
-try:
-    if os.path.exists(MODEL_PATH):
-        model = load_model(MODEL_PATH)
-        app.logger.info(f"Model loaded from {MODEL_PATH}")
-    else:
-        app.logger.error(f"Model not found at {MODEL_PATH}")
-except Exception as e:
-    app.logger.error(f"Error loading model: {e}", exc_info=True)
-
-def preprocess_image(image_bytes: bytes) -> Optional[np.ndarray]:
-    # Prepare image for prediction
-    try:
-        img = Image.open(io.BytesIO(image_bytes))
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        img = img.resize(IMAGE_SIZE)
-        img_array = np.array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = preprocess_input(img_array)
-        return img_array
-    except Exception as e:
-        app.logger.error(f"Preprocessing error: {e}", exc_info=True)
-        return None
+startup: Dict[str, Any] = {'state': 'not_started', 'phasesMs': {}, 'error': None, 'attempts': 0, 'retryAt': None}
+_init_lock = threading.Lock()
+_started_at = time.time()
+
+def run_model(batch: np.ndarray) -> np.ndarray:
+    return model.predict(batch)
+
+def init_due() -> bool:
+    """Whether a load should start now: never tried, or failed and its backoff has passed."""
+    if startup['state'] == 'not_started':
+        return True
+    return startup['state'] == 'failed' and time.time() >= startup['retryAt']
+
+def init_backend(runtime: Optional[Any] = None) -> bool:
+    """Import the runtime, load the model and warm it up; returns readiness.
+
+    Runs once when it succeeds. After a failure it runs again only once the
+    retry backoff has passed.
+    """
+    global model
+    with _init_lock:
+        if startup['state'] == 'ready':
+            return True
+        if startup['state'] == 'failed' and not init_due():
+            return False
+        startup['state'] = 'loading'
+        startup['attempts'] += 1
+        startup['error'] = None
+        startup['retryAt'] = None
+        phases = startup['phasesMs'] = {}
+        began = time.perf_counter()
+        try:
+            if runtime is None:
+                t = time.perf_counter()
+                preload_imports(MODEL_RUNTIME)
+                phases['import'] = round((time.perf_counter() - t) * 1000, 1)
+
+                t = time.perf_counter()
+                runtime = load_runtime(MODEL_RUNTIME, MODEL_PATH, num_threads=MODEL_THREADS)
+                phases['loadModel'] = round((time.perf_counter() - t) * 1000, 1)
+                app.logger.info(f"Model loaded from {MODEL_PATH} ({MODEL_RUNTIME} runtime)")
+
+            # Trace/allocate every power-of-two batch shape the batcher can produce (TFLite pads to these)
+            t = time.perf_counter()
+            sizes = {1 << i for i in range((MAX_BATCH_SIZE - 1).bit_length() + 1)} | {MAX_BATCH_SIZE}
+            for size in sorted(sizes):
+                scores = runtime.predict(np.zeros((size, *IMAGE_SIZE, 3), dtype=np.float32))
+            if np.shape(scores)[-1] != len(knowledge):
+                app.logger.warning(f"Model has {np.shape(scores)[-1]} outputs but the knowledge bundle "
+                                   f"lists {len(knowledge)} classes")
+            phases['warmup'] = round((time.perf_counter() - t) * 1000, 1)
+
+            model = runtime
+            batcher.start()
+            if JOBS_WORKERS > 0:
+                job_runner.start()
+            startup['state'] = 'ready'
+        except Exception as e:
+            delay = min(MODEL_INIT_RETRY_MAX_S, MODEL_INIT_RETRY_S * 2 ** (startup['attempts'] - 1))
+            startup['state'] = 'failed'
+            startup['error'] = str(e)
+            startup['retryAt'] = time.time() + delay
+            app.logger.error(f"Error loading model (attempt {startup['attempts']}, retrying in {delay:.0f}s): {e}",
+                             exc_info=not isinstance(e, FileNotFoundError))
+        phases['total'] = round((time.perf_counter() - began) * 1000, 1)
+        app.logger.info(f"Backend startup {startup['state']}: " + ', '.join(f"{k}={v}ms" for k, v in phases.items()))
+        return startup['state'] == 'ready'
+
+def start_background_init() -> None:
+    """Kick off init_backend() without blocking, or a retry once a failed load's backoff has passed."""
+    with _init_lock:
+        if not init_due():
+            return
+        startup['state'] = 'scheduled'
+    threading.Thread(target=init_backend, name='backend-init', daemon=True).start()
+
+# Sent with "still loading" 503s so clients can tell a warming backend from a failing one
+WARMUP_RETRY_AFTER_S = 5
+
+def model_not_ready() -> Tuple[Any, int]:
+    if startup['state'] == 'failed':
+        return jsonify({'error': 'Model unavailable.'}), 500
+    response = jsonify({'error': 'Model is still loading, retry shortly.'})
+    response.headers['Retry-After'] = str(WARMUP_RETRY_AFTER_S)
+    return response, 503
+
+# Class table, knowledge slugs and management summaries (scripts/build_knowledge_bundle.py)
+knowledge = load_bundle()
+
+prediction_cache = PredictionCache(
+    # Payloads embed knowledge-base text, so a rebuilt bundle starts a fresh namespace
+    f'{model_version(MODEL_PATH)}+kb:{knowledge.version}',
+    max_entries=PREDICTION_CACHE_SIZE,
+    ttl_s=PREDICTION_CACHE_TTL_S,
+    disk_path=PREDICTION_CACHE_PATH,
+    disk_max_entries=PREDICTION_CACHE_DISK_SIZE,
+)
+
+preprocessor = ImagePreprocessor(IMAGE_SIZE, workers=PREPROCESS_WORKERS)
+
+batcher = MicroBatcher(
+    run_model,
+    input_shape=(*IMAGE_SIZE, 3),
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait_ms=MAX_WAIT_MS,
+)
+
+job_store = JobStore(JOBS_PATH, retention_s=JOBS_RETENTION_S)
+
+def process_job_chunk(chunk: List[Tuple[str, bytes]]) -> List[Dict[str, Any]]:
+    trace = new_trace('job')
+    payloads = classify_chunk(chunk, trace, priority=BULK)
+    trace.finish(images=len(chunk), failed=sum(1 for p in payloads if 'error' in p))
+    return payloads
+
+# One model-sized batch per claim; job images queue behind interactive /predict calls
+job_runner = JobRunner(job_store, process_job_chunk, batch_size=MAX_BATCH_SIZE, workers=JOBS_WORKERS)
+
+# --- Metrics (GET /metrics, Prometheus text format) ---
+metrics = Registry()
+stage_seconds = metrics.histogram(
+    'tomato_backend_stage_seconds', 'Time spent per request stage (decode, preprocess, forward, map...)',
+    ('kind', 'stage'),
+)
+request_seconds = metrics.histogram(
+    'tomato_backend_request_seconds', 'HTTP request latency until the response is returned',
+    ('endpoint', 'status'),
+)
+metrics.gauge('tomato_backend_model_ready', 'Whether the model is loaded and warmed up',
+              lambda: startup['state'] == 'ready')
+metrics.gauge('tomato_backend_batcher_queue_depth', 'Images waiting for a forward pass',
+              lambda: batcher.stats()['queueDepth'])
+metrics.gauge('tomato_backend_batcher_bulk_queue_depth', 'Bulk (batch and job) images waiting for a forward pass',
+              lambda: batcher.stats()['bulkQueueDepth'])
+metrics.gauge('tomato_backend_jobs_pending_images', 'Job images not yet claimed by a runner',
+              lambda: job_store.stats()['pendingImages'])
+metrics.gauge('tomato_backend_batcher_avg_batch_size', 'Mean images per forward pass',
+              lambda: batcher.stats()['avgBatchSize'])
+metrics.callback_counter('tomato_backend_batcher_requests_total', 'Images submitted to the batcher',
+              lambda: batcher.stats()['requestsTotal'])
+metrics.gauge('tomato_backend_prediction_cache_entries', 'Entries in the in-memory prediction cache',
+              lambda: prediction_cache.stats()['entries'])
+metrics.gauge('tomato_backend_prediction_cache_hit_rate', 'Prediction cache hit rate since start',
+              lambda: prediction_cache.stats()['hitRate'])
+
+if TRACE_LOG:
+    app.logger.setLevel(logging.INFO)
+
+def new_trace(kind: str) -> Trace:
+    return Trace(stage_seconds, kind, log=app.logger.info if TRACE_LOG else None)
+
+def build_prediction(probabilities: np.ndarray) -> Dict[str, Any]:
+    """Turn one row of class scores into the /predict response payload."""
+    predicted_class_index = int(np.argmax(probabilities))
+    confidence = float(probabilities[predicted_class_index])
+
+    # Check for valid prediction
+    if predicted_class_index >= len(knowledge):
+        raise IndexError(f"Class index {predicted_class_index} out of bounds.")
+
+    # Confidence threshold for valid leaf detection
+    if confidence < 0.7:
+        return {
+            'className': 'No leaf detected',
+            'message': 'Please upload a new photo with all leaf parts.'
+        }
+
+    predicted_class_name, kb_slug, human_name = knowledge.entry(predicted_class_index)
+    result = {
+        'className': predicted_class_name,
+        'kbSlug': kb_slug,
+        'humanName': human_name,
+        'confidence': round(confidence * 100, 2)
+    }
+    if kb_slug:
+        result['management'] = knowledge.management(kb_slug)
+    return result
 
 @app.route('/predict', methods=['POST'])
 def predict() -> Tuple[Any, int]:
     if model is None:
-        return jsonify({'error': 'Model unavailable.'}), 500
+        return model_not_ready()
 
     if 'file' not in request.files:
         return jsonify({'error': 'No file in request'}), 400
@@ -71,44 +257,252 @@ def predict() -> Tuple[Any, int]:
         return jsonify({'error': 'No selected file'}), 400
 
     if file:
+        trace = new_trace('predict')
+        # Filled in as the request goes; finished once below, whichever way it exits
+        fields: Dict[str, Any] = {}
         try:
             image_bytes = file.read()
-            preprocessed_img = preprocess_image(image_bytes)
-            if preprocessed_img is None:
-                return jsonify({'error': 'Image preprocessing failed'}), 500
+            fields['bytes'] = len(image_bytes)
+            with trace.stage('cache'):
+                cache_key = prediction_cache.key(image_bytes)
+                cached = prediction_cache.get(cache_key)
+            if cached is not None:
+                fields['cache'] = 'HIT'
+                response = jsonify(cached)
+                response.headers['X-Cache'] = 'HIT'
+                return response
 
-            predictions = model.predict(preprocessed_img)
-            predicted_class_index = np.argmax(predictions[0])
-            confidence = float(predictions[0][predicted_class_index])
+            fields['cache'] = 'MISS'
+            with preprocessor.buffer(1) as buf:
+                try:
+                    with trace.stage('decode'):
+                        img = preprocessor.decode(image_bytes)
+                    with trace.stage('preprocess'):
+                        preprocessor.preprocess_into(img, buf[0])
+                except Exception as e:
+                    app.logger.error(f"Preprocessing error: {e}", exc_info=True)
+                    fields['error'] = f'preprocessing: {e}'
+                    return jsonify({'error': 'Image preprocessing failed'}), 500
+                # Includes the micro-batching wait; /stats splits queue wait from forward time
+                with trace.stage('forward'):
+                    probabilities = batcher.predict(buf[0], timeout=PREDICT_TIMEOUT_S, priority=INTERACTIVE)
 
-            # Check for valid prediction
-            if predicted_class_index >= len(CLASS_NAMES):
-                app.logger.error(f"Class index {predicted_class_index} out of bounds.")
+            try:
+                with trace.stage('map'):
+                    result = build_prediction(probabilities)
+            except IndexError as e:
+                app.logger.error(str(e))
+                fields['error'] = str(e)
                 return jsonify({'error': 'Invalid class index.'}), 500
-
-            # Confidence threshold for valid leaf detection
-            if confidence < 0.7:
-                return jsonify({
-                    'className': 'No leaf detected',
-                    'message': 'Please upload a new photo with all leaf parts.'
-                })
-            else:
-                predicted_class_name = CLASS_NAMES[predicted_class_index]
-                kb_slug = map_cnn_to_kb(predicted_class_name)
-                human_name = get_human_readable_name(kb_slug) if kb_slug else predicted_class_name
-
-                return jsonify({
-                    'className': predicted_class_name,
-                    'kbSlug': kb_slug,
-                    'humanName': human_name,
-                    'confidence': round(confidence * 100, 2)
-                })
+            prediction_cache.put(cache_key, result)
+            fields['className'] = result['className']
+            response = jsonify(result)
+            response.headers['X-Cache'] = 'MISS'
+            return response
 
         except Exception as e:
             app.logger.error(f"Prediction error: {e}", exc_info=True)
+            fields['error'] = str(e)
             return jsonify({'error': f'Prediction error: {str(e)}'}), 500
+        finally:
+            trace.finish(**fields)
 
     return jsonify({'error': 'Unknown error'}), 500
 
+def collect_batch_uploads(limit: int = MAX_BATCH_FILES) -> List[Tuple[str, bytes]]:
+    """Gather (filename, bytes) pairs from `files` uploads and any zip archives."""
+    uploads: List[Tuple[str, bytes]] = []
+    for file in request.files.getlist('files') + request.files.getlist('archive'):
+        if not file or file.filename == '':
+            continue
+        data = file.read()
+        if zipfile.is_zipfile(io.BytesIO(data)):
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or Path(info.filename).suffix.lower() not in IMAGE_EXTENSIONS:
+                        continue
+                    if info.file_size > MAX_ARCHIVE_ENTRY_BYTES:
+                        raise ValueError(f"Archive entry {info.filename} is too large")
+                    uploads.append((info.filename, archive.read(info)))
+                    if len(uploads) > limit:
+                        break
+        else:
+            uploads.append((file.filename, data))
+        if len(uploads) > limit:
+            raise ValueError(f"Too many images; the limit is {limit}")
+    return uploads
+
+def classify_chunk(chunk: List[Tuple[str, bytes]], trace: Trace, priority: str = BULK) -> List[Dict[str, Any]]:
+    """Prediction payload (or {'error': ...}) for each (filename, bytes), sharing forward passes."""
+    items: List[Dict[str, Any]] = [{} for _ in chunk]
+    with trace.stage('cache'):
+        keys = [prediction_cache.key(data) for _, data in chunk]
+        misses = []
+        for offset, key in enumerate(keys):
+            cached = prediction_cache.get(key)
+            if cached is not None:
+                items[offset].update(cached)
+            else:
+                misses.append(offset)
+
+    if misses:
+        with preprocessor.buffer(len(misses)) as buf:
+            # Images decode and preprocess together, in parallel
+            with trace.stage('decode_preprocess'):
+                decode_errors = preprocessor.decode_many([chunk[offset][1] for offset in misses], buf)
+            futures = [batcher.submit(buf[i], priority) if err is None else None
+                       for i, err in enumerate(decode_errors)]
+
+            for i, (offset, future) in enumerate(zip(misses, futures)):
+                item, filename = items[offset], chunk[offset][0]
+                if future is None:
+                    app.logger.error(f"Preprocessing error for {filename}: {decode_errors[i]}")
+                    item['error'] = 'Image preprocessing failed'
+                    continue
+                try:
+                    with trace.stage('forward'):
+                        probabilities = future.result(PREDICT_TIMEOUT_S)
+                    with trace.stage('map'):
+                        result = build_prediction(probabilities)
+                except Exception as e:
+                    app.logger.error(f"Batch prediction error for {filename}: {e}", exc_info=True)
+                    item['error'] = f'Prediction error: {str(e)}'
+                    continue
+                prediction_cache.put(keys[offset], result)
+                item.update(result)
+    return items
+
+def stream_batch_predictions(uploads: List[Tuple[str, bytes]]) -> Iterator[str]:
+    """Yield one NDJSON line per image, flushing after each chunk of BATCH_CHUNK_SIZE."""
+    failed = 0
+    trace = new_trace('predict_batch')
+    for start in range(0, len(uploads), BATCH_CHUNK_SIZE):
+        chunk = uploads[start:start + BATCH_CHUNK_SIZE]
+        items = [
+            {'index': start + offset, 'filename': filename, **payload}
+            for offset, ((filename, _), payload) in enumerate(zip(chunk, classify_chunk(chunk, trace)))
+        ]
+        failed += sum(1 for item in items if 'error' in item)
+        lines = [json.dumps(item) + '\n' for item in items]
+        yield ''.join(lines)
+
+    trace.finish(images=len(uploads), failed=failed)
+    yield json.dumps({'done': True, 'total': len(uploads), 'failed': failed}) + '\n'
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch() -> Tuple[Any, int]:
+    if model is None:
+        return model_not_ready()
+
+    try:
+        uploads = collect_batch_uploads()
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({'error': str(e)}), 400
+    if not uploads:
+        return jsonify({'error': 'No images in request'}), 400
+
+    return Response(stream_batch_predictions(uploads), mimetype='application/x-ndjson'), 200
+
+@app.route('/jobs', methods=['POST'])
+def submit_job() -> Tuple[Any, int]:
+    """Queue images for classification in the background; answers 202 with a job id."""
+    if model is None:
+        return model_not_ready()
+
+    try:
+        uploads = collect_batch_uploads(limit=JOBS_MAX_FILES)
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({'error': str(e)}), 400
+    if not uploads:
+        return jsonify({'error': 'No images in request'}), 400
+
+    job_id = job_store.create(uploads)
+    job_runner.notify()
+    status_url = f'/jobs/{job_id}'
+    response = jsonify({'jobId': job_id, 'state': 'queued', 'total': len(uploads), 'statusUrl': status_url})
+    response.headers['Location'] = status_url
+    return response, 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id: str) -> Tuple[Any, int]:
+    """Progress and results after cursor `since`; `wait` long-polls for new results."""
+    try:
+        since = max(0, int(request.args.get('since', 0)))
+        limit = min(max(1, int(request.args.get('limit', 1000))), 1000)
+        wait = min(max(0.0, float(request.args.get('wait', 0))), JOBS_MAX_WAIT_S)
+    except ValueError:
+        return jsonify({'error': 'since, limit and wait must be numbers'}), 400
+
+    deadline = time.monotonic() + wait
+    progress = job_store.progress(job_id)
+    if progress is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    # Runners in this process wake us on progress; re-check the file for other workers
+    while progress[0] in ('queued', 'running') and progress[1] <= since:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        job_runner.wait_for_progress(min(remaining, 0.25))
+        progress = job_store.progress(job_id)
+
+    job = job_store.get(job_id, since=since, limit=limit)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job), 200
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id: str) -> Tuple[Any, int]:
+    if job_store.cancel(job_id):
+        return jsonify({'jobId': job_id, 'state': 'cancelled'}), 200
+    if job_store.progress(job_id) is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify({'error': 'Job already finished'}), 409
+
+@app.route('/stats', methods=['GET'])
+def stats() -> Tuple[Any, int]:
+    return jsonify({'batcher': batcher.stats(), 'predictionCache': prediction_cache.stats(),
+                    'jobs': job_store.stats()}), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint() -> Tuple[Any, int]:
+    return Response(metrics.render(), mimetype=None, content_type=CONTENT_TYPE), 200
+
+@app.before_request
+def ensure_initialized() -> None:
+    # Servers that import the app without calling init_backend() still get a model,
+    # and a failed load is retried in the background once its backoff has passed
+    if init_due():
+        start_background_init()
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response: Response) -> Response:
+    # Streamed responses (/predict/batch) are measured until the stream starts
+    started = g.pop('request_started', None)
+    if started is not None and request.url_rule is not None:
+        request_seconds.observe(time.perf_counter() - started,
+                                endpoint=request.url_rule.rule, status=response.status_code)
+    return response
+
+@app.route('/healthz', methods=['GET'])
+def healthz() -> Tuple[Any, int]:
+    """Liveness: the process is up and serving HTTP."""
+    return jsonify({'status': 'alive', 'uptimeSeconds': round(time.time() - _started_at, 1)}), 200
+
+@app.route('/readyz', methods=['GET'])
+def readyz() -> Tuple[Any, int]:
+    """Readiness: the model is loaded and warmed up."""
+    body = {'ready': startup['state'] == 'ready', 'runtime': MODEL_RUNTIME,
+            'knowledgeVersion': knowledge.version, **startup}
+    response = jsonify(body)
+    if body['ready']:
+        return response, 200
+    if startup['state'] != 'failed':
+        response.headers['Retry-After'] = str(WARMUP_RETRY_AFTER_S)
+    return response, 503
+
 if __name__ == '__main__':
+    # With debug=True the reloader's parent process only watches files; load in the child
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_init()
     app.run(debug=True, port=5000)
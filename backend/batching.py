@@ -0,0 +1,198 @@
+"""
+Dynamic micro-batching between the Flask routes and the CNN.
+
+Concurrent /predict requests each submit a single preprocessed image; a
+background thread gathers them into one batch (bounded by a max batch size
+and a max wait) so the model runs one forward pass per burst instead of one
+per request.
+
+Requests are either interactive (/predict) or bulk (batch uploads and async
+jobs). Each batch is filled from the interactive queue first, so a large job
+never makes a single upload wait behind it for more than one forward pass.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+PRIORITIES = (INTERACTIVE, BULK)
+
+
+class _PendingItem:
+    __slots__ = ('image', 'future', 'enqueued_at')
+
+    def __init__(self, image: np.ndarray) -> None:
+        self.image = image
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """Collects single-image requests into batches for one model call."""
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        input_shape: Tuple[int, ...],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError('max_batch_size must be >= 1')
+        self._predict_fn = predict_fn
+        self._input_shape = tuple(input_shape)
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        # Drained in PRIORITIES order
+        self._queues: Dict[str, Deque[_PendingItem]] = {p: deque() for p in PRIORITIES}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        # Reused for every forward pass; requests are copied into it
+        self._buffer = np.empty((max_batch_size, *self._input_shape), dtype=np.float32)
+
+        self._stats_lock = threading.Lock()
+        self._requests_total = 0
+        self._bulk_requests_total = 0
+        self._batches_total = 0
+        self._errors_total = 0
+        self._max_queue_depth = 0
+        self._batch_size_counts: Dict[int, int] = {}
+        self._wait_ms_total = 0.0
+        self._forward_ms_total = 0.0
+        self._last_forward_ms = 0.0
+
+    def start(self) -> None:
+        # Started lazily so the worker thread is created in the serving process
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, image: np.ndarray, priority: str = INTERACTIVE) -> Future:
+        """Queue one preprocessed image (H, W, C); the future resolves to its class scores."""
+        if image.shape != self._input_shape:
+            raise ValueError(f'Expected image of shape {self._input_shape}, got {image.shape}')
+        if priority not in self._queues:
+            raise ValueError(f'Unknown priority {priority!r}')
+        if not self._running:
+            self.start()
+        item = _PendingItem(image)
+        with self._cond:
+            self._queues[priority].append(item)
+            depth = self._pending()
+            self._cond.notify()
+        with self._stats_lock:
+            self._requests_total += 1
+            if priority == BULK:
+                self._bulk_requests_total += 1
+            self._max_queue_depth = max(self._max_queue_depth, depth)
+        return item.future
+
+    def predict(self, image: np.ndarray, timeout: Optional[float] = None, priority: str = INTERACTIVE) -> np.ndarray:
+        return self.submit(image, priority).result(timeout)
+
+    def _pending(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _collect(self) -> List[_PendingItem]:
+        with self._cond:
+            while self._running and not self._pending():
+                self._cond.wait()
+            if not self._pending():
+                return []
+            # Hold the batch open until it is full or the oldest request hits max_wait
+            oldest = min(q[0].enqueued_at for q in self._queues.values() if q)
+            deadline = oldest + self.max_wait_ms / 1000.0
+            while self._running and self._pending() < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            items: List[_PendingItem] = []
+            for priority in PRIORITIES:
+                queue = self._queues[priority]
+                while queue and len(items) < self.max_batch_size:
+                    items.append(queue.popleft())
+            return items
+
+    def _run(self) -> None:
+        while True:
+            items = self._collect()
+            if not items:
+                if not self._running:
+                    return
+                continue
+            self._process(items)
+
+    def _process(self, items: List[_PendingItem]) -> None:
+        n = len(items)
+        started = time.perf_counter()
+        try:
+            for i, item in enumerate(items):
+                self._buffer[i] = item.image
+            predictions = np.asarray(self._predict_fn(self._buffer[:n]))
+            if predictions.ndim < 1 or len(predictions) != n:
+                raise ValueError(f'Model returned {predictions.shape[:1] or "no"} rows for a batch of {n}')
+            for i, item in enumerate(items):
+                item.future.set_result(predictions[i].copy())
+        except Exception as e:
+            # An exception here would end the worker thread and hang every later request
+            for item in items:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            with self._stats_lock:
+                self._errors_total += 1
+            return
+        forward_ms = (time.perf_counter() - started) * 1000.0
+
+        wait_ms = sum((started - item.enqueued_at) * 1000.0 for item in items)
+        with self._stats_lock:
+            self._batches_total += 1
+            self._batch_size_counts[n] = self._batch_size_counts.get(n, 0) + 1
+            self._wait_ms_total += wait_ms
+            self._forward_ms_total += forward_ms
+            self._last_forward_ms = forward_ms
+
+    def queue_depth(self, priority: Optional[str] = None) -> int:
+        with self._cond:
+            return self._pending() if priority is None else len(self._queues[priority])
+
+    def stats(self) -> Dict[str, Any]:
+        depth = self.queue_depth()
+        bulk_depth = self.queue_depth(BULK)
+        with self._stats_lock:
+            batches = self._batches_total
+            served = sum(size * count for size, count in self._batch_size_counts.items())
+            return {
+                'maxBatchSize': self.max_batch_size,
+                'maxWaitMs': self.max_wait_ms,
+                'queueDepth': depth,
+                'bulkQueueDepth': bulk_depth,
+                'maxQueueDepth': self._max_queue_depth,
+                'requestsTotal': self._requests_total,
+                'bulkRequestsTotal': self._bulk_requests_total,
+                'batchesTotal': batches,
+                'errorsTotal': self._errors_total,
+                'batchSizeCounts': {str(k): v for k, v in sorted(self._batch_size_counts.items())},
+                'avgBatchSize': round(served / batches, 3) if batches else 0.0,
+                'avgQueueWaitMs': round(self._wait_ms_total / served, 3) if served else 0.0,
+                'avgForwardMs': round(self._forward_ms_total / batches, 3) if batches else 0.0,
+                'lastForwardMs': round(self._last_forward_ms, 3),
+            }
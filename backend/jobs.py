@@ -0,0 +1,362 @@
+"""
+Persistent queue for asynchronous classification jobs.
+
+POST /jobs stores every image of a submission in SQLite and returns a job id
+straight away; JobRunner threads inside each backend process claim pending
+images in model-sized batches, classify them and write the results back.
+Because the queue lives on disk, a job survives a backend restart: images
+claimed by a process that died are handed out again. Several gunicorn
+workers can drain the same file, since claiming is a single write
+transaction.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+# Item states; a job is done once no item is pending or claimed
+PENDING, CLAIMED, DONE, FAILED, CANCELLED = 'pending', 'claimed', 'done', 'failed', 'cancelled'
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS jobs ('
+    ' id TEXT PRIMARY KEY, created REAL NOT NULL, updated REAL NOT NULL, finished REAL,'
+    ' state TEXT NOT NULL, total INTEGER NOT NULL,'
+    ' completed INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0)',
+    'CREATE TABLE IF NOT EXISTS items ('
+    ' job_id TEXT NOT NULL, idx INTEGER NOT NULL, filename TEXT NOT NULL, data BLOB,'
+    ' state TEXT NOT NULL, result TEXT, seq INTEGER, claimed_by INTEGER, claimed_at REAL,'
+    ' PRIMARY KEY (job_id, idx))',
+    'CREATE INDEX IF NOT EXISTS items_pending ON items (state, job_id, idx)',
+    'CREATE INDEX IF NOT EXISTS items_seq ON items (job_id, seq)',
+)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists but belongs to someone else
+        return True
+    return True
+
+
+class JobStore:
+    """SQLite-backed jobs and their per-image items."""
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        claim_timeout_s: float = 300.0,
+        retention_s: float = 24 * 3600,
+    ) -> None:
+        self.path = Path(path)
+        self.claim_timeout_s = claim_timeout_s
+        self.retention_s = retention_s
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened lazily per process: a connection must not be shared across fork()
+        if self._db is None or self._db_pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            for statement in _SCHEMA:
+                db.execute(statement)
+            self._db, self._db_pid = db, os.getpid()
+        return self._db
+
+    def create(self, uploads: List[Tuple[str, bytes]]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                db.execute(
+                    'INSERT INTO jobs (id, created, updated, state, total) VALUES (?, ?, ?, ?, ?)',
+                    (job_id, now, now, 'queued', len(uploads)),
+                )
+                db.executemany(
+                    'INSERT INTO items (job_id, idx, filename, data, state) VALUES (?, ?, ?, ?, ?)',
+                    ((job_id, i, filename, data, PENDING) for i, (filename, data) in enumerate(uploads)),
+                )
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+        return job_id
+
+    def claim(self, limit: int) -> List[Tuple[str, int, str, bytes]]:
+        """Atomically take up to `limit` pending images, oldest job first."""
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                rows = db.execute(
+                    'SELECT job_id, idx, filename, data FROM items WHERE state = ? '
+                    'ORDER BY rowid LIMIT ?',
+                    (PENDING, limit),
+                ).fetchall()
+                db.executemany(
+                    'UPDATE items SET state = ?, claimed_by = ?, claimed_at = ? WHERE job_id = ? AND idx = ?',
+                    ((CLAIMED, os.getpid(), now, job_id, idx) for job_id, idx, _, _ in rows),
+                )
+                for job_id in {row[0] for row in rows}:
+                    db.execute(
+                        "UPDATE jobs SET state = 'running', updated = ? WHERE id = ? AND state = 'queued'",
+                        (now, job_id),
+                    )
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+        return rows
+
+    def complete(self, results: List[Tuple[str, int, Dict[str, Any]]]) -> None:
+        """Record (job_id, idx, payload) results; a payload with 'error' counts as failed."""
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                for job_id, idx, payload in results:
+                    failed = 'error' in payload
+                    # seq numbers results in completion order so pollers can ask for "since"
+                    updated = db.execute(
+                        'UPDATE items SET state = ?, result = ?, data = NULL, '
+                        ' seq = (SELECT completed + failed FROM jobs WHERE id = ?) + 1 '
+                        'WHERE job_id = ? AND idx = ? AND state = ?',
+                        (FAILED if failed else DONE, json.dumps(payload), job_id, job_id, idx, CLAIMED),
+                    ).rowcount
+                    if not updated:
+                        # Cancelled, or reclaimed by another process meanwhile
+                        continue
+                    db.execute(
+                        'UPDATE jobs SET completed = completed + ?, failed = failed + ?, updated = ? WHERE id = ?',
+                        (0 if failed else 1, 1 if failed else 0, now, job_id),
+                    )
+                    db.execute(
+                        "UPDATE jobs SET state = 'done', finished = ? "
+                        "WHERE id = ? AND state = 'running' AND completed + failed >= total",
+                        (now, job_id),
+                    )
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+
+    def get(self, job_id: str, since: int = 0, limit: int = 1000) -> Optional[Dict[str, Any]]:
+        """Job progress plus up to `limit` results finished after cursor `since`."""
+        with self._lock:
+            db = self._connection()
+            job = db.execute(
+                'SELECT created, updated, finished, state, total, completed, failed FROM jobs WHERE id = ?',
+                (job_id,),
+            ).fetchone()
+            if job is None:
+                return None
+            rows = db.execute(
+                'SELECT seq, idx, filename, result FROM items WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?',
+                (job_id, since, limit),
+            ).fetchall()
+        created, updated, finished, state, total, completed, failed = job
+        results = [{'index': idx, 'filename': filename, **json.loads(result)} for _, idx, filename, result in rows]
+        return {
+            'jobId': job_id,
+            'state': state,
+            'total': total,
+            'completed': completed,
+            'failed': failed,
+            'pending': total - completed - failed if state != 'cancelled' else 0,
+            'createdAt': created,
+            'updatedAt': updated,
+            'finishedAt': finished,
+            'results': results,
+            'next': rows[-1][0] if rows else since,
+        }
+
+    def progress(self, job_id: str) -> Optional[Tuple[str, int]]:
+        """(state, completed + failed) for cheap long-poll checks."""
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT state, completed + failed FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def cancel(self, job_id: str) -> bool:
+        """Drop the job's pending images; images already in a forward pass still report."""
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                updated = db.execute(
+                    "UPDATE jobs SET state = 'cancelled', updated = ?, finished = ? "
+                    "WHERE id = ? AND state IN ('queued', 'running')",
+                    (now, now, job_id),
+                ).rowcount
+                if updated:
+                    db.execute(
+                        'UPDATE items SET state = ?, data = NULL WHERE job_id = ? AND state = ?',
+                        (CANCELLED, job_id, PENDING),
+                    )
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+        return bool(updated)
+
+    def recover(self, include_self: bool = False) -> int:
+        """Return images claimed by dead processes (or stuck too long) to the queue.
+
+        include_self also releases this pid's claims; a restarted container can
+        reuse the pid of the process that died holding them.
+        """
+        cutoff = time.time() - self.claim_timeout_s
+        with self._lock:
+            db = self._connection()
+            claimed = db.execute(
+                'SELECT DISTINCT claimed_by FROM items WHERE state = ?', (CLAIMED,)
+            ).fetchall()
+            dead = [pid for (pid,) in claimed
+                    if (pid == os.getpid() and include_self) or (pid != os.getpid() and not _pid_alive(pid))]
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                released = db.execute(
+                    'UPDATE items SET state = ?, claimed_by = NULL, claimed_at = NULL '
+                    'WHERE state = ? AND (claimed_at < ? OR claimed_by IN (%s))' % ','.join('?' * len(dead)),
+                    (PENDING, CLAIMED, cutoff, *dead),
+                ).rowcount
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+        return released
+
+    def purge(self) -> int:
+        """Delete jobs that finished more than retention_s ago."""
+        cutoff = time.time() - self.retention_s
+        with self._lock:
+            db = self._connection()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                old = [row[0] for row in db.execute(
+                    'SELECT id FROM jobs WHERE finished IS NOT NULL AND finished < ?', (cutoff,)
+                )]
+                db.executemany('DELETE FROM items WHERE job_id = ?', ((job_id,) for job_id in old))
+                db.executemany('DELETE FROM jobs WHERE id = ?', ((job_id,) for job_id in old))
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+        return len(old)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            db = self._connection()
+            jobs = dict(db.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+            items = dict(db.execute(
+                'SELECT state, COUNT(*) FROM items WHERE state IN (?, ?) GROUP BY state', (PENDING, CLAIMED)
+            ).fetchall())
+        return {
+            'path': str(self.path),
+            'jobs': jobs,
+            'pendingImages': items.get(PENDING, 0),
+            'claimedImages': items.get(CLAIMED, 0),
+        }
+
+
+class JobRunner:
+    """Threads that drain a JobStore through `process(uploads) -> payloads`."""
+
+    def __init__(
+        self,
+        store: JobStore,
+        process: Callable[[List[Tuple[str, bytes]]], List[Dict[str, Any]]],
+        batch_size: int = 16,
+        workers: int = 1,
+        poll_s: float = 1.0,
+        maintenance_s: float = 60.0,
+    ) -> None:
+        self.store = store
+        self.process = process
+        self.batch_size = batch_size
+        self.workers = workers
+        self.poll_s = poll_s
+        self.maintenance_s = maintenance_s
+        self._wake = threading.Event()
+        self._progress = threading.Condition()
+        self._running = False
+        self._threads: List[threading.Thread] = []
+        self._last_maintenance = 0.0
+        self._maintenance_lock = threading.Lock()
+
+    def start(self) -> None:
+        if self._running:
+            return
+        # Nothing is in flight in this process yet, so its own old claims are stale
+        released = self.store.recover(include_self=True)
+        if released:
+            self._wake.set()
+        self._last_maintenance = time.monotonic()
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._loop, name=f'job-runner-{i}', daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._running = False
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self) -> None:
+        """Wake idle runners, e.g. right after a job was submitted."""
+        self._wake.set()
+
+    def wait_for_progress(self, timeout: float) -> None:
+        """Block until this process finishes a batch, or `timeout` passes."""
+        with self._progress:
+            self._progress.wait(timeout)
+
+    def _maintain(self) -> None:
+        with self._maintenance_lock:
+            if time.monotonic() - self._last_maintenance < self.maintenance_s:
+                return
+            self._last_maintenance = time.monotonic()
+        self.store.recover()
+        self.store.purge()
+
+    def _loop(self) -> None:
+        while self._running:
+            try:
+                self._maintain()
+                claimed = self.store.claim(self.batch_size)
+            except sqlite3.Error:
+                time.sleep(self.poll_s)
+                continue
+            if not claimed:
+                # Other processes' submissions are picked up on the next poll
+                self._wake.wait(self.poll_s)
+                self._wake.clear()
+                continue
+            try:
+                payloads = self.process([(filename, data) for _, _, filename, data in claimed])
+            except Exception as e:
+                payloads = [{'error': f'Prediction error: {str(e)}'}] * len(claimed)
+            self.store.complete([(job_id, idx, payload) for (job_id, idx, _, _), payload in zip(claimed, payloads)])
+            with self._progress:
+                self._progress.notify_all()
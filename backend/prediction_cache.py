@@ -0,0 +1,166 @@
+"""
+Prediction cache keyed by image content and model version.
+
+An in-memory LRU with TTL sits in front of an optional SQLite tier, so a
+re-uploaded photo skips decode and the forward pass entirely, including
+after a backend restart. The disk tier only keeps rows of the current model
+version (others are dropped when it is opened) and is pruned of expired rows
+and capped at disk_max_entries as it grows.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+
+def model_version(model_path: Union[str, Path]) -> str:
+    """Cheap fingerprint of the model file; changes whenever it is replaced."""
+    override = os.getenv('MODEL_VERSION')
+    if override:
+        return override
+    try:
+        st = os.stat(model_path)
+    except OSError:
+        return 'missing'
+    return f'{Path(model_path).name}:{st.st_size}:{int(st.st_mtime)}'
+
+
+class PredictionCache:
+    """LRU/TTL cache of /predict payloads with an optional on-disk tier."""
+
+    def __init__(
+        self,
+        model_version: str,
+        max_entries: int = 2048,
+        ttl_s: float = 7 * 24 * 3600,
+        disk_path: Optional[Union[str, Path]] = None,
+        disk_max_entries: int = 100_000,
+        prune_interval_s: float = 600.0,
+    ) -> None:
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.disk_path = Path(disk_path) if disk_path else None
+        self.disk_max_entries = disk_max_entries
+        self.prune_interval_s = prune_interval_s
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self._last_prune = 0.0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        # Opened lazily per process: a connection must not be shared across fork()
+        if self.disk_path is None:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            self.disk_path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(self.disk_path), check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS predictions '
+                '(key TEXT PRIMARY KEY, created REAL NOT NULL, payload TEXT NOT NULL, model_version TEXT)'
+            )
+            columns = {row[1] for row in db.execute('PRAGMA table_info(predictions)')}
+            if 'model_version' not in columns:
+                db.execute('ALTER TABLE predictions ADD COLUMN model_version TEXT')
+            db.execute('CREATE INDEX IF NOT EXISTS predictions_created ON predictions (created)')
+            # Keys hash the model version, so rows of any other version can never hit again
+            db.execute('DELETE FROM predictions WHERE model_version IS NOT ?', (self.model_version,))
+            db.commit()
+            self._db, self._db_pid = db, os.getpid()
+            self._prune(db, time.time())
+        return self._db
+
+    def _prune(self, db: sqlite3.Connection, now: float) -> None:
+        """Drop expired rows, then the oldest rows beyond disk_max_entries."""
+        self._last_prune = now
+        db.execute('DELETE FROM predictions WHERE created < ?', (now - self.ttl_s,))
+        db.execute(
+            'DELETE FROM predictions WHERE key IN '
+            '(SELECT key FROM predictions ORDER BY created DESC LIMIT -1 OFFSET ?)',
+            (self.disk_max_entries,),
+        )
+        db.commit()
+
+    def key(self, image_bytes: bytes) -> str:
+        h = hashlib.sha256(self.model_version.encode('utf-8'))
+        h.update(b'\0')
+        h.update(image_bytes)
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, payload = entry
+                if now - created <= self.ttl_s:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return payload
+                del self._entries[key]
+
+            db = self._connection()
+            if db is not None:
+                row = db.execute(
+                    'SELECT created, payload FROM predictions WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None:
+                    created, raw = row
+                    if now - created <= self.ttl_s:
+                        payload = json.loads(raw)
+                        self._remember(key, created, payload)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return payload
+                    db.execute('DELETE FROM predictions WHERE key = ?', (key,))
+                    db.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, payload: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, payload)
+            db = self._connection()
+            if db is not None:
+                db.execute(
+                    'INSERT OR REPLACE INTO predictions (key, created, payload, model_version) VALUES (?, ?, ?, ?)',
+                    (key, now, json.dumps(payload), self.model_version),
+                )
+                db.commit()
+                if now - self._last_prune >= self.prune_interval_s:
+                    self._prune(db, now)
+
+    def _remember(self, key: str, created: float, payload: Dict[str, Any]) -> None:
+        self._entries[key] = (created, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'modelVersion': self.model_version,
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'ttlSeconds': self.ttl_s,
+                'diskTier': str(self.disk_path) if self.disk_path else None,
+                'diskMaxEntries': self.disk_max_entries if self.disk_path else None,
+                'hits': self.hits,
+                'diskHits': self.disk_hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,101 @@
+"""
+Image decode/preprocess stage for the CNN.
+
+Uploads are decoded with JPEG draft mode (the decoder downsamples by 1/2..1/8
+while reading the DCT blocks, so a 12 MP photo never materializes at full
+size) and written straight into float32 batch buffers that are pooled and
+reused across requests. MobileNetV2 scaling is applied in place, so no
+TensorFlow import is needed here.
+"""
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+class BufferPool:
+    """Reusable float32 batch buffers, bucketed by power-of-two capacity."""
+
+    def __init__(self, image_shape: Tuple[int, ...], max_idle_per_bucket: int = 4) -> None:
+        self._image_shape = tuple(image_shape)
+        self._max_idle = max_idle_per_bucket
+        self._free: Dict[int, List[np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bucket(n: int) -> int:
+        return 1 << max(0, n - 1).bit_length()
+
+    def acquire(self, n: int) -> np.ndarray:
+        capacity = self._bucket(n)
+        with self._lock:
+            free = self._free.get(capacity)
+            if free:
+                return free.pop()
+        return np.empty((capacity, *self._image_shape), dtype=np.float32)
+
+    def release(self, buffer: np.ndarray) -> None:
+        with self._lock:
+            free = self._free.setdefault(buffer.shape[0], [])
+            if len(free) < self._max_idle:
+                free.append(buffer)
+
+
+class ImagePreprocessor:
+    """Decodes image bytes into MobileNetV2-ready float32 arrays."""
+
+    def __init__(self, image_size: Tuple[int, int] = (224, 224), workers: int = 4) -> None:
+        self.image_size = image_size
+        self.image_shape = (image_size[1], image_size[0], 3)
+        self.pool = BufferPool(self.image_shape)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='preprocess')
+
+    @contextmanager
+    def buffer(self, n: int) -> Iterator[np.ndarray]:
+        """Borrow a batch buffer with room for at least `n` images."""
+        buf = self.pool.acquire(n)
+        try:
+            yield buf
+        finally:
+            self.pool.release(buf)
+
+    def decode(self, image_bytes: bytes) -> Image.Image:
+        """Decode compressed bytes into a (possibly draft-downscaled) PIL image."""
+        img = Image.open(io.BytesIO(image_bytes))
+        if img.format == 'JPEG':
+            # Let libjpeg scale down during decode; keeps both sides >= image_size
+            img.draft('RGB', self.image_size)
+        img.load()
+        return img
+
+    def preprocess_into(self, img: Image.Image, out: np.ndarray) -> None:
+        """Convert, resize and scale a decoded image into `out` (H, W, 3) in [-1, 1]."""
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        if img.size != self.image_size:
+            img = img.resize(self.image_size)
+        out[...] = np.asarray(img)
+        # mobilenet_v2.preprocess_input: x / 127.5 - 1
+        out *= 1.0 / 127.5
+        out -= 1.0
+
+    def decode_into(self, image_bytes: bytes, out: np.ndarray) -> None:
+        """Decode one image into `out` (H, W, 3) scaled to [-1, 1]; raises on bad input."""
+        self.preprocess_into(self.decode(image_bytes), out)
+
+    def decode_many(self, images: Sequence[bytes], out: np.ndarray) -> List[Optional[str]]:
+        """Decode `images` in parallel into out[:len(images)]; returns per-image error or None."""
+        def work(i: int) -> Optional[str]:
+            try:
+                self.decode_into(images[i], out[i])
+                return None
+            except Exception as e:
+                return str(e) or type(e).__name__
+
+        if len(images) == 1:
+            return [work(0)]
+        return list(self._executor.map(work, range(len(images))))
@@ -0,0 +1,163 @@
+"""
+Inference runtimes the backend can serve the CNN from.
+
+All runtimes take a float32 batch (N, 224, 224, 3) already scaled by
+mobilenet_v2 preprocessing and return class probabilities (N, classes).
+Heavy imports happen inside the constructors so only the selected runtime
+is ever imported.
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import numpy as np
+
+MODEL_DIR = Path(__file__).resolve().parent.parent / 'model'
+DEFAULT_MODEL_FILES = {
+    'keras': 'mainModel.keras',
+    'tflite': 'mainModel.tflite',
+    'onnx': 'mainModel.onnx',
+}
+
+
+class KerasRuntime:
+    name = 'keras'
+
+    def __init__(self, path: Union[str, Path], num_threads: Optional[int] = None) -> None:
+        import tensorflow as tf
+        if num_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        self._model = tf.keras.models.load_model(str(path))
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self._model.predict(batch, verbose=0)
+
+
+class TFLiteRuntime:
+    """TFLite interpreter with one fixed-shape interpreter per power-of-two batch bucket.
+
+    resize_tensor_input + allocate_tensors re-plans every activation buffer,
+    so batches are zero-padded up to their bucket and the output sliced back
+    instead of resizing a single interpreter whenever the batch size changes.
+    The flatbuffer is memory-mapped, so extra buckets only cost activations.
+    """
+    name = 'tflite'
+
+    def __init__(self, path: Union[str, Path], num_threads: Optional[int] = None) -> None:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self._interpreter_cls = Interpreter
+        self._path = str(path)
+        self._num_threads = num_threads
+        self._buckets = {}
+        # Interpreter state is not thread-safe
+        self._lock = threading.Lock()
+        self._interpreter(1)
+
+    @staticmethod
+    def bucket(n: int) -> int:
+        return 1 << max(0, n - 1).bit_length()
+
+    def _interpreter(self, size: int) -> Any:
+        """The interpreter allocated for batches of exactly `size`, created on first use."""
+        if size not in self._buckets:
+            # model_path lets TFLite mmap the flatbuffer instead of copying it
+            interpreter = self._interpreter_cls(model_path=self._path, num_threads=self._num_threads)
+            input_details = interpreter.get_input_details()[0]
+            if int(input_details['shape'][0]) != size:
+                interpreter.resize_tensor_input(input_details['index'], [size, *input_details['shape'][1:]])
+            interpreter.allocate_tensors()
+            self._buckets[size] = (interpreter, interpreter.get_input_details()[0],
+                                   interpreter.get_output_details()[0])
+        return self._buckets[size]
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        n = batch.shape[0]
+        size = self.bucket(n)
+        with self._lock:
+            interpreter, input_details, output_details = self._interpreter(size)
+            x = batch
+            if size != n:
+                x = np.zeros((size, *batch.shape[1:]), dtype=batch.dtype)
+                x[:n] = batch
+            scale, zero_point = input_details['quantization']
+            if input_details['dtype'] != np.float32:
+                # Full-integer model: quantize the float input ourselves
+                info = np.iinfo(input_details['dtype'])
+                x = np.clip(np.round(x / scale + zero_point), info.min, info.max)
+            interpreter.set_tensor(input_details['index'], x.astype(input_details['dtype'], copy=False))
+            interpreter.invoke()
+            out = interpreter.get_tensor(output_details['index'])[:n]
+            scale, zero_point = output_details['quantization']
+            if output_details['dtype'] != np.float32:
+                return (out.astype(np.float32) - zero_point) * scale
+            return out.copy()
+
+
+class OnnxRuntime:
+    name = 'onnx'
+
+    def __init__(self, path: Union[str, Path], num_threads: Optional[int] = None) -> None:
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self._session = ort.InferenceSession(str(path), options, providers=['CPUExecutionProvider'])
+        self._input_name = self._session.get_inputs()[0].name
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self._session.run(None, {self._input_name: batch})[0]
+
+
+def preload_imports(kind: str, allow_tensorflow: bool = True) -> bool:
+    """Import the heavy modules behind runtime `kind` without loading a model.
+
+    With allow_tensorflow=False nothing that needs full TensorFlow is
+    imported (it starts threads and is not fork-safe); returns whether the
+    runtime's modules were imported.
+    """
+    kind = kind.lower()
+    if kind == 'keras':
+        if not allow_tensorflow:
+            return False
+        import tensorflow  # noqa: F401
+    elif kind == 'tflite':
+        try:
+            import tflite_runtime.interpreter  # noqa: F401
+        except ImportError:
+            if not allow_tensorflow:
+                return False
+            import tensorflow  # noqa: F401
+    elif kind == 'onnx':
+        import onnxruntime  # noqa: F401
+    return True
+
+
+RUNTIMES = {
+    'keras': KerasRuntime,
+    'tflite': TFLiteRuntime,
+    'onnx': OnnxRuntime,
+}
+
+
+def default_model_path(kind: str) -> Path:
+    if kind not in DEFAULT_MODEL_FILES:
+        raise ValueError(f"Unknown model runtime '{kind}'; choose one of {sorted(RUNTIMES)}")
+    return MODEL_DIR / DEFAULT_MODEL_FILES[kind]
+
+
+def load_runtime(kind: str, path: Optional[Union[str, Path]] = None, num_threads: Optional[int] = None) -> Any:
+    """Instantiate the runtime `kind` ('keras', 'tflite' or 'onnx') for the model at `path`."""
+    kind = kind.lower()
+    if kind not in RUNTIMES:
+        raise ValueError(f"Unknown model runtime '{kind}'; choose one of {sorted(RUNTIMES)}")
+    path = Path(path) if path else default_model_path(kind)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model not found at {path}")
+    return RUNTIMES[kind](path, num_threads=num_threads)
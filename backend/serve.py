@@ -0,0 +1,120 @@
+"""
+Production server for the backend API.
+
+    python backend/serve.py
+
+Runs the Flask app under gunicorn (Linux/macOS) with BACKEND_WORKERS
+processes and BACKEND_THREADS threads each, or under waitress on Windows.
+The app module is imported once in the gunicorn master and the workers are
+forked from it; each worker then loads and warms the model in the
+background (see /readyz). MODEL_RUNTIME defaults to tflite here when
+model/mainModel.tflite exists (scripts/convert_model.py): the interpreter
+memory-maps the model file, so every worker shares the same weight pages.
+Keras gives each worker a private copy of the weights, so it is served with
+a single worker. TensorFlow is never imported in the master (it is not
+fork-safe); only tflite_runtime or onnxruntime are preloaded there.
+
+Cores are divided between workers (MODEL_THREADS = cores // workers,
+inter-op parallelism 1) so that workers do not oversubscribe the CPU.
+"""
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict
+
+CPU_COUNT = os.cpu_count() or 1
+WORKERS = int(os.getenv('BACKEND_WORKERS', str(max(1, min(4, CPU_COUNT // 2)))))
+THREADS = int(os.getenv('BACKEND_THREADS', '4'))
+HOST = os.getenv('BACKEND_HOST', '0.0.0.0')
+PORT = int(os.getenv('BACKEND_PORT', '5000'))
+TIMEOUT_S = int(os.getenv('BACKEND_TIMEOUT_S', '120'))
+
+
+def tune_threads(workers: int) -> int:
+    """Pin math-library thread pools to this worker's share of the cores."""
+    per_worker = int(os.getenv('MODEL_THREADS', '0')) or max(1, CPU_COUNT // workers)
+    os.environ['MODEL_THREADS'] = str(per_worker)
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS'):
+        os.environ.setdefault(var, str(per_worker))
+    os.environ.setdefault('TF_NUM_INTEROP_THREADS', '1')
+    return per_worker
+
+
+def serve_gunicorn(workers: int, threads: int) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    class BackendApplication(BaseApplication):
+        def __init__(self, options: Dict[str, Any]) -> None:
+            self.options = options
+            super().__init__()
+
+        def load_config(self) -> None:
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self) -> Any:
+            from backend.app import MODEL_RUNTIME, app
+            from backend.runtime import preload_imports
+            # Lightweight runtimes are fork-safe to import; workers share these pages
+            preload_imports(MODEL_RUNTIME, allow_tensorflow=False)
+            return app
+
+    def post_fork(server: Any, worker: Any) -> None:
+        # Threads and model state are created per worker, never in the master
+        from backend.app import start_background_init
+        start_background_init()
+
+    BackendApplication({
+        'bind': f'{HOST}:{PORT}',
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'timeout': TIMEOUT_S,
+        'post_fork': post_fork,
+    }).run()
+
+
+def serve_waitress(threads: int) -> None:
+    from waitress import serve
+    from backend.app import app, init_backend
+    init_backend()
+    serve(app, host=HOST, port=PORT, threads=threads)
+
+
+def choose_runtime() -> str:
+    """MODEL_RUNTIME for production: as set, else tflite when a converted model exists, else keras."""
+    from backend.runtime import default_model_path
+    if not os.getenv('MODEL_RUNTIME'):
+        tflite = os.getenv('MODEL_PATH', '').endswith('.tflite') or default_model_path('tflite').exists()
+        os.environ['MODEL_RUNTIME'] = 'tflite' if tflite else 'keras'
+    return os.environ['MODEL_RUNTIME'].lower()
+
+
+def main() -> None:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    use_gunicorn = sys.platform != 'win32'
+    if use_gunicorn:
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            use_gunicorn = False
+
+    workers = WORKERS if use_gunicorn else 1
+    runtime = choose_runtime()
+    if runtime == 'keras' and workers > 1:
+        print(f"MODEL_RUNTIME=keras loads a private copy of the weights in every worker; serving with 1 worker "
+              f"instead of {workers}. Convert the model (python scripts/convert_model.py) and use "
+              f"MODEL_RUNTIME=tflite to run several workers on shared weights.")
+        workers = 1
+    per_worker = tune_threads(workers)
+    print(f"Serving on {HOST}:{PORT} with {'gunicorn' if use_gunicorn else 'waitress'} ({runtime} runtime): "
+          f"{workers} worker(s) x {THREADS} thread(s), {per_worker} model thread(s) per worker")
+    if use_gunicorn:
+        serve_gunicorn(workers, THREADS)
+    else:
+        serve_waitress(THREADS)
+
+
+if __name__ == '__main__':
+    main()
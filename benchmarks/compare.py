@@ -0,0 +1,68 @@
+"""
+Compare two benchmarks/run.py result files metric by metric.
+
+    python benchmarks/compare.py baseline.json candidate.json [--threshold 10]
+
+Latencies (*_ms, *_s) are better when lower, throughputs (*per_s) when
+higher. Changes beyond --threshold percent are flagged, and the exit status
+is 1 if any metric regressed by more than that.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def flatten(value, prefix=""):
+    """{dotted.path: number} for every numeric leaf; retrieval rows are keyed by size and index."""
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = ((f"{row.get('chunks')}-{row.get('index', {}).get('type')}" if isinstance(row, dict) else str(i), row)
+                 for i, row in enumerate(value))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    else:
+        return {}
+    flat = {}
+    for key, child in items:
+        flat.update(flatten(child, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def direction(name):
+    leaf = name.rsplit(".", 1)[-1]
+    if leaf.endswith("per_s"):
+        return 1
+    if leaf.endswith("_ms") or leaf.endswith("_s"):
+        return -1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent change to flag")
+    args = parser.parse_args()
+
+    old = flatten(json.loads(args.baseline.read_text(encoding="utf-8"))["results"])
+    new = flatten(json.loads(args.candidate.read_text(encoding="utf-8"))["results"])
+    regressions = 0
+    for name in sorted(old.keys() & new.keys()):
+        sign = direction(name)
+        if not sign or not old[name]:
+            continue
+        change = (new[name] - old[name]) / old[name] * 100.0
+        flag = ""
+        if abs(change) >= args.threshold:
+            better = change * sign > 0
+            flag = "better" if better else "WORSE"
+            regressions += not better
+        print(f"{name:<60} {old[name]:>12.3f} -> {new[name]:>12.3f}  {change:+7.1f}%  {flag}")
+    print(f"{regressions} metric(s) regressed by more than {args.threshold:.0f}%")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""
+Offline benchmark suite for the CNN backend, ingest, retrieval and full RAG turns.
+
+    python benchmarks/run.py                                  # all suites, defaults
+    python benchmarks/run.py --suites cnn --forward-ms 15     # mimic a 15 ms model
+    python benchmarks/run.py --suites retrieval --sizes 1000,10000,50000 --index flat,hnsw
+    python benchmarks/compare.py old.json new.json
+
+Nothing is downloaded: the CNN is a stub runtime passed to
+backend.app.init_backend(), embeddings are hash-based and the LLM is a stub
+(benchmarks/stubs.py). Numbers therefore measure this repo's code paths
+(HTTP handling, decoding, micro-batching, FAISS, BM25, SQLite docstore, chain
+plumbing), not model quality. Results, with environment details, are written
+as JSON to benchmarks/results/ so runs can be compared.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+for path in (ROOT, ROOT / "scripts", ROOT / "shared", ROOT / "frontend", Path(__file__).resolve().parent):
+    sys.path.insert(0, str(path))
+
+from stubs import QUERIES, HashEmbeddings, StubClassifier, StubLLMService, seeded_markdown, synthetic_chunks, synthetic_jpegs
+
+SUITES = ("cnn", "ingest", "retrieval", "rag")
+
+
+def summarize(latencies_s, elapsed_s=None):
+    """Count, throughput and latency percentiles (ms) for a list of per-operation seconds."""
+    ms = np.asarray(latencies_s, dtype=np.float64) * 1000.0
+    elapsed_s = elapsed_s if elapsed_s is not None else ms.sum() / 1000.0
+    return {
+        "count": int(ms.size),
+        "throughput_per_s": round(ms.size / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def timed_loop(fn, items):
+    latencies = []
+    started = time.perf_counter()
+    for item in items:
+        t = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+# --- CNN backend ---
+
+def bench_cnn(args, workdir):
+    # Every upload is distinct and the cache is off, so each request reaches the model
+    os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    os.environ.pop("PREDICTION_CACHE_PATH", None)
+    # A throwaway job queue nobody processes, so a real backend's jobs are never touched
+    os.environ["JOBS_PATH"] = str(workdir / "jobs.sqlite")
+    os.environ["JOBS_WORKERS"] = "0"
+    import backend.app as backend
+    from shared.disease_mapping import CLASS_NAMES
+    backend.app.logger.setLevel(logging.ERROR)
+
+    runtime = StubClassifier(len(CLASS_NAMES), forward_ms=args.forward_ms, per_image_ms=args.per_image_ms, seed=args.seed)
+    if not backend.init_backend(runtime=runtime):
+        raise SystemExit(f"Backend failed to start: {backend.startup['error']}")
+
+    total = max(args.requests, args.batch_images * args.batch_requests)
+    print(f"[cnn] generating {total} synthetic JPEGs...")
+    images = synthetic_jpegs(total, seed=args.seed)
+    results = {"forward_ms": args.forward_ms, "per_image_ms": args.per_image_ms}
+
+    with backend.preprocessor.buffer(1) as buf:
+        results["preprocess"] = timed_loop(lambda img: backend.preprocessor.decode_into(img, buf[0]), images[:args.requests])
+
+    local = threading.local()
+
+    def post(img):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = backend.app.test_client()
+        response = client.post("/predict", data={"file": (io.BytesIO(img), "leaf.jpg")}, content_type="multipart/form-data")
+        if response.status_code != 200:
+            raise RuntimeError(f"/predict returned {response.status_code}: {response.get_data(as_text=True)}")
+
+    print(f"[cnn] {args.requests} sequential /predict requests...")
+    results["predict_sequential"] = timed_loop(post, images[:args.requests])
+
+    print(f"[cnn] {args.requests} /predict requests from {args.concurrency} concurrent clients...")
+    before = backend.batcher.stats()
+    latencies = []
+    lock = threading.Lock()
+
+    def timed_post(img):
+        t = time.perf_counter()
+        post(img)
+        with lock:
+            latencies.append(time.perf_counter() - t)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(timed_post, images[:args.requests]))
+    after = backend.batcher.stats()
+    results["predict_concurrent"] = summarize(latencies, time.perf_counter() - started)
+    batches = after["batchesTotal"] - before["batchesTotal"]
+    results["predict_concurrent"]["concurrency"] = args.concurrency
+    results["predict_concurrent"]["avg_batch_size"] = round(
+        (after["requestsTotal"] - before["requestsTotal"]) / batches, 3) if batches else 0.0
+
+    print(f"[cnn] {args.batch_requests} /predict/batch requests of {args.batch_images} images...")
+    client = backend.app.test_client()
+
+    def post_batch(i):
+        chunk = images[i * args.batch_images:(i + 1) * args.batch_images]
+        files = [(io.BytesIO(img), f"leaf{j}.jpg") for j, img in enumerate(chunk)]
+        response = client.post("/predict/batch", data={"files": files}, content_type="multipart/form-data")
+        lines = response.get_data(as_text=True).strip().splitlines()
+        done = json.loads(lines[-1])
+        if response.status_code != 200 or done.get("failed"):
+            raise RuntimeError(f"/predict/batch failed: {lines[-1]}")
+
+    batch = timed_loop(post_batch, range(args.batch_requests))
+    batch["images_per_request"] = args.batch_images
+    batch["images_per_s"] = round(batch["throughput_per_s"] * args.batch_images, 2)
+    results["predict_batch"] = batch
+    backend.batcher.stop()
+    return results
+
+
+# --- Ingest ---
+
+def write_corpus(knowledge_dir, n_chunks, seed):
+    knowledge_dir.mkdir(parents=True, exist_ok=True)
+    chunks = synthetic_chunks(n_chunks, seed=seed)
+    per_file = 40
+    for start in range(0, len(chunks), per_file):
+        text = "\n\n".join(t for _, t in chunks[start:start + per_file])
+        (knowledge_dir / f"synthetic-{start // per_file:05d}.md").write_text(text, encoding="utf-8")
+
+
+def bench_ingest(args, workdir):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from embedding_pipeline import ChunkEmbedder, Throughput
+    from ingest import CHUNK_OVERLAP, CHUNK_SIZE, ChangePlan, empty_store, load_markdown_docs
+    from shared.keyword_index import build_keyword_index
+    from shared.vectorstore_io import DOCSTORE_FILE, save_store
+
+    knowledge_dir = workdir / "ingest-knowledge"
+    write_corpus(knowledge_dir, args.ingest_chunks, args.seed)
+    embeddings = HashEmbeddings()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    plan = ChangePlan(splitter, {})
+    embedder = ChunkEmbedder(embeddings, "hash", batch_size=args.batch_size)
+    throughput = Throughput()
+    vs = None
+    print(f"[ingest] chunking and indexing {args.ingest_chunks} synthetic passages...")
+    for batch, vectors in embedder.embed_stream(plan.new_chunks(load_markdown_docs(knowledge_dir))):
+        if vs is None:
+            vs = empty_store(embeddings, vectors.shape[1])
+        vs.add_embeddings(
+            [(doc.page_content, vec.tolist()) for doc, vec in zip(batch, vectors)],
+            metadatas=[doc.metadata for doc in batch],
+            ids=[doc.metadata["chunk_id"] for doc in batch],
+        )
+        throughput.add(len(batch))
+    embedder.close()
+
+    store_dir = workdir / "ingest-store"
+    t = time.perf_counter()
+    save_store(vs, store_dir)
+    save_s = time.perf_counter() - t
+    t = time.perf_counter()
+    build_keyword_index(store_dir / DOCSTORE_FILE)
+    keyword_s = time.perf_counter() - t
+    return {
+        "files": len(plan.files),
+        "chunks": throughput.chunks,
+        "chunks_per_s": round(throughput.chunks_per_s, 2),
+        "stream_s": round(throughput.elapsed, 3),
+        "save_s": round(save_s, 3),
+        "keyword_index_s": round(keyword_s, 3),
+    }
+
+
+# --- Retrieval ---
+
+def build_store(chunks, embeddings, store_dir, metadatas=None):
+    from ingest import empty_store
+    from shared.keyword_index import build_keyword_index
+    from shared.vectorstore_io import DOCSTORE_FILE, save_store
+
+    texts = [t for _, t in chunks]
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    vs = empty_store(embeddings, vectors.shape[1])
+    vs.add_embeddings(
+        [(text, vec.tolist()) for text, vec in zip(texts, vectors)],
+        metadatas=metadatas or [{"source": source} for source, _ in chunks],
+        ids=[f"chunk-{i}" for i in range(len(chunks))],
+    )
+    save_store(vs, store_dir)
+    build_keyword_index(store_dir / DOCSTORE_FILE)
+
+
+def approximate_index(index, kind):
+    from faiss_indexes import all_vectors, build_index, resolve_spec, set_search_param
+    spec = {"type": kind, "dim": index.d}
+    if kind == "ivf":
+        spec["nlist"] = 0
+    if kind == "hnsw":
+        spec.update(m=32, ef_construction=40)
+    spec = resolve_spec(spec, index.ntotal)
+    approx = build_index(all_vectors(index), spec)
+    # This index is private to the benchmark, so the frontend's default knobs can live on it
+    if kind == "ivf":
+        set_search_param(approx, "nprobe", 8)
+    if kind == "hnsw":
+        set_search_param(approx, "efSearch", 64)
+    return approx, spec
+
+
+def bench_retrieval(args, workdir):
+    from keyword_index import KeywordIndex
+    from rag_pipeline import hybrid_retrieve
+    from vectorstore_io import DOCSTORE_FILE, load_store
+
+    embeddings = HashEmbeddings()
+    query_vectors = [np.asarray(embeddings.embed_query(q), dtype=np.float32) for q in QUERIES]
+    queries = [(QUERIES[i % len(QUERIES)], query_vectors[i % len(QUERIES)]) for i in range(args.queries)]
+    rows = []
+    for size in args.sizes:
+        store_dir = workdir / f"retrieval-{size}"
+        print(f"[retrieval] building a {size}-chunk store...")
+        t = time.perf_counter()
+        build_store(synthetic_chunks(size, seed=args.seed), embeddings, store_dir)
+        build_s = time.perf_counter() - t
+        vs = load_store(store_dir, embeddings)
+        keywords = KeywordIndex.open(store_dir / DOCSTORE_FILE)
+        exact = vs.index
+        for kind in args.index:
+            spec = {"type": "flat"}
+            if kind != "flat":
+                try:
+                    vs.index, spec = approximate_index(exact, kind)
+                except ValueError as e:
+                    print(f"[retrieval] skipping {kind} at {size} chunks: {e}")
+                    continue
+            row = {"chunks": size, "index": spec, "build_s": round(build_s, 3)}
+            row["dense"] = timed_loop(
+                lambda q: vs.similarity_search_with_score_by_vector(q[1].tolist(), k=args.top_k), queries)
+            row["hybrid"] = timed_loop(
+                lambda q: hybrid_retrieve(vs, q[0], args.top_k, q[1], keyword_index=keywords), queries)
+            row["hybrid_filtered"] = timed_loop(
+                lambda q: hybrid_retrieve(vs, q[0], args.top_k, q[1], keyword_index=keywords,
+                                          source="early-blight.md"), queries)
+            rows.append(row)
+            print(f"[retrieval] {size:>7} chunks {spec['type']:<5} dense {row['dense']['throughput_per_s']:.0f} qps, "
+                  f"hybrid {row['hybrid']['throughput_per_s']:.0f} qps")
+        keywords.close()
+    return rows
+
+
+# --- Full RAG turn ---
+
+def bench_rag(args, workdir):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from context_assembly import assemble_context
+    from ingest import CHUNK_OVERLAP, CHUNK_SIZE
+    from keyword_index import KeywordIndex
+    from metrics import Registry, Trace
+    from rag_pipeline import answer_question, embed_query, hybrid_retrieve
+    from vectorstore_io import DOCSTORE_FILE, load_store
+
+    embeddings = HashEmbeddings()
+    store_dir = workdir / "rag-store"
+    # The seeded knowledge corpus, chunked the same way ingest does
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, add_start_index=True)
+    pieces = splitter.create_documents(list(seeded_markdown().values()),
+                                       [{"source": source} for source in seeded_markdown()])
+    chunks = [(piece.metadata["source"], piece.page_content) for piece in pieces]
+    build_store(chunks, embeddings, store_dir, metadatas=[piece.metadata for piece in pieces])
+    vs = load_store(store_dir, embeddings)
+    keywords = KeywordIndex.open(store_dir / DOCSTORE_FILE)
+    service = StubLLMService(latency_ms=args.llm_ms)
+    stages = Registry().histogram("bench_stage_seconds", "RAG turn stages", ("kind", "stage"))
+
+    per_stage = {}
+    totals = []
+    tokens = {"retrieved": [], "sent": []}
+    print(f"[rag] {args.queries} full turns over {len(chunks)} seeded chunks (stub LLM {args.llm_ms} ms)...")
+    for i in range(args.queries):
+        question = QUERIES[i % len(QUERIES)]
+        trace = Trace(stages, "rag")
+        with trace.stage("embed"):
+            embedding = embed_query(vs, question)
+        with trace.stage("search"):
+            retrieved = hybrid_retrieve(vs, question, args.top_k, embedding, keyword_index=keywords)
+        with trace.stage("context"):
+            context = assemble_context(retrieved, budget=args.context_budget)
+        tokens["retrieved"].append(context.tokens_in)
+        tokens["sent"].append(context.tokens_out)
+        answer_question(service, "You are TomatoDoc.", question, context.retrieved, trace=trace)
+        totals.append(trace.finish())
+        for name, seconds in trace.stages.items():
+            per_stage.setdefault(name, []).append(seconds)
+    keywords.close()
+    return {
+        "chunks": len(chunks),
+        "llm_ms": args.llm_ms,
+        "context_budget": args.context_budget,
+        "context_tokens": {kind: round(float(np.mean(values)), 1) for kind, values in tokens.items()},
+        "turn": summarize(totals),
+        "stages": {name: summarize(values) for name, values in per_stage.items()},
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    try:
+        import faiss
+        faiss_version = faiss.__version__
+    except ImportError:
+        faiss_version = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "faiss": faiss_version,
+    }
+
+
+def csv_list(cast):
+    return lambda value: [cast(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks (stub model, embeddings and LLM).")
+    parser.add_argument("--suites", type=csv_list(str), default=list(SUITES), help=f"Comma list of {','.join(SUITES)}")
+    parser.add_argument("--out", type=Path, help="Result JSON (default benchmarks/results/bench-<time>.json)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=200, help="/predict requests per phase")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent /predict clients")
+    parser.add_argument("--batch-images", type=int, default=32, help="Images per /predict/batch request")
+    parser.add_argument("--batch-requests", type=int, default=10)
+    parser.add_argument("--forward-ms", type=float, default=0.0, help="Extra stub model cost per forward pass")
+    parser.add_argument("--per-image-ms", type=float, default=0.0, help="Extra stub model cost per image")
+    parser.add_argument("--ingest-chunks", type=int, default=5000, help="Synthetic passages to ingest (re-chunked at 800 chars)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Ingest embedding batch size")
+    parser.add_argument("--sizes", type=csv_list(int), default=[1000, 10000], help="Retrieval corpus sizes")
+    parser.add_argument("--index", type=csv_list(str), default=["flat"], help="Retrieval index types (flat,ivf,hnsw)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per retrieval/RAG measurement")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--llm-ms", type=float, default=0.0, help="Stub LLM latency per answer")
+    parser.add_argument("--context-budget", type=int, default=1500, help="Prompt context token budget (0 = none)")
+    args = parser.parse_args()
+
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suites: {', '.join(sorted(unknown))}")
+    out = args.out or ROOT / "benchmarks" / "results" / f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+
+    report = {"environment": environment(), "args": {k: v for k, v in vars(args).items() if k != "out"}, "results": {}}
+    with tempfile.TemporaryDirectory(prefix="tomato-bench-") as tmp:
+        workdir = Path(tmp)
+        if "cnn" in args.suites:
+            report["results"]["cnn"] = bench_cnn(args, workdir)
+        if "ingest" in args.suites:
+            report["results"]["ingest"] = bench_ingest(args, workdir)
+        if "retrieval" in args.suites:
+            report["results"]["retrieval"] = bench_retrieval(args, workdir)
+        if "rag" in args.suites:
+            report["results"]["rag"] = bench_rag(args, workdir)
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    results = report["results"]
+    if "cnn" in results:
+        for name in ("preprocess", "predict_sequential", "predict_concurrent"):
+            r = results["cnn"][name]
+            print(f"{name:<20} {r['throughput_per_s']:>9.1f}/s  p50 {r['p50_ms']:.2f}  p95 {r['p95_ms']:.2f}  p99 {r['p99_ms']:.2f} ms")
+        print(f"{'predict_batch':<20} {results['cnn']['predict_batch']['images_per_s']:>9.1f} images/s")
+    if "ingest" in results:
+        print(f"{'ingest':<20} {results['ingest']['chunks_per_s']:>9.1f} chunks/s ({results['ingest']['chunks']} chunks)")
+    if "rag" in results:
+        r = results["rag"]["turn"]
+        print(f"{'rag_turn':<20} {r['throughput_per_s']:>9.1f}/s  p50 {r['p50_ms']:.2f}  p95 {r['p95_ms']:.2f}  p99 {r['p99_ms']:.2f} ms")
+        t = results["rag"]["context_tokens"]
+        print(f"{'rag_context':<20} {t['retrieved']:>9.1f} -> {t['sent']:.1f} prompt tokens per turn")
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
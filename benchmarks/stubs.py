@@ -0,0 +1,152 @@
+"""
+Offline stand-ins for the heavy dependencies, so benchmarks need no model
+files, no network and no GPU:
+
+    StubClassifier   runtime for backend.app.init_backend(): a fixed random
+                     projection of pooled pixels + softmax (optional extra
+                     per-forward cost to mimic a real model)
+    HashEmbeddings   deterministic bag-of-hashed-words embeddings (384-dim,
+                     normalized) in place of MiniLM
+    StubLLMService   build_rag_chain() compatible service whose "LLM" formats
+                     the prompt and returns a canned answer after a delay
+
+plus synthetic JPEG uploads and a corpus grown from the seeded knowledge files.
+"""
+import hashlib
+import io
+import re
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import RunnableLambda
+
+EMBEDDING_DIM = 384
+
+
+class StubClassifier:
+    """Runtime with the backend's predict(batch) -> probabilities contract."""
+
+    def __init__(self, num_classes, forward_ms=0.0, per_image_ms=0.0, seed=0):
+        rng = np.random.default_rng(seed)
+        self.weights = rng.normal(size=(8 * 8 * 3, num_classes)).astype(np.float32)
+        self.forward_ms = forward_ms
+        self.per_image_ms = per_image_ms
+
+    def predict(self, batch):
+        n, h, w, c = batch.shape
+        pooled = batch[:, : h - h % 8, : w - w % 8].reshape(n, 8, h // 8, 8, w // 8, c).mean(axis=(2, 4))
+        # Sharp logits so most images clear the backend's 0.7 confidence threshold
+        logits = 40.0 * pooled.reshape(n, -1) @ self.weights
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        delay = (self.forward_ms + self.per_image_ms * n) / 1000.0
+        if delay:
+            time.sleep(delay)
+        return probs
+
+
+def synthetic_jpegs(count, size=(640, 480), seed=0):
+    """Distinct JPEG payloads (so the prediction cache never hits)."""
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        base = rng.integers(0, 256, size=3)
+        pixels = np.clip(rng.normal(base, 40, size=(size[1], size[0], 3)), 0, 255).astype(np.uint8)
+        out = io.BytesIO()
+        Image.fromarray(pixels).save(out, format="JPEG", quality=90)
+        images.append(out.getvalue())
+    return images
+
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class HashEmbeddings(Embeddings):
+    """Each word hashes to a fixed random unit vector; a text is their normalized sum."""
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self._cache = {}
+
+    def _word(self, word):
+        vec = self._cache.get(word)
+        if vec is None:
+            seed = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+            vec = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            self._cache[word] = vec
+        return vec
+
+    def _embed(self, text):
+        words = _WORD.findall(text.lower()) or ["<empty>"]
+        vec = np.sum([self._word(w) for w in words], axis=0)
+        return (vec / (np.linalg.norm(vec) or 1.0)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class StubLLMService:
+    """Mimics the Hugging Face service: the chain builds the prompt, then 'generates'."""
+
+    def __init__(self, latency_ms=0.0, answer_words=120):
+        self.latency_ms = latency_ms
+        self.answer = " ".join(["token"] * answer_words)
+
+    def build_rag_chain(self, retriever, system_prompt):
+        def run(question):
+            docs = retriever.invoke(question)
+            context = "\n\n".join(f"Source {i} ({d.metadata.get('source', 'unknown')}):\n{d.page_content}"
+                                  for i, d in enumerate(docs, start=1))
+            prompt = f"{system_prompt}\n\nContext:\n{context}\n\nQuestion: {question}"
+            if self.latency_ms:
+                time.sleep(self.latency_ms / 1000.0)
+            return f"{self.answer} ({len(prompt)} prompt chars)"
+
+        return RunnableLambda(run)
+
+
+def seeded_markdown():
+    """{filename: markdown} for the curated knowledge files from scripts/seed_knowledge.py."""
+    from seed_knowledge import DISEASES, to_markdown
+    return {f"{d['slug']}.md": to_markdown(d) for d in DISEASES}
+
+
+def synthetic_chunks(count, seed=0):
+    """`count` (source, text) pairs built by recombining sentences of the seeded corpus."""
+    rng = np.random.default_rng(seed)
+    files = seeded_markdown()
+    sentences = [
+        (source, s.strip(" -#*"))
+        for source, text in files.items()
+        for s in re.split(r"\\n|\n|(?<=[.;])\s+", text)
+        if len(s.strip(" -#*")) > 20
+    ]
+    chunks = []
+    for i in range(count):
+        picks = rng.choice(len(sentences), size=6, replace=False)
+        source = sentences[picks[0]][0]
+        text = " ".join(sentences[p][1] for p in picks)
+        chunks.append((source, f"{text} (variant {i})"))
+    return chunks
+
+
+QUERIES = [
+    "brown spots with concentric rings on lower leaves",
+    "how do I treat early blight",
+    "water soaked lesions spreading fast in cool wet weather",
+    "which fungicide works for late blight",
+    "small circular spots with dark borders and gray centers",
+    "yellow mosaic pattern and distorted leaves",
+    "bacterial spot copper spray",
+    "leaves curling upward in hot weather",
+    "how to prevent septoria leaf spot",
+    "is tomato mosaic virus spread by tools",
+    "crop rotation for fungal diseases",
+    "mulch and drip irrigation to reduce leaf wetness",
+]
@@ -0,0 +1,103 @@
+"""
+Question/answer cache for the chatbot.
+
+Lookups try an exact match on the normalized question first, then a
+near-duplicate match on the MiniLM query embedding. Both are scoped by the
+settings that change the answer (model, strict mode, top-k, search and
+index tuning, context budget, CNN context prefix).
+Entries are tied to a vectorstore version and dropped when the store is
+rebuilt.
+"""
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_question(text: str) -> str:
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    retrieved: List[Tuple[Any, float]]
+    embedding: Optional[np.ndarray]
+    scope: Tuple
+
+
+class AnswerCache:
+    """Bounded LRU of answers, shared by all sessions in the Streamlit process."""
+
+    def __init__(self, max_entries: int = 256, similarity_threshold: float = 0.95) -> None:
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[Tuple, CachedAnswer]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self.lookups = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.invalidations = 0
+
+    def sync_version(self, version: str) -> None:
+        """Drop every entry if the vectorstore changed since they were cached."""
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._version = version
+
+    def lookup(self, question: str, scope: Tuple, embedding: Optional[np.ndarray] = None) -> Tuple[Optional[CachedAnswer], str]:
+        """Return (entry, "exact" | "semantic") on a hit, (None, "") on a miss."""
+        key = (normalize_question(question), scope)
+        with self._lock:
+            self.lookups += 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry, "exact"
+
+            if embedding is not None:
+                best_key, best_sim = None, self.similarity_threshold
+                for k, candidate in self._entries.items():
+                    if candidate.scope != scope or candidate.embedding is None:
+                        continue
+                    # Embeddings are L2-normalized, so the dot product is cosine similarity
+                    sim = float(np.dot(candidate.embedding, embedding))
+                    if sim >= best_sim:
+                        best_key, best_sim = k, sim
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.semantic_hits += 1
+                    return self._entries[best_key], "semantic"
+        return None, ""
+
+    def store(self, question: str, scope: Tuple, embedding: Optional[np.ndarray], answer: str,
+              retrieved: List[Tuple[Any, float]]) -> None:
+        key = (normalize_question(question), scope)
+        vector = None if embedding is None else np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._entries[key] = CachedAnswer(question, answer, list(retrieved), vector, scope)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            return {
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "hit_rate": hits / self.lookups if self.lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
@@ -1,21 +1,31 @@
 import os
-import requests
 from pathlib import Path
 from dotenv import load_dotenv
 import streamlit as st
-from langchain_community.vectorstores import FAISS
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 import sys
+from concurrent.futures import ThreadPoolExecutor
 import torch
 from pathlib import Path
 
 # Add shared directory to path for disease mapping
 sys.path.append(str(Path(__file__).resolve().parent.parent / 'shared'))
 from disease_mapping import format_cnn_prediction_for_prompt
+from knowledge_bundle import load_bundle
+from keyword_index import KeywordIndex
+from metrics import Registry, Trace, start_metrics_server
+from vectorstore_io import DOCSTORE_FILE, load_store
+from vectorstore_layout import current_store_dir, store_version
 from huggingface_service import get_huggingface_service, set_huggingface_model
+from rag_pipeline import GenerationStats, answer_question, embed_query, hybrid_retrieve, stream_answer
+from answer_cache import AnswerCache
+from context_assembly import DEFAULT_TOKEN_BUDGET, DEFAULT_TOKENIZER, assemble_context, format_docs
+from diagnosis import diagnose
+from quick_answers import quick_answer
+from backend_client import BackendClient, BackendError, BackendUnavailable, BackendWarmingUp
 
 # --- Config ---
 dotenv_path = Path(__file__).resolve().parent.parent / ".env"
@@ -47,7 +57,19 @@ with st.sidebar:
     huggingface_model = os.getenv("HUGGINGFACE_MODEL", "microsoft/DialoGPT-medium")
     st.text_input("Hugging Face Model", value=huggingface_model, key="huggingface_model")
     top_k = st.slider("Top-k documents", min_value=2, max_value=8, value=4, step=1)
+    # Merged, de-duplicated context is cut to this many prompt tokens (0 = no limit)
+    context_budget = st.number_input("Context token budget", min_value=0, max_value=8000, step=100,
+                                     value=int(os.getenv("CONTEXT_TOKEN_BUDGET", str(DEFAULT_TOKEN_BUDGET))))
     strict_mode = st.checkbox("Strict mode (say 'I don't know' if unsure)", value=True)
+    stream_mode = st.checkbox("Stream answers as they are generated", value=True)
+    hybrid_mode = st.checkbox("Hybrid keyword + vector search", value=True)
+    direct_lookups = st.checkbox("Answer simple lookups directly (no LLM)", value=True)
+    with st.expander("Search tuning (approximate indexes)"):
+        # Only used when scripts/ingest.py built an IVF or HNSW index; see index_report.json
+        nprobe = st.number_input("IVF nprobe", min_value=1, max_value=1024,
+                                 value=int(os.getenv("VECTORSTORE_NPROBE", "8")))
+        ef_search = st.number_input("HNSW efSearch", min_value=8, max_value=2048,
+                                    value=int(os.getenv("VECTORSTORE_EF_SEARCH", "64")))
     backend_url = os.getenv("BACKEND_URL", "http://localhost:5000")
     st.markdown("---")
     st.subheader("Image Analysis")
@@ -56,32 +78,68 @@ with st.sidebar:
         st.session_state.messages = []
 
 # --- Vectorstore Loader ---
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+def vectorstore_version(path):
+    """Changes whenever scripts/ingest.py publishes a new store, so cached loads go stale."""
+    return store_version(path)
+
+# cache_resource objects are shared by every session in this Streamlit process
+@st.cache_resource(show_spinner=False)
+def get_embeddings(model_name):
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    model_kwargs = {"device": "cpu"}
+    encode_kwargs = {"normalize_embeddings": True}
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=model_kwargs,
+        encode_kwargs=encode_kwargs
+    )
+
+@st.cache_resource(max_entries=2, show_spinner="Loading knowledge base...")
+def get_vectorstore(path, version, model_name):
+    # `version` is only part of the cache key; a rebuilt index gets a fresh entry
+    # index.faiss is memory-mapped and chunk text is read from SQLite on demand,
+    # so Streamlit processes share one copy of the index via the page cache
+    print(f"Loading vector store from: {path}")
+    vs = load_store(path, get_embeddings(model_name))
+    print("Vector store loaded successfully.")
+    return vs
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_keyword_index(path, version):
+    # None for stores ingested before BM25 postings were added; search is then dense-only
+    return KeywordIndex.open(Path(path) / DOCSTORE_FILE)
+
+def current_keyword_index():
+    if not hybrid_mode:
+        return None
+    return get_keyword_index(str(current_store_dir(VECTORSTORE_PATH)), vectorstore_version(VECTORSTORE_PATH))
+
 def load_vectorstore():
     try:
-        from langchain_community.embeddings import HuggingFaceEmbeddings
-        model_kwargs = {"device": "cpu"}
-        encode_kwargs = {"normalize_embeddings": True}
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-            model_kwargs=model_kwargs,
-            encode_kwargs=encode_kwargs
-        )
-        print(f"Loading vector store from: {VECTORSTORE_PATH}")
-        if not VECTORSTORE_PATH.exists():
+        store_dir = current_store_dir(VECTORSTORE_PATH)
+        if store_dir is None:
             st.error(f"Vector store directory {VECTORSTORE_PATH} does not exist. Run `python scripts/seed_knowledge.py` and `python scripts/ingest.py`.")
             return None
-        vs = FAISS.load_local(
-            folder_path=str(VECTORSTORE_PATH),
-            embeddings=embeddings,
-            allow_dangerous_deserialization=True
-        )
-        print("Vector store loaded successfully.")
-        return vs
+        return get_vectorstore(str(store_dir), vectorstore_version(VECTORSTORE_PATH), EMBEDDING_MODEL)
     except Exception as e:
         st.error(f"Failed to load vector store: {e}")
         st.info("The vector store may be incompatible. Try rebuilding it by running `python scripts/seed_knowledge.py` and `python scripts/ingest.py`.")
         return None
 
+@st.cache_resource(show_spinner=False)
+def get_knowledge_bundle():
+    # Compiled by scripts/build_knowledge_bundle.py; parsed once per process
+    return load_bundle()
+
+@st.cache_resource(show_spinner=False)
+def get_answer_cache():
+    return AnswerCache(
+        max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "256")),
+        similarity_threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95")),
+    )
+
 # --- RAG Chain Builder ---
 SYSTEM_PROMPT = """
 You are **TomatoDoc**, a plant pathologist assistant specialized in tomato diseases.
@@ -91,43 +149,137 @@ Always include: likely disease(s), reasoning, and a short action plan (bullet po
 Be practical and concise.
 """
 
-def format_docs(docs):
-    parts = []
-    sources = []
-    for i, d in enumerate(docs, start=1):
-        parts.append(f"Source {i} ({d.metadata.get('source','unknown')}):\n{d.page_content}")
-        sources.append(d.metadata.get("source", f"doc_{i}"))
-    return "\n\n".join(parts), sources
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_llm_service(model_name):
+    set_huggingface_model(model_name)
+    return get_huggingface_service()
 
-def build_chain(vs):
+def load_llm_service(vs):
     if vs is None:
         st.error("Cannot build RAG chain: Vector store failed to load.")
-        return None, None
-    retriever = vs.as_retriever(search_kwargs={"k": top_k})
+        return None
     current_model = st.session_state.get("huggingface_model", "microsoft/DialoGPT-medium")
-    set_huggingface_model(current_model)
     try:
-        huggingface_service = get_huggingface_service()
+        return get_llm_service(current_model)
     except ValueError as e:
         st.error(f"Error initializing HuggingFace service: {e}")
-        return None, None
-    rag_chain = huggingface_service.build_rag_chain(retriever, SYSTEM_PROMPT)
-    return rag_chain, retriever
+        return None
 
 # --- Image Analysis ---
+@st.cache_resource(show_spinner=False)
+def get_backend_client(url):
+    # One pooled keep-alive session (and circuit breaker) per Streamlit process
+    return BackendClient(
+        url,
+        connect_timeout_s=float(os.getenv("BACKEND_CONNECT_TIMEOUT_S", "3")),
+        read_timeout_s=float(os.getenv("BACKEND_READ_TIMEOUT_S", "30")),
+        retries=int(os.getenv("BACKEND_RETRIES", "2")),
+        image_min_side=int(os.getenv("BACKEND_UPLOAD_MIN_SIDE", "256")),
+    )
+
 def analyze_image(image_file):
     """Send image to backend API for disease detection."""
     try:
-        files = {"file": image_file}
-        response = requests.post(f"{backend_url}/predict", files=files)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Error analyzing image: {response.json().get('error', 'Unknown error')}")
-            return None
-    except Exception as e:
+        return get_backend_client(backend_url).predict(image_file.getvalue(), image_file.name)
+    except BackendWarmingUp as e:
+        st.warning(str(e))
+        return None
+    except BackendUnavailable as e:
         st.error(f"Failed to connect to backend API: {e}")
         return None
+    except BackendError as e:
+        st.error(f"Error analyzing image: {e}")
+        return None
+
+# --- Metrics ---
+# FRONTEND_METRICS_PORT serves Prometheus text at /metrics (0 disables);
+# TRACE_LOG=1 prints one JSON line per chat turn with its stage timings
+TRACE_LOG = os.getenv("TRACE_LOG", "0").lower() in ("1", "true", "yes")
+
+@st.cache_resource(show_spinner=False)
+def get_metrics():
+    registry = Registry()
+    metrics = {
+        "registry": registry,
+        "stages": registry.histogram(
+            "tomato_frontend_stage_seconds",
+            "Time per chat turn stage (embed, search, prompt_build, llm, total...)",
+            ("kind", "stage"),
+        ),
+        "ttft": registry.histogram("tomato_frontend_ttft_seconds", "Time to the first streamed answer chunk"),
+        "context_tokens": registry.counter(
+            "tomato_frontend_context_tokens_total",
+            "Prompt context tokens as retrieved vs. sent to the LLM after merging and budgeting",
+            ("kind",),
+        ),
+    }
+    answer_cache = get_answer_cache()
+    registry.gauge("tomato_frontend_answer_cache_entries", "Cached answers", lambda: answer_cache.stats()["entries"])
+    registry.gauge("tomato_frontend_answer_cache_hit_rate", "Answer cache hit rate since start",
+                   lambda: answer_cache.stats()["hit_rate"])
+    client = get_backend_client(backend_url)
+    registry.gauge("tomato_frontend_backend_circuit_open", "1 while backend calls are short-circuited",
+                   lambda: client.breaker.state == "open")
+    port = int(os.getenv("FRONTEND_METRICS_PORT", "9464"))
+    if port:
+        try:
+            start_metrics_server(registry, port)
+            print(f"Metrics available at http://localhost:{port}/metrics")
+        except OSError as e:
+            # e.g. a second Streamlit process on the same host
+            print(f"Metrics server not started on port {port}: {e}")
+    return metrics
+
+def new_trace(kind):
+    return Trace(get_metrics()["stages"], kind, log=print if TRACE_LOG else None)
+
+@st.cache_resource(show_spinner=False)
+def get_diagnosis_pool():
+    # Shared by all sessions; each diagnosis runs one CNN call and one retrieval on it
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="diagnosis")
+
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", DEFAULT_TOKENIZER)
+
+def build_context(retrieved, trace):
+    """Merge, de-duplicate and budget the retrieved chunks; the result is what the LLM gets."""
+    with trace.stage("context"):
+        context = assemble_context(retrieved, budget=context_budget, tokenizer=CONTEXT_TOKENIZER)
+    tokens = get_metrics()["context_tokens"]
+    tokens.inc(context.tokens_in, kind="retrieved")
+    tokens.inc(context.tokens_out, kind="sent")
+    trace.fields.update(contextTokensIn=context.tokens_in, contextTokensOut=context.tokens_out,
+                        contextTokensSaved=context.tokens_saved)
+    return context
+
+def generate_answer(llm_service, q, retrieved, trace=None):
+    """Render the answer for `q` from `retrieved` (streamed or in one call) and return its text."""
+    if stream_mode:
+        gen_stats = GenerationStats()
+        answer = st.write_stream(stream_answer(llm_service, SYSTEM_PROMPT, q, retrieved, gen_stats, trace=trace,
+                                               tokenizer=CONTEXT_TOKENIZER))
+        if not isinstance(answer, str):
+            answer = "".join(str(part) for part in answer)
+        st.session_state.generation_stats = st.session_state.generation_stats[-49:] + [gen_stats]
+        if gen_stats.ttft_ms is not None:
+            get_metrics()["ttft"].observe(gen_stats.ttft_ms / 1000.0)
+        st.caption(f"First token in {gen_stats.ttft_ms or 0:.0f} ms · "
+                   f"{gen_stats.tokens_per_s:.1f} tokens/s · {gen_stats.total_ms / 1000:.1f} s total")
+        return answer
+    with st.spinner("Thinking..."):
+        answer = answer_question(llm_service, SYSTEM_PROMPT, q, retrieved, trace=trace).answer
+    st.markdown(answer)
+    return answer
+
+def show_sources(retrieved):
+    _, sources = format_docs([doc for doc, _ in retrieved])
+    with st.expander("Sources used"):
+        for s, (_, score) in zip(sources, retrieved):
+            st.code(f"{s}  (relevance {score:.4f})")
+
+def strict_suffix(question):
+    if strict_mode:
+        return question + "\n\nIf uncertain, reply: 'I don't know from the provided context.'"
+    return question
 
 def display_image_result(result):
     if result.get('className') == 'No leaf detected':
@@ -135,6 +287,8 @@ def display_image_result(result):
     else:
         st.success(f"**Detected:** {result.get('humanName', result['className'])}")
         st.info(f"**Confidence:** {result.get('confidence', 0)}%")
+        if result.get('management'):
+            st.markdown("**Management:**\n" + "\n".join(f"- {item}" for item in result['management']))
         if result.get('kbSlug'):
             st.session_state.last_detection = result
             st.button("💬 Ask about this detection", key="ask_about_detection")
@@ -146,6 +300,9 @@ if "messages" not in st.session_state:
 if "last_detection" not in st.session_state:
     st.session_state.last_detection = None
 
+if "generation_stats" not in st.session_state:
+    st.session_state.generation_stats = []
+
 # --- Main Layout ---
 st.header("🍅 Tomato Disease Agent")
 st.caption("Multi-agent system: RAG chatbot with tomato disease knowledge + CNN image detection")
@@ -158,22 +315,76 @@ uploaded_file = st.file_uploader(
 
 if uploaded_file is not None:
     st.image(uploaded_file, caption="Uploaded Image", use_column_width=True)
-    with st.spinner("🔍 Analyzing image..."):
-        result = analyze_image(uploaded_file)
+    # Reruns re-execute this block; only post each upload to the backend once
+    upload_id = getattr(uploaded_file, "file_id", None) or f"{uploaded_file.name}:{uploaded_file.size}"
+    cached = st.session_state.get("image_result")
+    if cached and cached[0] == upload_id:
+        result = cached[1]
+    else:
+        with st.spinner("🔍 Analyzing image..."):
+            result = analyze_image(uploaded_file)
+        if result:
+            st.session_state.image_result = (upload_id, result)
     if result:
         display_image_result(result)
 
+with st.expander("🩺 Photo + question diagnosis"):
+    # The CNN and the knowledge search run concurrently; the answer uses both
+    with st.form("diagnosis_form", clear_on_submit=True):
+        diagnosis_photo = st.file_uploader("Leaf photo", type=['jpg', 'jpeg', 'png'], key="diagnosis_photo")
+        diagnosis_question = st.text_input("Question (optional)", placeholder="What should I do?")
+        diagnosis_submitted = st.form_submit_button("Diagnose")
+
 if not VECTORSTORE_PATH.exists():
     st.warning(f"Vector store not found at {VECTORSTORE_PATH}. Run `python scripts/seed_knowledge.py` then `python scripts/ingest.py` in your terminal.")
 else:
     vs = load_vectorstore()
     if vs:
-        chain, retriever = build_chain(vs)
-        if chain and retriever:
+        llm_service = load_llm_service(vs)
+        if llm_service:
             for msg in st.session_state.messages:
                 with st.chat_message(msg["role"]):
                     st.markdown(msg["content"])
 
+            if diagnosis_submitted and diagnosis_photo is None:
+                st.warning("Add a leaf photo to run a diagnosis.")
+            elif diagnosis_submitted:
+                trace = new_trace("diagnosis")
+                with st.spinner("🔍 Analyzing image and searching the knowledge base..."):
+                    diagnosis = diagnose(
+                        vs, get_backend_client(backend_url).predict, diagnosis_photo.getvalue(), diagnosis_photo.name,
+                        diagnosis_question, top_k,
+                        keyword_index=current_keyword_index(),
+                        executor=get_diagnosis_pool(),
+                        bundle=get_knowledge_bundle(),
+                        nprobe=nprobe, ef_search=ef_search,
+                    )
+                user_turn = f"📷 {diagnosis_photo.name} — {diagnosis.question}"
+                st.session_state.messages.append({"role": "user", "content": user_turn})
+                with st.chat_message("user"):
+                    st.markdown(user_turn)
+                with st.chat_message("assistant"):
+                    if diagnosis.cnn_error:
+                        st.warning(f"Image analysis failed ({diagnosis.cnn_error}); answering from the question alone.")
+                    elif diagnosis.detection and diagnosis.detection.get('message'):
+                        st.warning(diagnosis.detection['message'])
+                    elif diagnosis.detection:
+                        detection = diagnosis.detection
+                        st.caption(f"Detected: {detection.get('humanName', detection['className'])} "
+                                   f"({detection.get('confidence', 0)}%)")
+                    timings = diagnosis.timings_ms
+                    for name, ms in timings.items():
+                        # Prefixed so they don't collide with build_context's own "context" stage
+                        trace.add(f"diagnose_{name}", ms / 1000.0)
+                    context = build_context(diagnosis.retrieved, trace)
+                    answer = generate_answer(llm_service, strict_suffix(diagnosis.final_question), context.retrieved, trace)
+                    st.caption(f"Context ready in {timings['context']:.0f} ms "
+                               f"(image {timings['cnn']:.0f} ms and search {timings['retrieval']:.0f} ms in parallel)")
+                    st.caption(context.summary())
+                    show_sources(context.retrieved)
+                st.session_state.messages.append({"role": "assistant", "content": answer})
+                trace.finish(kbSlug=diagnosis.kb_slug, cnnError=diagnosis.cnn_error)
+
             if st.session_state.get('last_detection') and st.session_state.get('ask_about_detection', False):
                 detection = st.session_state.last_detection
                 question = f"Tell me about {detection.get('humanName', detection['className'])} and how to treat it"
@@ -185,36 +396,80 @@ else:
             if question:
                 final_question = question
                 cnn_context = None
+                kb_slug = None
                 if st.session_state.get('last_detection'):
                     detection = st.session_state.last_detection
                     cnn_context = format_cnn_prediction_for_prompt(
                         detection['className'], 
                         detection['confidence']
                     )
+                    kb_slug = detection.get('kbSlug') or get_knowledge_bundle().slug_for_class(detection['className'])
                 if cnn_context:
                     final_question = f"{cnn_context}\n\nUser question: {question}"
                     st.session_state.last_detection = None
 
                 st.session_state.messages.append({"role": "user", "content": question})
 
-                docs = retriever.invoke(question)
-                context_text, sources = format_docs(docs)
+                q = strict_suffix(final_question)
 
-                q = final_question
-                if strict_mode:
-                    q += "\n\nIf uncertain, reply: 'I don't know from the provided context.'"
+                trace = new_trace("chat")
+                # "management for late blight" and the like are read straight from the bundle
+                with trace.stage("lookup"):
+                    quick = quick_answer(get_knowledge_bundle(), question, default_slug=kb_slug) if direct_lookups else None
+                if quick:
+                    with st.chat_message("assistant"):
+                        st.markdown(quick.answer)
+                        st.caption("⚡ Answered directly from the knowledge base (no LLM call)")
+                        show_sources(quick.retrieved)
+                    st.session_state.messages.append({"role": "assistant", "content": quick.answer})
+                    trace.finish(cache="direct", kbSlug=quick.slug, section=quick.section)
+                else:
+                    # Repeated questions are answered from the cache; the query vector is
+                    # computed once and reused for the near-duplicate check and for FAISS
+                    answer_cache = get_answer_cache()
+                    answer_cache.sync_version(vectorstore_version(VECTORSTORE_PATH))
+                    # Answers from another LLM, or built with other retrieval settings, must not be reused
+                    cache_scope = (st.session_state.get("huggingface_model", huggingface_model),
+                                   strict_mode, top_k, hybrid_mode, context_budget, nprobe, ef_search,
+                                   cnn_context or "")
+                    with trace.stage("embed"):
+                        query_embedding = embed_query(vs, final_question)
+                    with trace.stage("cache_lookup"):
+                        cached, hit_kind = answer_cache.lookup(question, cache_scope, query_embedding)
 
-                with st.spinner("Thinking..."):
-                    answer = chain.invoke(q)
+                    with st.chat_message("assistant"):
+                        if cached:
+                            retrieved = cached.retrieved
+                            answer = cached.answer
+                            st.markdown(answer)
+                            st.caption(f"⚡ Answered from cache ({hit_kind} match)")
+                        else:
+                            # One retrieval per turn; the same documents go to the LLM and the expander
+                            # Search only the detected disease's file when there is one
+                            with trace.stage("search"):
+                                retrieved = hybrid_retrieve(
+                                    vs, final_question, top_k, query_embedding,
+                                    keyword_index=current_keyword_index(),
+                                    source=f"{kb_slug}.md" if kb_slug else None,
+                                    nprobe=nprobe, ef_search=ef_search,
+                                )
+                            # Sources shown and cached are the merged passages the LLM actually read
+                            context = build_context(retrieved, trace)
+                            retrieved = context.retrieved
+                            answer = generate_answer(llm_service, q, retrieved, trace)
+                            st.caption(context.summary())
+                            answer_cache.store(question, cache_scope, query_embedding, answer, retrieved)
+                        if cnn_context:
+                            st.info("💡 Response enhanced with image analysis results")
+                        show_sources(retrieved)
 
-                st.session_state.messages.append({"role": "assistant", "content": answer})
-
-                with st.chat_message("assistant"):
-                    st.markdown(answer)
-                    if cnn_context:
-                        st.info("💡 Response enhanced with image analysis results")
-                    with st.expander("Sources used"):
-                        for s in sources:
-                            st.code(s)
+                    st.session_state.messages.append({"role": "assistant", "content": answer})
+                    trace.finish(cache=hit_kind or "miss", topK=top_k, hybrid=hybrid_mode, kbSlug=kb_slug)
 
         st.caption("Tip: Adjust Top‑k in the sidebar to broaden/narrow context.")
+
+cache_stats = get_answer_cache().stats()
+st.sidebar.caption(
+    f"Answer cache: {cache_stats['hit_rate']:.0%} hit rate over {cache_stats['lookups']} questions "
+    f"({cache_stats['exact_hits']} exact, {cache_stats['semantic_hits']} similar, {cache_stats['entries']} cached)"
+)
@@ -0,0 +1,208 @@
+"""
+HTTP client for the CNN backend.
+
+One BackendClient is shared per Streamlit process. It keeps a pooled
+keep-alive requests.Session and bounds every call with connect/read timeouts.
+Connection failures (connect timeouts included) and 502/503/504 replies are
+retried with jittered exponential backoff; /predict is a pure function of the
+image, so retrying is safe. A read timeout is not retried: the backend may
+still be working on the request, and resending it only piles on load. A
+circuit breaker stops calling a backend that keeps failing and
+probes it again after a cool-down, so a dead backend costs one fast error
+instead of a hung worker. A backend that is still loading its model answers
+503 with Retry-After; that is reported as BackendWarmingUp and does not
+count against the breaker. Images are downscaled and re-encoded as JPEG before
+upload so far fewer bytes cross the wire.
+"""
+import io
+import random
+import threading
+import time
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = (502, 503, 504)
+
+
+class BackendError(Exception):
+    """The backend answered with an error (bad image, model failure...)."""
+
+
+class BackendUnavailable(BackendError):
+    """The backend could not be reached, or the circuit breaker is open."""
+
+
+class BackendWarmingUp(BackendUnavailable):
+    """The backend is up but still loading its model."""
+
+
+def _is_warming_up(response):
+    # The backend's own "still loading" 503s carry Retry-After; a proxy's 503 for a dead upstream doesn't
+    return response.status_code == 503 and "Retry-After" in response.headers
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; half-opens after `reset_after_s`."""
+
+    def __init__(self, failure_threshold=5, reset_after_s=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after_s = reset_after_s
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_after_s:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        """True if a call may go out; in half-open state only one probe at a time."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_after_s or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                # A failed probe restarts the cool-down
+                self._opened_at = time.monotonic()
+
+    def end_probe(self):
+        """Let the next call probe again when a probe ended without a recorded outcome."""
+        with self._lock:
+            self._probing = False
+
+
+def downscale_image(data: bytes, min_side=256, quality=90) -> Tuple[bytes, str]:
+    """Shrink so the shorter side is `min_side` (never upscales) and re-encode as JPEG.
+
+    The backend still resizes to the model's input size; keeping both sides at
+    or above it means the client-side step loses nothing the model would see.
+    Returns the original bytes when they can't be decoded or wouldn't shrink.
+    """
+    from PIL import Image
+    try:
+        img = Image.open(io.BytesIO(data))
+        if img.format == "JPEG":
+            img.draft("RGB", (min_side, min_side))
+        img = img.convert("RGB")
+    except Exception:
+        return data, "application/octet-stream"
+    scale = min_side / min(img.size)
+    if scale < 1.0:
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.BILINEAR)
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality)
+    if out.tell() >= len(data):
+        return data, "application/octet-stream"
+    return out.getvalue(), "image/jpeg"
+
+
+class BackendClient:
+    def __init__(self, base_url, connect_timeout_s=3.0, read_timeout_s=30.0, retries=2,
+                 backoff_s=0.25, pool_size=8, image_min_side=256, breaker: Optional[CircuitBreaker] = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout_s, read_timeout_s)
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.image_min_side = image_min_side
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.bytes_saved = 0
+
+    def _sleep_before_retry(self, attempt):
+        # Full jitter: spread retries from many sessions instead of syncing them
+        time.sleep(random.uniform(0, self.backoff_s * (2 ** attempt)))
+
+    def _request(self, method, path, **kwargs):
+        if not self.breaker.allow():
+            raise BackendUnavailable(f"Backend at {self.base_url} is unavailable; retrying shortly")
+        try:
+            return self._attempts(method, path, **kwargs)
+        finally:
+            # An unexpected exception must not leave a half-open breaker stuck mid-probe
+            self.breaker.end_probe()
+
+    def _attempts(self, method, path, **kwargs):
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._sleep_before_retry(attempt - 1)
+            try:
+                response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+            except requests.ConnectionError as e:
+                # Never reached the backend (ConnectTimeout is a ConnectionError): safe to resend
+                last_error = e
+                continue
+            except requests.Timeout as e:
+                self.breaker.record_failure()
+                raise BackendUnavailable(f"Backend at {self.base_url} did not answer within "
+                                         f"{self.timeout[1]:g} s") from e
+            if _is_warming_up(response):
+                # Reachable, just not ready: neither a breaker failure nor worth retrying right away
+                self.breaker.record_success()
+                raise BackendWarmingUp(f"Backend at {self.base_url} is still loading its model; "
+                                       f"retry in {response.headers['Retry-After']} s")
+            if response.status_code in RETRY_STATUSES:
+                last_error = BackendError(f"HTTP {response.status_code}")
+                continue
+            # Any other reply, 4xx/500 included, proves the backend is up. A 500 is a bad
+            # image or a failed model load, which the breaker can't fix by backing off.
+            self.breaker.record_success()
+            return response
+        self.breaker.record_failure()
+        raise BackendUnavailable(f"Backend at {self.base_url} failed after {self.retries + 1} attempts: {last_error}")
+
+    def predict(self, data: bytes, filename="image.jpg") -> dict:
+        """Classify one image; raises BackendError / BackendUnavailable."""
+        if self.breaker.state == "open":
+            # Fail fast without spending time on the image
+            raise BackendUnavailable(f"Backend at {self.base_url} is unavailable; retrying shortly")
+        if self.image_min_side:
+            small, content_type = downscale_image(data, self.image_min_side)
+            self.bytes_saved += len(data) - len(small)
+            if content_type == "image/jpeg":
+                filename = f"{filename.rsplit('.', 1)[0]}.jpg"
+            data = small
+        else:
+            content_type = "application/octet-stream"
+        response = self._request("POST", "/predict", files={"file": (filename, data, content_type)})
+        try:
+            payload = response.json()
+        except ValueError:
+            raise BackendError(f"Unexpected reply from backend (HTTP {response.status_code})")
+        if response.status_code != 200:
+            raise BackendError(payload.get("error", "Unknown error"))
+        return payload
+
+    def ready(self) -> bool:
+        try:
+            return self._request("GET", "/readyz").status_code == 200
+        except BackendError:
+            return False
+
+    def close(self):
+        self.session.close()
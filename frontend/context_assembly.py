@@ -0,0 +1,245 @@
+"""
+Context assembly between retrieval and generation.
+
+Chunks overlap by CHUNK_OVERLAP characters at ingest, so the top-k often holds
+neighbouring pieces of one knowledge file that repeat text. assemble_context()
+shrinks what the LLM has to read:
+
+1. chunks of the same source that overlap or touch (by their `start_index`
+   when the texts agree with it, otherwise by a shared suffix/prefix) are
+   merged into one passage;
+2. passages that mostly repeat an earlier, better-ranked one are dropped;
+3. the rest are kept in rank order until the token budget is used up, and
+   the first passage that doesn't fit is trimmed at a sentence boundary.
+
+Token counts are an estimate of the rendered context: tiktoken (or ~4
+characters per token without it) over format_docs()'s layout. The prompt
+itself is rendered by huggingface_service.build_rag_chain; format_docs() here
+only feeds the sources list, so its "Source i (...)" headers approximate the
+real template's overhead rather than match it.
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+DEFAULT_TOKEN_BUDGET = 1500
+DEFAULT_TOKENIZER = "cl100k_base"
+# Word 3-gram containment above which a passage counts as a repeat
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# Shortest shared suffix/prefix treated as chunk overlap when start_index is missing
+MIN_TEXT_OVERLAP = 20
+# Splitter separators (whitespace) that may sit between two touching chunks
+MAX_ADJACENT_GAP = 2
+# Trimming a passage below this many tokens isn't worth the header it costs
+MIN_TRIMMED_TOKENS = 48
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"[.!?](?=\s)|\n")
+
+
+@lru_cache(maxsize=4)
+def _encoding(name):
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception:
+        # Not installed, or the BPE file can't be downloaded: use the estimate
+        return None
+
+
+def count_tokens(text, tokenizer=DEFAULT_TOKENIZER) -> int:
+    encoding = _encoding(tokenizer)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _truncate_tokens(text, max_tokens, tokenizer) -> str:
+    encoding = _encoding(tokenizer)
+    if encoding is None:
+        return text[: max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def _render(i, d):
+    return f"Source {i} ({d.metadata.get('source','unknown')}):\n{d.page_content}"
+
+
+def format_docs(docs):
+    """The prompt's context block, plus the source name of each document."""
+    parts = []
+    sources = []
+    for i, d in enumerate(docs, start=1):
+        parts.append(_render(i, d))
+        sources.append(d.metadata.get("source", f"doc_{i}"))
+    return "\n\n".join(parts), sources
+
+
+@dataclass
+class AssembledContext:
+    retrieved: List[Tuple[Document, float]]
+    tokens_in: int
+    tokens_out: int
+    merged: int = 0
+    duplicates: int = 0
+    dropped: int = 0
+    trimmed: int = 0
+    budget: Optional[int] = None
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_in - self.tokens_out)
+
+    def summary(self) -> str:
+        notes = [f"{n} {label}" for n, label in ((self.merged, "merged"), (self.duplicates, "duplicate"),
+                                                 (self.trimmed, "trimmed"), (self.dropped, "over budget")) if n]
+        saved = f"{self.tokens_saved:,} saved" + (f": {', '.join(notes)}" if notes else "")
+        return f"Context {self.tokens_in:,} → {self.tokens_out:,} tokens ({saved})"
+
+
+def _text_overlap(a, b) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b` (at least MIN_TEXT_OVERLAP)."""
+    for size in range(min(len(a), len(b)) - 1, MIN_TEXT_OVERLAP - 1, -1):
+        if a.endswith(b[:size]):
+            return size
+    return 0
+
+
+def _join(first: Document, second: Document) -> Optional[Document]:
+    """`first` followed by `second` as one passage, or None if they are not contiguous."""
+    a, b = first.page_content, second.page_content
+    start_a, start_b = first.metadata.get("start_index"), second.metadata.get("start_index")
+    # The splitter records -1 when it could not locate a chunk
+    indexed = start_a is not None and start_b is not None and start_a >= 0 and start_b >= 0
+    text = None
+    if indexed:
+        end_a = first.metadata.get("end_index", start_a + len(a))
+        if start_b < start_a or start_b > end_a + MAX_ADJACENT_GAP:
+            return None
+        shared = a[start_b - start_a:]
+        if start_b >= end_a:
+            # The gap held the separator the splitter stripped, normally newlines
+            text = a + "\n" * (start_b - end_a) + b
+        elif b.startswith(shared) and len(b) > len(shared):
+            text = a + b[len(shared):]
+        elif shared.startswith(b):
+            text = a
+        else:
+            # Offsets from an older version of the file; only the text can be trusted
+            indexed = False
+    if text is None:
+        overlap = _text_overlap(a, b)
+        if not overlap:
+            return None
+        text = a + b[overlap:]
+    metadata = dict(first.metadata)
+    metadata.pop("chunk_id", None)
+    if indexed:
+        metadata["end_index"] = max(end_a, second.metadata.get("end_index", start_b + len(b)))
+    else:
+        metadata.pop("end_index", None)
+    return Document(page_content=text, metadata=metadata)
+
+
+def merge_adjacent(retrieved) -> Tuple[List[Tuple[Document, float]], int]:
+    """Merge contiguous chunks of the same source; a passage keeps its best-ranked chunk's slot and score."""
+    passages = list(retrieved)
+    merged = 0
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(passages)):
+            for j in range(len(passages)):
+                if i == j:
+                    continue
+                doc_i, doc_j = passages[i][0], passages[j][0]
+                if doc_i.metadata.get("source") != doc_j.metadata.get("source"):
+                    continue
+                joined = _join(doc_i, doc_j)
+                if joined is None:
+                    continue
+                keep, drop = min(i, j), max(i, j)
+                passages[keep] = (joined, passages[keep][1])
+                del passages[drop]
+                merged += 1
+                changed = True
+                break
+            if changed:
+                break
+    return passages, merged
+
+
+def _shingles(text) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < 3:
+        return {tuple(words)}
+    return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def drop_near_duplicates(retrieved, threshold=NEAR_DUPLICATE_THRESHOLD) -> Tuple[List[Tuple[Document, float]], int]:
+    """Keep passages in rank order, skipping any mostly contained in one already kept."""
+    kept = []
+    kept_shingles = []
+    for doc, score in retrieved:
+        shingles = _shingles(doc.page_content)
+        if any(len(shingles & other) / max(1, min(len(shingles), len(other))) >= threshold
+               for other in kept_shingles):
+            continue
+        kept.append((doc, score))
+        kept_shingles.append(shingles)
+    return kept, len(retrieved) - len(kept)
+
+
+def _trim(doc: Document, max_tokens, tokenizer) -> Document:
+    text = _truncate_tokens(doc.page_content, max_tokens, tokenizer)
+    # End on a full sentence when one finishes in the second half of what fits
+    ends = [m.end() for m in _SENTENCE_END.finditer(text)]
+    if ends and ends[-1] >= len(text) // 2:
+        text = text[: ends[-1]]
+    return Document(page_content=text.rstrip(), metadata={**doc.metadata, "trimmed": True})
+
+
+def fit_budget(retrieved, budget, tokenizer=DEFAULT_TOKENIZER) -> Tuple[List[Tuple[Document, float]], int, int]:
+    """Rank-ordered passages within `budget` prompt tokens; returns (kept, trimmed, dropped)."""
+    kept = []
+    used = 0
+    for doc, score in retrieved:
+        # Count each passage as it renders, with its "Source i (...)" header and separator
+        cost = count_tokens(("\n\n" if kept else "") + _render(len(kept) + 1, doc), tokenizer)
+        if used + cost <= budget:
+            kept.append((doc, score))
+            used += cost
+            continue
+        room = budget - used - (cost - count_tokens(doc.page_content, tokenizer))
+        trimmed = 0
+        if room >= MIN_TRIMMED_TOKENS:
+            kept.append((_trim(doc, room, tokenizer), score))
+            trimmed = 1
+        return kept, trimmed, len(retrieved) - len(kept)
+    return kept, 0, 0
+
+
+def assemble_context(retrieved, budget=DEFAULT_TOKEN_BUDGET, tokenizer=DEFAULT_TOKENIZER,
+                     dedup_threshold=NEAR_DUPLICATE_THRESHOLD) -> AssembledContext:
+    """Merge, de-duplicate and budget `retrieved` (document, score) pairs for the prompt."""
+    retrieved = list(retrieved)
+    tokens_in = count_tokens(format_docs([doc for doc, _ in retrieved])[0], tokenizer)
+    passages, merged = merge_adjacent(retrieved)
+    passages, duplicates = drop_near_duplicates(passages, dedup_threshold)
+    trimmed = dropped = 0
+    if budget:
+        passages, trimmed, dropped = fit_budget(passages, budget, tokenizer)
+    tokens_out = count_tokens(format_docs([doc for doc, _ in passages])[0], tokenizer)
+    return AssembledContext(
+        retrieved=passages,
+        tokens_in=tokens_in,
+        tokens_out=tokens_out,
+        merged=merged,
+        duplicates=duplicates,
+        dropped=dropped,
+        trimmed=trimmed,
+        budget=budget,
+    )
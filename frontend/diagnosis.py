@@ -0,0 +1,105 @@
+"""
+Photo + question diagnosis in one step.
+
+The CNN call to the backend and the knowledge-base retrieval for the question
+run at the same time on a thread pool, so the context is ready after
+max(CNN, retrieval) instead of their sum. When the CNN result maps to a
+knowledge file, the already computed query embedding is reused for a quick
+search narrowed to that file; the merged context then goes to generation.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from disease_mapping import format_cnn_prediction_for_prompt
+from knowledge_bundle import load_bundle
+from rag_pipeline import embed_query, hybrid_retrieve
+
+DEFAULT_QUESTION = "What is wrong with this plant and what should I do?"
+
+
+@dataclass
+class Diagnosis:
+    question: str
+    final_question: str
+    detection: Optional[dict]
+    cnn_error: Optional[str]
+    cnn_context: Optional[str]
+    kb_slug: Optional[str]
+    retrieved: List[Tuple[Document, float]]
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000.0
+
+
+def _classify(classify, image, filename):
+    try:
+        return classify(image, filename), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _retrieve(vs, question, top_k, keyword_index, search):
+    embedding = embed_query(vs, question)
+    return embedding, hybrid_retrieve(vs, question, top_k, embedding, keyword_index=keyword_index, **search)
+
+
+def diagnose(vs, classify: Callable[[bytes, str], dict], image: bytes, filename: str, question: str,
+             top_k: int, keyword_index=None, executor: Optional[ThreadPoolExecutor] = None,
+             bundle=None, nprobe=None, ef_search=None) -> Diagnosis:
+    """Classify `image` and retrieve context for `question` concurrently.
+
+    `classify(image_bytes, filename)` returns the backend's /predict JSON and
+    may raise; a failed classification still yields a text-only diagnosis.
+    Runs off the Streamlit script thread, so neither callable may use st.*.
+    `bundle` is the knowledge bundle (load_bundle() when omitted);
+    `nprobe`/`ef_search` tune approximate indexes as in hybrid_retrieve().
+    """
+    bundle = bundle or load_bundle()
+    question = question.strip() or DEFAULT_QUESTION
+    pool = executor or ThreadPoolExecutor(max_workers=2)
+    search = {"nprobe": nprobe, "ef_search": ef_search}
+    started = time.perf_counter()
+    try:
+        cnn_future = pool.submit(_timed, _classify, classify, image, filename)
+        retrieval_future = pool.submit(_timed, _retrieve, vs, question, top_k, keyword_index, search)
+        (detection, cnn_error), cnn_ms = cnn_future.result()
+        (embedding, retrieved), retrieval_ms = retrieval_future.result()
+    finally:
+        if executor is None:
+            pool.shutdown(wait=False)
+    timings = {"cnn": cnn_ms, "retrieval": retrieval_ms}
+
+    kb_slug = (detection.get("kbSlug") or bundle.slug_for_class(detection.get("className"))) if detection else None
+    cnn_context = None
+    if kb_slug:
+        human_name = bundle.human_name(kb_slug)
+        cnn_context = format_cnn_prediction_for_prompt(detection["className"], detection["confidence"])
+        # Same embedding, narrowed to the detected disease's file, with its name as extra keywords
+        narrow_started = time.perf_counter()
+        narrowed = hybrid_retrieve(
+            vs, f"{human_name} {question}", top_k, embedding,
+            keyword_index=keyword_index, source=f"{kb_slug}.md", **search,
+        )
+        retrieved = narrowed or retrieved
+        timings["narrow"] = (time.perf_counter() - narrow_started) * 1000.0
+    timings["context"] = (time.perf_counter() - started) * 1000.0
+
+    final_question = f"{cnn_context}\n\nUser question: {question}" if cnn_context else question
+    return Diagnosis(
+        question=question,
+        final_question=final_question,
+        detection=detection,
+        cnn_error=cnn_error,
+        cnn_context=cnn_context,
+        kb_slug=kb_slug,
+        retrieved=retrieved,
+        timings_ms=timings,
+    )
@@ -0,0 +1,99 @@
+"""
+Direct answers to simple structured questions, without retrieval or an LLM call.
+
+Questions such as "management for late blight", "symptoms of septoria leaf
+spot" or, right after an image detection, "how do I treat it?" name exactly
+one disease (or point at the detected one with "it"/"my plant") and one
+section of its knowledge file. They are answered with
+that section, read from the knowledge bundle. Only imperative and wh-lookup
+forms are answered this way. Yes/no questions ("does copper spray cure
+bacterial spot?") and longer, compound or open-ended ones (why/should/which...)
+return None and go through the normal RAG turn.
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from knowledge_bundle import SECTION_TITLES
+
+MAX_WORDS = 12
+
+# Section asked for, keyed by word stems; exactly one may match
+INTENTS = {
+    "management": re.compile(
+        r"\b(?:manag|treat|control|cure|spray|fungicid|bactericid|prevent|get rid|stop|halt|contain)\w*"),
+    "symptoms": re.compile(r"\b(?:symptom|signs?\b|looks? like|identif|recogni)\w*"),
+    "favorable_conditions": re.compile(r"\b(?:condition|cause|weather|favou?r|humid|temperatur)\w*"),
+}
+# "How does it spread?" asks for conditions, "how do I stop it spreading?" for management
+SPREAD = re.compile(r"\bspread\w*")
+OVERVIEW = re.compile(r"^(?:what is|what's|tell me about|overview of|describe)\b")
+# Questions that need reasoning or a comparison rather than a lookup
+OPEN_ENDED = re.compile(r"\b(?:why|when|should|can|could|would|will|which|compare|versus|vs|difference|and|or|not)\b")
+# Yes/no questions assert a claim to check; dumping a section doesn't answer them
+YES_NO = re.compile(r"^(?:is|are|was|were|does|do|did|has|have|had)\b")
+# Wording that points at the detected disease; without it, an unnamed disease may be one the bundle lacks
+DETECTION_REFERENCE = re.compile(
+    r"\b(?:it|its|this|that|these|they|them)\b|\bmy (?:plants?|tomato(?:es)?|leaf|leaves|crop)\b"
+    r"|\bthe (?:plant|leaf|leaves|disease|infection)\b"
+)
+
+
+@dataclass
+class QuickAnswer:
+    slug: str
+    section: str
+    answer: str
+    retrieved: List[Tuple[Document, float]]
+
+
+def _normalize(question):
+    return re.sub(r"[^\w\s'.-]", " ", question.lower()).strip()
+
+
+def match_disease(bundle, text) -> Tuple[Optional[str], int]:
+    """(slug, number of diseases named); the slug is set only when exactly one is named."""
+    named = [slug for slug, aliases in bundle.aliases.items()
+             if any(re.search(rf"(?<!\w){re.escape(alias)}(?!\w)", text) for alias in aliases)]
+    return (named[0] if len(named) == 1 else None), len(named)
+
+
+def match_intent(text) -> Optional[str]:
+    intents = [name for name, pattern in INTENTS.items() if pattern.search(text)]
+    if SPREAD.search(text) and "management" not in intents and "favorable_conditions" not in intents:
+        intents.append("favorable_conditions")
+    if len(intents) == 1:
+        return intents[0]
+    if not intents and OVERVIEW.search(text):
+        return "overview"
+    return None
+
+
+def quick_answer(bundle, question, default_slug=None) -> Optional[QuickAnswer]:
+    """Answer from the bundle when `question` is a plain section lookup; otherwise None.
+
+    `default_slug` (the disease just detected in an image) is used when the
+    question names no disease but refers to the detection, e.g. "how do I
+    treat it?". "How do I treat spider mites?" names no known disease and
+    refers to nothing, so it returns None.
+    """
+    text = _normalize(question)
+    if not text or len(text.split()) > MAX_WORDS or OPEN_ENDED.search(text) or YES_NO.search(text):
+        return None
+    intent = match_intent(text)
+    if intent is None:
+        return None
+    slug, named = match_disease(bundle, text)
+    if named == 0 and DETECTION_REFERENCE.search(text):
+        slug = default_slug
+    disease = bundle.disease(slug) if slug else None
+    if disease is None:
+        return None
+
+    section = bundle.section(slug, intent)
+    title = SECTION_TITLES[intent]
+    answer = f"**{disease['human']} — {title}**\n\n{section}"
+    source = Document(page_content=f"{title}:\n{section}", metadata={"source": disease["source"], "section": intent})
+    return QuickAnswer(slug=slug, section=intent, answer=answer, retrieved=[(source, 1.0)])
@@ -0,0 +1,236 @@
+"""
+Retrieve-once RAG turn.
+
+The question is embedded and searched exactly once; the resulting documents
+are pinned into the service's RAG chain through PinnedRetriever, so the
+sources shown in the UI are exactly the context the LLM received. Answers
+can be generated in one call or streamed chunk by chunk.
+
+hybrid_retrieve() fuses the dense FAISS ranking with the store's BM25 keyword
+ranking by reciprocal-rank fusion, and can first narrow both to the chunks of
+one knowledge file (the disease the CNN detected).
+"""
+import time
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from context_assembly import DEFAULT_TOKENIZER, count_tokens
+from metrics import stage
+
+
+class PinnedRetriever(BaseRetriever):
+    """Retriever that hands back documents already fetched for this turn."""
+
+    docs: List[Document] = []
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return list(self.docs)
+
+
+@dataclass
+class RagResult:
+    answer: str
+    docs: List[Document]
+    scores: List[float]
+
+
+@dataclass
+class GenerationStats:
+    """Perceived latency (time to first token) vs. total generation time."""
+
+    ttft_ms: Optional[float] = None
+    total_ms: float = 0.0
+    chunks: int = 0
+    # Tokens in the whole answer, and in what arrived after the first chunk
+    tokens: int = 0
+    tokens_after_first: int = 0
+
+    @property
+    def tokens_per_s(self) -> float:
+        # Decode rate: tokens after the first chunk over the time spent producing them
+        generating_ms = self.total_ms - (self.ttft_ms or 0.0)
+        if self.chunks < 2 or generating_ms <= 0:
+            return 0.0
+        return self.tokens_after_first / (generating_ms / 1000.0)
+
+
+def _chunk_text(chunk) -> str:
+    if isinstance(chunk, str):
+        return chunk
+    # Message chunks (the final one is often empty) yield their content, never their repr
+    if hasattr(chunk, "content"):
+        return chunk.content or ""
+    return str(chunk)
+
+
+def _ivf(index):
+    import faiss
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def search_params(index, nprobe=None, ef_search=None, sel=None):
+    """Per-query FAISS SearchParameters carrying the query-time accuracy knobs.
+
+    The index is cached and shared by every session, so nprobe/efSearch are
+    passed with each search instead of being set on it. nprobe applies to IVF
+    indexes and ef_search to HNSW ones; returns None when there is nothing to
+    pass (a flat index without a selector).
+    """
+    import faiss
+    ivf = _ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=sel, nprobe=int(nprobe or ivf.nprobe))
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=int(ef_search or index.hnsw.efSearch))
+    return faiss.SearchParameters(sel=sel) if sel is not None else None
+
+
+def embed_query(vs, query) -> np.ndarray:
+    """Embed `query` with the store's own (normalized MiniLM) embedding model."""
+    return np.asarray(vs.embeddings.embed_query(query), dtype=np.float32)
+
+
+def retrieve(vs, query, top_k, embedding: Optional[Sequence[float]] = None) -> List[Tuple[Document, float]]:
+    """Single embedding + FAISS search; returns (document, L2 distance) pairs.
+
+    Pass `embedding` when the query vector is already at hand to skip re-embedding.
+    """
+    if embedding is not None:
+        return vs.similarity_search_with_score_by_vector(list(map(float, embedding)), k=top_k)
+    return vs.similarity_search_with_score(query, k=top_k)
+
+
+RRF_K = 60
+
+
+def source_rows(vs, source) -> List[int]:
+    """Index rows of the chunks whose `source` metadata equals `source`."""
+    if hasattr(vs.docstore, "rows_where"):
+        return vs.docstore.rows_where("source", source)
+    # In-memory docstores (e.g. a store being updated by ingest): walk them
+    return [
+        row for row, doc_id in vs.index_to_docstore_id.items()
+        if getattr(vs.docstore.search(doc_id), "metadata", {}).get("source") == source
+    ]
+
+
+def _filtered_search(index, embedding, k, rows, ef_search=None):
+    """FAISS search restricted to `rows` via an ID selector; returns ranked rows."""
+    import faiss
+    query = np.asarray(embedding, dtype=np.float32)[None, :]
+    selector = faiss.IDSelectorBatch(np.asarray(rows, dtype=np.int64))
+    k = min(k, len(rows))
+    # Few rows pass the filter, so widen the probe/beam to still find k of them
+    ivf = _ivf(index)
+    nprobe = ivf.nlist if ivf is not None else None
+    if hasattr(index, "hnsw"):
+        ef_search = max(ef_search or index.hnsw.efSearch, 2 * len(rows))
+    params = search_params(index, nprobe, ef_search, sel=selector)
+    try:
+        _, ids = index.search(query, k, params=params)
+        return [int(i) for i in ids[0] if i >= 0]
+    except RuntimeError:
+        # Index types without selector support (e.g. plain PQ): over-fetch and filter
+        allowed = set(rows)
+        _, ids = index.search(query, index.ntotal)
+        return [int(i) for i in ids[0] if i in allowed][:k]
+
+
+def _dense_rows(index, embedding, k, rows=None, nprobe=None, ef_search=None) -> List[int]:
+    if rows is not None:
+        return _filtered_search(index, embedding, k, rows, ef_search)
+    params = search_params(index, nprobe, ef_search)
+    _, ids = index.search(np.asarray(embedding, dtype=np.float32)[None, :], min(k, index.ntotal), params=params)
+    return [int(i) for i in ids[0] if i >= 0]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K) -> List[Tuple[int, float]]:
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _documents_for_rows(vs, rows) -> dict:
+    if hasattr(vs.docstore, "by_rows"):
+        return vs.docstore.by_rows(rows)
+    return {row: vs.docstore.search(vs.index_to_docstore_id[row]) for row in rows}
+
+
+def hybrid_retrieve(vs, query, top_k, embedding, keyword_index=None, source=None,
+                    fetch_k=None, nprobe=None, ef_search=None) -> List[Tuple[Document, float]]:
+    """BM25 + vector retrieval fused by RRF; returns (document, fused score) pairs.
+
+    With `source`, candidates are first narrowed to that knowledge file's chunks
+    (falling back to the whole corpus when the file has none). Without a
+    keyword index this is a dense search, optionally filtered the same way.
+    `nprobe`/`ef_search` tune IVF/HNSW indexes for this search only.
+    """
+    fetch_k = fetch_k or max(4 * top_k, 20)
+    rows = source_rows(vs, source) if source else None
+    if not rows:
+        rows = None
+    rankings = [_dense_rows(vs.index, embedding, fetch_k, rows, nprobe, ef_search)]
+    if keyword_index is not None:
+        rankings.append([row for row, _ in keyword_index.search(query, fetch_k, rows)])
+    fused = reciprocal_rank_fusion(rankings)[:top_k]
+    docs = _documents_for_rows(vs, [row for row, _ in fused])
+    return [(docs[row], score) for row, score in fused if row in docs]
+
+
+def build_pinned_chain(service, system_prompt, docs):
+    return service.build_rag_chain(PinnedRetriever(docs=docs), system_prompt)
+
+
+def answer_question(service, system_prompt, question, retrieved, trace=None) -> RagResult:
+    """Generate an answer from `retrieved` without searching the store again."""
+    docs = [doc for doc, _ in retrieved]
+    scores = [float(score) for _, score in retrieved]
+    with stage(trace, "prompt_build"):
+        chain = build_pinned_chain(service, system_prompt, docs)
+    with stage(trace, "llm"):
+        answer = chain.invoke(question)
+    return RagResult(answer=answer, docs=docs, scores=scores)
+
+
+def stream_answer(service, system_prompt, question, retrieved, stats: GenerationStats, trace=None,
+                  tokenizer=DEFAULT_TOKENIZER) -> Iterator[str]:
+    """Yield answer text as the chain produces it, filling `stats` along the way.
+
+    Uses the Runnable streaming interface, so tokens arrive incrementally when
+    the service's LLM supports streaming and as a single chunk otherwise. A
+    chunk may carry several tokens, so the answer is tokenized with
+    `tokenizer` once it is complete to give a real tokens/s figure.
+    """
+    docs = [doc for doc, _ in retrieved]
+    with stage(trace, "prompt_build"):
+        chain = build_pinned_chain(service, system_prompt, docs)
+    parts = []
+    started = time.perf_counter()
+    for chunk in chain.stream(question):
+        text = _chunk_text(chunk)
+        if not text:
+            continue
+        if stats.ttft_ms is None:
+            stats.ttft_ms = (time.perf_counter() - started) * 1000.0
+        stats.chunks += 1
+        parts.append(text)
+        yield text
+    stats.total_ms = (time.perf_counter() - started) * 1000.0
+    if parts:
+        stats.tokens = count_tokens("".join(parts), tokenizer)
+        stats.tokens_after_first = max(0, stats.tokens - count_tokens(parts[0], tokenizer))
+    if trace is not None:
+        trace.add("llm", stats.total_ms / 1000.0)
@@ -0,0 +1,117 @@
+"""
+Compiles the disease metadata into one versioned bundle for the services.
+
+    python scripts/build_knowledge_bundle.py           # writes shared/knowledge_bundle.json
+    python scripts/build_knowledge_bundle.py --check   # exit 1 if the bundle is out of date
+
+Inputs are DISEASES (scripts/seed_knowledge.py) and CLASS_NAMES,
+CNN_TO_KB_MAPPING and KB_TO_HUMAN (shared/disease_mapping.py). The output
+holds a class-index -> slug -> human-name table and each disease's knowledge
+text with the character offsets of its sections (see shared/knowledge_bundle.py).
+The version is a hash of the content, so rebuilding unchanged inputs is a no-op.
+Re-run after editing any of the inputs.
+"""
+import argparse
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from shared.disease_mapping import CLASS_NAMES, CNN_TO_KB_MAPPING, KB_TO_HUMAN
+from shared.knowledge_bundle import BUNDLE_FILE, SCHEMA_VERSION, SECTION_TITLES, KnowledgeBundle
+from seed_knowledge import DISEASES
+
+
+class _Writer:
+    """Appends text to one blob and records [start, end] offsets of the pieces."""
+
+    def __init__(self):
+        self.parts = []
+        self.length = 0
+
+    def add(self, text):
+        start = self.length
+        self.parts.append(text)
+        self.length += len(text)
+        return [start, self.length]
+
+    def text(self):
+        return "".join(self.parts)
+
+
+def _bullets(items):
+    return "\n".join(f"- {item}" for item in items)
+
+
+def compile_disease(writer, d):
+    """Append `d` as the text of seed_knowledge.to_markdown(d) plus a newline; returns its offsets."""
+    start = writer.length
+    sections = {}
+    writer.add(f"# {d['name']}\n\n**{SECTION_TITLES['overview']}:** ")
+    sections["overview"] = writer.add(d["overview"])
+    for name in ("symptoms", "favorable_conditions", "management"):
+        writer.add(f"\n\n## {SECTION_TITLES[name]}\n")
+        sections[name] = writer.add(_bullets(d[name]))
+    writer.add(f"\n\n**{SECTION_TITLES['notes']}:** ")
+    sections["notes"] = writer.add(d["notes"])
+    end = writer.add("\n")[0]
+    return {
+        "title": d["name"],
+        "human": KB_TO_HUMAN.get(d["slug"], d["slug"].replace("-", " ").title()),
+        "source": f"{d['slug']}.md",
+        "span": [start, end],
+        "sections": sections,
+    }
+
+
+def build_bundle():
+    slugs = {d["slug"] for d in DISEASES}
+    missing = sorted(set(CLASS_NAMES) - set(CNN_TO_KB_MAPPING))
+    if missing:
+        raise SystemExit(f"CNN_TO_KB_MAPPING has no entry for: {', '.join(missing)}")
+    unknown = sorted({s for s in CNN_TO_KB_MAPPING.values() if s} - slugs)
+    if unknown:
+        raise SystemExit(f"CNN_TO_KB_MAPPING points at slugs missing from DISEASES: {', '.join(unknown)}")
+
+    writer = _Writer()
+    diseases = {d["slug"]: compile_disease(writer, d) for d in DISEASES}
+    classes = []
+    for name in CLASS_NAMES:
+        slug = CNN_TO_KB_MAPPING[name]
+        # Classes outside the knowledge base keep the raw class name, as the backend always did
+        classes.append([name, slug, diseases[slug]["human"] if slug else name])
+
+    content = {"schema": SCHEMA_VERSION, "classes": classes, "diseases": diseases, "text": writer.text()}
+    canonical = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    content["version"] = hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+    return content
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile disease metadata into shared/knowledge_bundle.json.")
+    parser.add_argument("--out", type=Path, default=BUNDLE_FILE)
+    parser.add_argument("--check", action="store_true", help="Only verify that --out is up to date")
+    args = parser.parse_args()
+
+    bundle = build_bundle()
+    if args.check:
+        try:
+            current = json.loads(args.out.read_text(encoding="utf-8")).get("version")
+        except (OSError, ValueError):
+            current = None
+        if current != bundle["version"]:
+            print(f"{args.out} is stale ({current} != {bundle['version']}); run scripts/build_knowledge_bundle.py")
+            sys.exit(1)
+        print(f"{args.out} is up to date (version {current})")
+        return
+
+    KnowledgeBundle(bundle)  # fail here rather than in a service
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(bundle, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    print(f"Wrote {args.out} (version {bundle['version']}, {len(bundle['classes'])} classes, "
+          f"{len(bundle['diseases'])} diseases, {args.out.stat().st_size} bytes)")
+
+
+if __name__ == "__main__":
+    main()
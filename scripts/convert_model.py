@@ -0,0 +1,202 @@
+"""
+Exports model/mainModel.keras to a lighter inference runtime and checks that
+its predictions still agree with the Keras model.
+
+    python scripts/convert_model.py --format tflite
+    python scripts/convert_model.py --format tflite --quantize int8 --calibration-dir samples/
+    python scripts/convert_model.py --format onnx --quantize int8 --calibration-dir samples/
+
+--calibration-dir holds sample leaf images (jpg/png). If they are sorted into
+sub-folders named after CLASS_NAMES, the report also includes per-class
+accuracy for both models. Serve the result with MODEL_RUNTIME=tflite|onnx
+(and MODEL_PATH if you chose a non-default --output).
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+from shared.disease_mapping import CLASS_NAMES
+from backend.preprocessing import ImagePreprocessor
+from backend.runtime import default_model_path, load_runtime
+
+IMAGE_SIZE = (224, 224)
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+
+def load_samples(sample_dir, limit):
+    """Return (images, labels); labels are class indices or None when unlabeled."""
+    paths = sorted(p for p in Path(sample_dir).rglob("*") if p.suffix.lower() in IMAGE_EXTENSIONS)[:limit]
+    if not paths:
+        raise SystemExit(f"No images found under {sample_dir}")
+    preprocessor = ImagePreprocessor(IMAGE_SIZE)
+    images = np.empty((len(paths), IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.float32)
+    labels = []
+    for i, path in enumerate(paths):
+        preprocessor.decode_into(path.read_bytes(), images[i])
+        parent = path.parent.name
+        labels.append(CLASS_NAMES.index(parent) if parent in CLASS_NAMES else None)
+    return images, labels
+
+
+def representative_dataset(images):
+    for i in range(len(images)):
+        yield [images[i:i + 1]]
+
+
+def export_tflite(keras_model, output, quantize, calibration):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    if quantize in ("dynamic", "int8"):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "int8":
+        converter.representative_dataset = lambda: representative_dataset(calibration)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    output.write_bytes(converter.convert())
+
+
+class _CalibrationReader:
+    """onnxruntime CalibrationDataReader over preprocessed sample images."""
+
+    def __init__(self, input_name, images):
+        self._feeds = iter({input_name: images[i:i + 1]} for i in range(len(images)))
+
+    def get_next(self):
+        return next(self._feeds, None)
+
+
+def export_onnx(keras_model, output, quantize, calibration):
+    import tensorflow as tf
+    import tf2onnx
+    spec = (tf.TensorSpec((None, IMAGE_SIZE[1], IMAGE_SIZE[0], 3), tf.float32, name="input"),)
+    if quantize == "none":
+        tf2onnx.convert.from_keras(keras_model, input_signature=spec, opset=13, output_path=str(output))
+        return
+
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    float_path = output.with_suffix(".float.onnx")
+    tf2onnx.convert.from_keras(keras_model, input_signature=spec, opset=13, output_path=str(float_path))
+    if quantize == "dynamic":
+        quantize_dynamic(str(float_path), str(output), weight_type=QuantType.QInt8)
+    else:
+        quantize_static(
+            str(float_path), str(output), _CalibrationReader("input", calibration),
+            quant_format=QuantFormat.QDQ, per_channel=True,
+            activation_type=QuantType.QInt8, weight_type=QuantType.QInt8,
+        )
+    float_path.unlink()
+
+
+def compare(reference, candidate, images, labels, batch_size=16):
+    """Top-1 agreement and probability drift of `candidate` against `reference`."""
+    ref_probs, cand_probs = [], []
+    ref_ms = cand_ms = 0.0
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        t0 = time.perf_counter()
+        ref_probs.append(np.asarray(reference.predict(batch)))
+        t1 = time.perf_counter()
+        cand_probs.append(np.asarray(candidate.predict(batch)))
+        t2 = time.perf_counter()
+        ref_ms += (t1 - t0) * 1000
+        cand_ms += (t2 - t1) * 1000
+    ref_probs = np.concatenate(ref_probs)
+    cand_probs = np.concatenate(cand_probs)
+    ref_top1 = ref_probs.argmax(axis=1)
+    cand_top1 = cand_probs.argmax(axis=1)
+
+    per_class = {}
+    for idx, name in enumerate(CLASS_NAMES):
+        mask = ref_top1 == idx
+        labeled = [i for i, label in enumerate(labels) if label == idx]
+        entry = {"samples": int(mask.sum())}
+        if mask.any():
+            entry["agreement"] = round(float((cand_top1[mask] == idx).mean()), 4)
+        if labeled:
+            entry["kerasAccuracy"] = round(float((ref_top1[labeled] == idx).mean()), 4)
+            entry["convertedAccuracy"] = round(float((cand_top1[labeled] == idx).mean()), 4)
+        per_class[name] = entry
+
+    labeled = [i for i, label in enumerate(labels) if label is not None]
+    report = {
+        "samples": len(images),
+        "top1Agreement": round(float((ref_top1 == cand_top1).mean()), 4),
+        "meanAbsProbDelta": round(float(np.abs(ref_probs - cand_probs).mean()), 6),
+        "maxAbsProbDelta": round(float(np.abs(ref_probs - cand_probs).max()), 6),
+        "kerasMsPerImage": round(ref_ms / len(images), 3),
+        "convertedMsPerImage": round(cand_ms / len(images), 3),
+        "perClass": per_class,
+    }
+    if labeled:
+        truth = np.array([labels[i] for i in labeled])
+        report["kerasAccuracy"] = round(float((ref_top1[labeled] == truth).mean()), 4)
+        report["convertedAccuracy"] = round(float((cand_top1[labeled] == truth).mean()), 4)
+        report["accuracyDelta"] = round(report["convertedAccuracy"] - report["kerasAccuracy"], 4)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=["tflite", "onnx"], default="tflite")
+    parser.add_argument("--quantize", choices=["none", "dynamic", "int8"], default="none",
+                        help="int8 = full-integer post-training quantization (needs --calibration-dir)")
+    parser.add_argument("--keras-model", default=str(default_model_path("keras")))
+    parser.add_argument("--output", help="Defaults to model/mainModel.<format>")
+    parser.add_argument("--calibration-dir", help="Sample leaf images for int8 calibration and the accuracy check")
+    parser.add_argument("--eval-dir", help="Images for the accuracy check (defaults to --calibration-dir)")
+    parser.add_argument("--max-samples", type=int, default=500)
+    parser.add_argument("--min-agreement", type=float, default=0.98,
+                        help="Fail if top-1 agreement with the Keras model falls below this")
+    args = parser.parse_args()
+
+    if args.quantize == "int8" and not args.calibration_dir:
+        parser.error("--quantize int8 needs --calibration-dir")
+    output = Path(args.output) if args.output else default_model_path(args.format)
+
+    import tensorflow as tf
+    keras_model = tf.keras.models.load_model(args.keras_model)
+    calibration = None
+    if args.calibration_dir:
+        calibration, _ = load_samples(args.calibration_dir, args.max_samples)
+
+    started = time.perf_counter()
+    if args.format == "tflite":
+        export_tflite(keras_model, output, args.quantize, calibration)
+    else:
+        export_onnx(keras_model, output, args.quantize, calibration)
+    print(f"Wrote {output} ({output.stat().st_size / 1e6:.1f} MB, quantize={args.quantize}) "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    eval_dir = args.eval_dir or args.calibration_dir
+    if not eval_dir:
+        print("No --eval-dir/--calibration-dir given; skipping the accuracy check.")
+        return
+
+    images, labels = load_samples(eval_dir, args.max_samples)
+    reference = load_runtime("keras", args.keras_model)
+    candidate = load_runtime(args.format, output)
+    report = compare(reference, candidate, images, labels)
+    report.update({"format": args.format, "quantize": args.quantize, "output": str(output)})
+    report_path = output.with_name(output.name + ".report.json")
+    report_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print(f"Top-1 agreement with Keras: {report['top1Agreement']:.2%} over {report['samples']} images "
+          f"(mean |Δp| {report['meanAbsProbDelta']:.4f})")
+    if "accuracyDelta" in report:
+        print(f"Accuracy: keras {report['kerasAccuracy']:.2%} -> {args.format} {report['convertedAccuracy']:.2%} "
+              f"(Δ {report['accuracyDelta']:+.2%})")
+    print(f"Latency: keras {report['kerasMsPerImage']} ms/img -> {args.format} {report['convertedMsPerImage']} ms/img")
+    print(f"Report written to {report_path}")
+    if report["top1Agreement"] < args.min_agreement:
+        raise SystemExit(f"Top-1 agreement {report['top1Agreement']:.2%} is below --min-agreement {args.min_agreement:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Streaming embedding stage used by scripts/ingest.py.
+
+Chunks arrive in fixed-size batches. Each batch is looked up in a persistent
+embedding cache (SQLite, keyed by model + chunk text hash); only misses are
+encoded, either in-process or across a pool of worker processes that each
+load the sentence-transformers model once. At most a few batches are in
+flight at a time, so memory stays flat however large the corpus is.
+"""
+import hashlib
+import itertools
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def batched(iterable, size):
+    it = iter(iterable)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+class EmbeddingCache:
+    """Persistent chunk-hash -> float32 vector store."""
+
+    def __init__(self, path, model_name):
+        self.model_name = model_name
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path))
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        found = {}
+        for group in batched(keys, 500):
+            marks = ",".join("?" * len(group))
+            for key, blob in self._db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", group):
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+            [(key, np.asarray(vec, dtype=np.float32).tobytes()) for key, vec in items],
+        )
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+# --- worker-process side ---
+_worker_model = None
+
+
+def _init_worker(model_name, threads):
+    global _worker_model
+    import torch
+    torch.set_num_threads(threads)
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode(texts, batch_size):
+    vectors = _worker_model.encode(texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True)
+    return vectors.astype(np.float32)
+
+
+class LazyEmbeddings(Embeddings):
+    """Defers loading the embedding model until something actually embeds in-process."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self._factory()
+        return self._model
+
+    def embed_documents(self, texts):
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.model.embed_query(text)
+
+
+class ChunkEmbedder:
+    """Embeds batches of Documents, reusing cached vectors and a process pool."""
+
+    def __init__(self, embeddings, model_name, batch_size=64, workers=1, cache=None):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.workers = workers
+        self.cache = cache
+        self.embedded = 0
+        self._pool = None
+        if workers > 1:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(model_name, threads)
+            )
+
+    def _submit(self, texts):
+        if self._pool is not None:
+            return self._pool.submit(_encode, texts, self.batch_size)
+        future = Future()
+        future.set_result(np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32))
+        return future
+
+    def _start(self, batch):
+        texts = [doc.page_content for doc in batch]
+        if self.cache is not None:
+            keys = [self.cache.key(t) for t in texts]
+            cached = self.cache.get_many(keys)
+            missing = [i for i, key in enumerate(keys) if key not in cached]
+        else:
+            keys, cached, missing = [], {}, list(range(len(texts)))
+        future = self._submit([texts[i] for i in missing]) if missing else None
+        return batch, keys, cached, missing, future
+
+    def _finish(self, pending):
+        batch, keys, cached, missing, future = pending
+        fresh = future.result() if future is not None else np.empty((0, 0), dtype=np.float32)
+        if self.cache is not None and missing:
+            self.cache.put_many((keys[i], fresh[j]) for j, i in enumerate(missing))
+        self.embedded += len(missing)
+        rows = {i: fresh[j] for j, i in enumerate(missing)}
+        vectors = np.stack([rows[i] if i in rows else cached[keys[i]] for i in range(len(batch))])
+        return batch, vectors
+
+    def embed_stream(self, docs):
+        """Yield (documents, float32 vectors) per batch, in input order."""
+        in_flight = deque()
+        max_in_flight = max(2, self.workers * 2)
+        for batch in batched(docs, self.batch_size):
+            in_flight.append(self._start(batch))
+            if len(in_flight) >= max_in_flight:
+                yield self._finish(in_flight.popleft())
+        while in_flight:
+            yield self._finish(in_flight.popleft())
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+
+class Throughput:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.chunks = 0
+
+    def add(self, n):
+        self.chunks += n
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def chunks_per_s(self):
+        return self.chunks / self.elapsed if self.elapsed > 0 else 0.0
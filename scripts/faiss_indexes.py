@@ -0,0 +1,154 @@
+"""
+Approximate FAISS index types for scripts/ingest.py, and a recall/latency
+report against the exact (flat) index.
+
+Ingest always maintains an exact IndexFlatL2 as the master copy (it supports
+deletes, so incremental updates keep working) and, when an approximate type
+is requested, builds that index from the master's vectors in the same row
+order so LangChain's index_to_docstore_id mapping still applies.
+"""
+import math
+import time
+
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq", "pq")
+
+
+def index_spec(args, dim):
+    """The requested index as a plain dict (stored in the manifest)."""
+    spec = {"type": args.index}
+    # dim=None gives the user's request alone, which the manifest compares between runs
+    if args.index in ("ivf", "ivfpq"):
+        spec["nlist"] = args.nlist
+    if args.index == "hnsw":
+        spec["m"] = args.hnsw_m
+        spec["ef_construction"] = args.hnsw_ef_construction
+    if args.index in ("ivfpq", "pq"):
+        spec["pq_m"] = args.pq_m
+        spec["pq_bits"] = args.pq_bits
+    if dim is not None:
+        spec["dim"] = dim
+    return spec
+
+
+def _factory_string(spec):
+    kind = spec["type"]
+    if kind == "ivf":
+        return f"IVF{spec['nlist']},Flat"
+    if kind == "hnsw":
+        return f"HNSW{spec['m']},Flat"
+    if kind == "ivfpq":
+        return f"IVF{spec['nlist']},PQ{spec['pq_m']}x{spec['pq_bits']}"
+    if kind == "pq":
+        return f"PQ{spec['pq_m']}x{spec['pq_bits']}"
+    raise ValueError(f"Unknown index type {kind}")
+
+
+def resolve_spec(spec, n):
+    """Fill in automatic values and check that `n` vectors can train this index."""
+    spec = dict(spec)
+    if spec["type"] in ("ivf", "ivfpq"):
+        if not spec.get("nlist"):
+            spec["nlist"] = max(1, int(4 * math.sqrt(n)))
+        # k-means wants a few dozen points per list
+        spec["nlist"] = max(1, min(spec["nlist"], n // 39 or 1))
+    if spec["type"] in ("ivfpq", "pq"):
+        if spec["dim"] % spec["pq_m"]:
+            raise ValueError(f"--pq-m {spec['pq_m']} must divide the embedding size {spec['dim']}")
+        if n < 2 ** spec["pq_bits"]:
+            raise ValueError(f"PQ with {spec['pq_bits']} bits needs at least {2 ** spec['pq_bits']} chunks to train; have {n}")
+    return spec
+
+
+def build_index(vectors, spec):
+    import faiss
+    index = faiss.index_factory(vectors.shape[1], _factory_string(spec), faiss.METRIC_L2)
+    if spec["type"] == "hnsw":
+        index.hnsw.efConstruction = spec["ef_construction"]
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def all_vectors(index):
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def get_search_param(index, name):
+    import faiss
+    if name == "nprobe":
+        return faiss.extract_index_ivf(index).nprobe
+    if name == "efSearch":
+        return index.hnsw.efSearch
+    return None
+
+
+def set_search_param(index, name, value):
+    import faiss
+    if name == "nprobe":
+        faiss.extract_index_ivf(index).nprobe = value
+    elif name == "efSearch":
+        index.hnsw.efSearch = value
+
+
+def _sweep(spec):
+    if spec["type"] in ("ivf", "ivfpq"):
+        nlist = spec["nlist"]
+        return "nprobe", sorted({p for p in (1, 2, 4, 8, 16, 32, 64, 128) if p <= nlist} | {nlist})
+    if spec["type"] == "hnsw":
+        return "efSearch", [16, 32, 64, 128, 256]
+    return None, [None]
+
+
+def recall_report(exact, approx, spec, ks=(1, 4, 8), n_queries=200, seed=0):
+    """Recall@k and per-query latency of `approx` vs `exact` over perturbed chunk embeddings.
+
+    The sweep changes `approx`'s nprobe/efSearch; it is set back to its
+    value from before the sweep, so the index is saved with its defaults.
+    """
+    rng = np.random.default_rng(seed)
+    base = all_vectors(exact)
+    picks = rng.choice(len(base), size=min(n_queries, len(base)), replace=False)
+    # Jitter stored vectors so queries are near, not identical to, indexed chunks
+    queries = base[picks] + rng.normal(scale=0.3 / math.sqrt(base.shape[1]), size=(len(picks), base.shape[1]))
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+    k_max = min(max(ks), exact.ntotal)
+
+    def timed_search(index):
+        started = time.perf_counter()
+        ids = np.stack([index.search(q[None, :], k_max)[1][0] for q in queries])
+        return ids, (time.perf_counter() - started) * 1000.0 / len(queries)
+
+    truth, exact_ms = timed_search(exact)
+    param, values = _sweep(spec)
+    default = get_search_param(approx, param) if param else None
+    rows = []
+    try:
+        for value in values:
+            if param:
+                set_search_param(approx, param, value)
+            found, ms = timed_search(approx)
+            row = {"latency_ms": round(ms, 4)}
+            if param:
+                row[param] = value
+            for k in ks:
+                k = min(k, k_max)
+                hits = sum(len(set(found[i, :k]) & set(truth[i, :k])) for i in range(len(queries)))
+                row[f"recall@{k}"] = round(hits / (k * len(queries)), 4)
+            rows.append(row)
+    finally:
+        if param:
+            set_search_param(approx, param, default)
+    return {"index": spec, "queries": len(queries), "exact_latency_ms": round(exact_ms, 4), "results": rows}
+
+
+def format_report(report):
+    lines = [f"Index {report['index']['type']} vs exact over {report['queries']} queries "
+             f"(exact: {report['exact_latency_ms']:.3f} ms/query)"]
+    for row in report["results"]:
+        params = " ".join(f"{k}={v}" for k, v in row.items() if k not in ("latency_ms",) and not k.startswith("recall"))
+        recalls = " ".join(f"{k}={v:.3f}" for k, v in row.items() if k.startswith("recall"))
+        lines.append(f"  {params:<14} {row['latency_ms']:.3f} ms/query  {recalls}")
+    return "\n".join(lines)
@@ -2,45 +2,276 @@
 Builds a FAISS vector store from ./knowledge using Hugging Face embeddings.
 Run after seeding knowledge:
     python scripts/seed_knowledge.py
-    python scripts/ingest.py
+    python scripts/ingest.py            # incremental: only re-embeds changed chunks
+    python scripts/ingest.py --full     # rebuild everything from scratch
+    python scripts/ingest.py --workers 4 --batch-size 128
+    python scripts/ingest.py --index ivf --nlist 256   # or hnsw / ivfpq / pq
+
+A manifest.json next to the index records a content hash per source file and
+a content+offset hash per chunk. Unchanged files are skipped, and within a
+changed file only new or moved chunks are added while stale ones are deleted
+from the index. Each build
+is written to a fresh generation directory and published atomically (see
+shared/vectorstore_layout.py).
+
+Files are read, chunked, embedded and added to the index as a stream of
+batches (scripts/embedding_pipeline.py), and vectors are cached by chunk hash
+in vectorstore/embedding_cache.sqlite, so re-ingesting unchanged text is free.
+
+--index picks an approximate index type (scripts/faiss_indexes.py). The exact
+flat index is kept alongside it as exact.faiss for incremental updates, and
+index_report.json records recall@k vs. latency against it.
+
+Stores are saved without pickle (shared/vectorstore_io.py): index.faiss plus
+docstore.sqlite, which the frontend memory-maps and reads lazily. A BM25
+keyword index over the same chunks (shared/keyword_index.py) is written into
+docstore.sqlite for the frontend's hybrid retrieval.
 """
-import os
+import argparse
+import hashlib
+import json
+import sys
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 
+import faiss
+
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.docstore.document import Document
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from shared.keyword_index import KeywordIndex, build_keyword_index
+from shared.vectorstore_io import DOCSTORE_FILE, is_sqlite_store, load_store_for_update, save_store
+from shared.vectorstore_layout import current_store_dir, new_generation_dir, publish_generation
+from embedding_pipeline import ChunkEmbedder, EmbeddingCache, LazyEmbeddings, Throughput
+from faiss_indexes import INDEX_TYPES, all_vectors, build_index, format_report, index_spec, recall_report, resolve_spec
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 120
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 2
+EMBEDDING_CACHE_FILE = "embedding_cache.sqlite"
+EXACT_INDEX_FILE = "exact.faiss"
+INDEX_REPORT_FILE = "index_report.json"
+
+
+def sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
 def load_markdown_docs(knowledge_dir: Path):
-    docs = []
+    """Yield one Document per markdown file, reading files lazily."""
     for md in sorted(knowledge_dir.glob("*.md")):
         text = md.read_text(encoding="utf-8")
-        docs.append(Document(page_content=text, metadata={"source": md.name}))
-    return docs
+        yield Document(page_content=text, metadata={"source": md.name})
+
+
+def split_with_ids(splitter, doc):
+    """Split one file and give every chunk a stable id derived from its content and position."""
+    chunks = splitter.split_documents([doc])
+    ids, seen = [], {}
+    for chunk in chunks:
+        # The offset is part of the id: a chunk that moved within an edited file gets a new id, so
+        # its stored start_index is never stale (its vector still comes from the embedding cache)
+        base = sha256(f"{chunk.metadata['source']}\0{chunk.metadata.get('start_index')}\0{chunk.page_content}")
+        # Identical chunks within one file still need distinct ids
+        n = seen.get(base, 0)
+        seen[base] = n + 1
+        chunk_id = base if n == 0 else f"{base}-{n}"
+        chunk.metadata["chunk_id"] = chunk_id
+        ids.append(chunk_id)
+    return chunks, ids
+
+
+def load_manifest(store_dir):
+    if store_dir is None or not (store_dir / MANIFEST_FILE).exists():
+        return None
+    return json.loads((store_dir / MANIFEST_FILE).read_text(encoding="utf-8"))
+
+
+def build_settings():
+    return {
+        "manifest_version": MANIFEST_VERSION,
+        "embedding_model": EMBEDDING_MODEL,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+    }
+
+
+class ChangePlan:
+    """Diffs knowledge files against the manifest while streaming out chunks to embed."""
+
+    def __init__(self, splitter, old_files):
+        self.splitter = splitter
+        self.old_files = old_files
+        self.files = {}
+        self.to_delete = []
+        self.total_chunks = 0
+
+    def new_chunks(self, docs):
+        for doc in docs:
+            source = doc.metadata["source"]
+            file_hash = sha256(doc.page_content)
+            old = self.old_files.get(source)
+            if old and old["sha256"] == file_hash:
+                self.files[source] = old
+                self.total_chunks += len(old["chunks"])
+                continue
+            chunks, ids = split_with_ids(self.splitter, doc)
+            old_ids = set(old["chunks"]) if old else set()
+            self.to_delete.extend(old_ids - set(ids))
+            self.files[source] = {"sha256": file_hash, "chunks": ids}
+            self.total_chunks += len(ids)
+            for chunk, chunk_id in zip(chunks, ids):
+                if chunk_id not in old_ids:
+                    yield chunk
+
+        for source, old in self.old_files.items():
+            if source not in self.files:
+                self.to_delete.extend(old["chunks"])
+
+
+def has_keyword_index(store_dir):
+    """False for stores saved before BM25 postings were written, so they get rebuilt."""
+    keywords = KeywordIndex.open(store_dir / DOCSTORE_FILE)
+    if keywords is None:
+        return False
+    keywords.close()
+    return True
+
+
+def empty_store(embeddings, dim):
+    return FAISS(
+        embedding_function=embeddings,
+        index=faiss.IndexFlatL2(dim),
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
+    )
+
 
 def main():
+    parser = argparse.ArgumentParser(description="Build or update the FAISS vector store.")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and rebuild from scratch")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks per embedding batch")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Embedding processes; 1 embeds in this process")
+    parser.add_argument("--no-embedding-cache", action="store_true", help="Always re-embed chunks")
+    parser.add_argument("--index", choices=INDEX_TYPES, default="flat", help="FAISS index type to serve")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0 = about 4*sqrt(chunks))")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="HNSW neighbours per node")
+    parser.add_argument("--hnsw-ef-construction", type=int, default=40)
+    parser.add_argument("--pq-m", type=int, default=48, help="PQ sub-quantizers (must divide the embedding size)")
+    parser.add_argument("--pq-bits", type=int, default=8, help="Bits per PQ code")
+    parser.add_argument("--report-queries", type=int, default=200, help="Queries for the recall/latency report")
+    args = parser.parse_args()
+
     load_dotenv()
     knowledge_dir = Path("knowledge")
     assert knowledge_dir.exists(), "Run scripts/seed_knowledge.py first to create ./knowledge files."
+    vectorstore_path = Path(__file__).parent.parent / "vectorstore"
 
-    raw_docs = load_markdown_docs(knowledge_dir)
-    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=120)
-    splits = splitter.split_documents(raw_docs)
+    # start_index lets the chatbot merge neighbouring chunks back into one passage
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, add_start_index=True)
 
-    # Initialize Hugging Face embeddings
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
-    )
+    # Initialize Hugging Face embeddings (loaded only if this process has to embed)
+    def load_embeddings():
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL,
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'normalize_embeddings': True}
+        )
+
+    embeddings = LazyEmbeddings(load_embeddings)
+
+    store_dir = current_store_dir(vectorstore_path)
+    manifest = None if args.full else load_manifest(store_dir)
+    settings = build_settings()
+    if manifest is not None and manifest.get("settings") != settings:
+        print("Embedding model or chunking settings changed; doing a full rebuild.")
+        manifest = None
+    if manifest is not None and not is_sqlite_store(store_dir):
+        # Pickled stores are never loaded; rebuilding from the knowledge files needs no unpickling
+        print("Existing store was saved with pickle; doing a full rebuild.")
+        manifest = None
+    old_files = manifest["files"] if manifest else {}
+
+    vs = None
+    if manifest is not None:
+        vs = load_store_for_update(store_dir, embeddings)
+        if (store_dir / EXACT_INDEX_FILE).exists():
+            # Apply changes to the exact master copy; the approximate index is rebuilt from it
+            vs.index = faiss.read_index(str(store_dir / EXACT_INDEX_FILE))
+
+    cache = None if args.no_embedding_cache else EmbeddingCache(vectorstore_path / EMBEDDING_CACHE_FILE, EMBEDDING_MODEL)
+    embedder = ChunkEmbedder(embeddings, EMBEDDING_MODEL, batch_size=args.batch_size, workers=args.workers, cache=cache)
+    plan = ChangePlan(splitter, old_files)
+    throughput = Throughput()
+    added = 0
+    try:
+        # load -> chunk -> embed -> add, one batch at a time
+        for batch, vectors in embedder.embed_stream(plan.new_chunks(load_markdown_docs(knowledge_dir))):
+            if vs is None:
+                vs = empty_store(embeddings, vectors.shape[1])
+            vs.add_embeddings(
+                [(doc.page_content, vec.tolist()) for doc, vec in zip(batch, vectors)],
+                metadatas=[doc.metadata for doc in batch],
+                ids=[doc.metadata["chunk_id"] for doc in batch],
+            )
+            added += len(batch)
+            throughput.add(len(batch))
+    finally:
+        embedder.close()
+        if cache is not None:
+            cache.close()
+
+    index_request = index_spec(args, None)
+    index_changed = manifest is not None and manifest.get("index_request") != index_request
+    if (manifest is not None and not added and not plan.to_delete and not index_changed
+            and has_keyword_index(store_dir)):
+        print(f"Vectorstore is up to date ({plan.total_chunks} chunks from {len(plan.files)} files).")
+        return
+    if vs is None:
+        raise SystemExit(f"No chunks to index under {knowledge_dir}.")
+    if plan.to_delete:
+        vs.delete(plan.to_delete)
+
+    gen_dir = new_generation_dir(vectorstore_path)
+    exact = vs.index
+    spec, report = {"type": "flat"}, None
+    if args.index != "flat":
+        try:
+            spec = resolve_spec(index_spec(args, exact.d), exact.ntotal)
+        except ValueError as e:
+            print(f"Cannot build a {args.index} index ({e}); serving the exact flat index instead.")
+            spec = {"type": "flat"}
+    if spec["type"] != "flat":
+        started = time.perf_counter()
+        approx = build_index(all_vectors(exact), spec)
+        print(f"Built {spec} index in {time.perf_counter() - started:.2f}s")
+        faiss.write_index(exact, str(gen_dir / EXACT_INDEX_FILE))
+        report = recall_report(exact, approx, spec, n_queries=args.report_queries)
+        (gen_dir / INDEX_REPORT_FILE).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        vs.index = approx
+
+    save_store(vs, gen_dir)
+    build_keyword_index(gen_dir / DOCSTORE_FILE)
+    manifest = {"settings": settings, "index_request": index_request, "index": spec, "files": plan.files}
+    (gen_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    publish_generation(vectorstore_path, gen_dir)
+
+    mode = "Rebuilt" if not old_files else "Updated"
+    cache_note = f", {cache.hits} from embedding cache" if cache is not None else ""
+    print(f"{mode} vectorstore: {plan.total_chunks} chunks from {len(plan.files)} files "
+          f"(+{added} added, {embedder.embedded} embedded{cache_note}, -{len(plan.to_delete)} removed) -> {gen_dir}")
+    print(f"Ingest throughput: {throughput.chunks_per_s:.1f} chunks/s over {throughput.elapsed:.2f}s")
+    if report is not None:
+        print(format_report(report))
 
-    # Build FAISS vector store
-    vs = FAISS.from_documents(splits, embeddings)
-    vectorstore_path = Path(__file__).parent.parent / "vectorstore"
-    vs.save_local(str(vectorstore_path))
-    print(f"Built vectorstore with {len(splits)} chunks from {len(raw_docs)} files -> {vectorstore_path}")
 
 if __name__ == "__main__":
     main()
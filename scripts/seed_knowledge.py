@@ -2,6 +2,7 @@
 Writes curated tomato disease markdown files to ./knowledge.
 Run once before ingest:
     python scripts/seed_knowledge.py
+After editing DISEASES, also run scripts/build_knowledge_bundle.py.
 """
 from pathlib import Path
 import textwrap
@@ -146,7 +147,7 @@ def to_markdown(d):
         "",
         f"**Notes:** {d['notes']}",
     ]
-    return "\\n".join(lines)
+    return "\n".join(lines)
 
 def main():
     out_dir = Path("knowledge")
@@ -1,8 +1,25 @@
 """
 Disease name mapping between CNN model classes and knowledge base slugs.
 This ensures consistent naming across the RAG chatbot and image classifier.
+The services read these tables from the compiled shared/knowledge_bundle.json;
+run scripts/build_knowledge_bundle.py after changing them.
 """
 
+# CNN output classes, in the order of the model's softmax outputs
+CLASS_NAMES = [
+    'Tomato_Bacterial_spot',
+    'Tomato_Early_blight',
+    'Tomato_Late_blight',
+    'Tomato_Leaf_Mold',
+    'Tomato_Septoria_leaf_spot',
+    'Tomato_Spider_mites_Two-spotted_spider_mite',
+    'Tomato_Target_Spot',
+    'Tomato_Yellow_Leaf_Curl_Virus',
+    'Tomato_mosaic_virus',
+    'Tomato_healthy',
+    'Tomato_Leaf_Curl_Virus'
+]
+
 # Mapping from CNN model class names to knowledge base slugs
 CNN_TO_KB_MAPPING = {
     'Tomato_Bacterial_spot': 'bacterial-spot',
@@ -0,0 +1,97 @@
+"""
+Prebuilt BM25 keyword index stored next to the chunks in docstore.sqlite.
+
+scripts/ingest.py calls build_keyword_index() after saving a generation; it
+tokenizes every chunk once and writes an inverted index (term -> rows with
+term frequency) plus per-row lengths. At query time KeywordIndex scores only
+the postings of the query's terms, optionally restricted to a set of rows
+(e.g. the chunks of one disease file).
+"""
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in into is it its my of on or "
+    "so than that the their them then there these this to was what when which while who why will with "
+    "you your".split()
+)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in _STOPWORDS]
+
+
+def build_keyword_index(db_path):
+    """Add BM25 postings for every row of the `chunks` table in `db_path`."""
+    db = sqlite3.connect(str(db_path))
+    db.execute("DROP TABLE IF EXISTS bm25_postings")
+    db.execute("DROP TABLE IF EXISTS bm25_lengths")
+    db.execute("CREATE TABLE bm25_postings (term TEXT NOT NULL, row INTEGER NOT NULL, tf INTEGER NOT NULL)")
+    db.execute("CREATE TABLE bm25_lengths (row INTEGER PRIMARY KEY, length INTEGER NOT NULL)")
+    postings, lengths = [], []
+    for row, text in db.execute("SELECT row, text FROM chunks ORDER BY row").fetchall():
+        terms = Counter(tokenize(text))
+        lengths.append((row, sum(terms.values())))
+        postings.extend((term, row, tf) for term, tf in terms.items())
+    db.executemany("INSERT INTO bm25_postings (term, row, tf) VALUES (?, ?, ?)", postings)
+    db.executemany("INSERT INTO bm25_lengths (row, length) VALUES (?, ?)", lengths)
+    db.execute("CREATE INDEX bm25_postings_term ON bm25_postings (term)")
+    db.commit()
+    db.close()
+    return len(lengths)
+
+
+class KeywordIndex:
+    """Read-only BM25 scorer over the postings written by build_keyword_index()."""
+
+    def __init__(self, db):
+        self._db = db
+        self._lock = threading.Lock()
+        self.lengths = dict(db.execute("SELECT row, length FROM bm25_lengths").fetchall())
+        self.avg_length = (sum(self.lengths.values()) / len(self.lengths)) if self.lengths else 0.0
+
+    @classmethod
+    def open(cls, db_path):
+        """KeywordIndex for `db_path`, or None for stores built without one."""
+        db_path = Path(db_path)
+        if not db_path.exists():
+            return None
+        db = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+        tables = {r[0] for r in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "bm25_postings" not in tables:
+            db.close()
+            return None
+        return cls(db)
+
+    def _postings(self, term):
+        with self._lock:
+            return self._db.execute("SELECT row, tf FROM bm25_postings WHERE term = ?", (term,)).fetchall()
+
+    def search(self, query, k, rows=None):
+        """Top-k (row, score) pairs for `query`; `rows` limits scoring to those rows."""
+        allowed = set(rows) if rows is not None else None
+        n = len(self.lengths)
+        scores = Counter()
+        for term in set(tokenize(query)):
+            postings = self._postings(term)
+            if not postings:
+                continue
+            # idf uses corpus-wide document frequency even when results are filtered
+            idf = math.log(1.0 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row, tf in postings:
+                if allowed is not None and row not in allowed:
+                    continue
+                norm = 1.0 - BM25_B + BM25_B * self.lengths[row] / self.avg_length
+                scores[row] += idf * tf * (BM25_K1 + 1.0) / (tf + BM25_K1 * norm)
+        return scores.most_common(k)
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,102 @@
+"""
+Loader for the compiled disease metadata bundle (shared/knowledge_bundle.json).
+
+scripts/build_knowledge_bundle.py compiles CLASS_NAMES, CNN_TO_KB_MAPPING,
+KB_TO_HUMAN and the curated DISEASES into one versioned file: a class-index
+table (class name, knowledge slug, human name) and, per disease, character
+offsets of each section inside one shared text blob. Both services load it
+once per process; every lookup afterwards is a list index or dict get.
+"""
+import json
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+
+BUNDLE_FILE = Path(__file__).resolve().parent / "knowledge_bundle.json"
+SCHEMA_VERSION = 1
+SECTIONS = ("overview", "symptoms", "favorable_conditions", "management", "notes")
+SECTION_TITLES = {
+    "overview": "Overview",
+    "symptoms": "Key Symptoms",
+    "favorable_conditions": "Favorable Conditions",
+    "management": "Management & Control",
+    "notes": "Notes",
+}
+
+
+class KnowledgeBundle:
+    def __init__(self, data):
+        if data.get("schema") != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported knowledge bundle schema {data.get('schema')!r}")
+        self.version = data["version"]
+        self._text = data["text"]
+        self._classes = [tuple(row) for row in data["classes"]]
+        self._class_index = {row[0]: i for i, row in enumerate(self._classes)}
+        self._diseases = data["diseases"]
+        # Phrases that name each disease in a question: human name, slug, pathogen
+        self.aliases = {}
+        for slug, disease in self._diseases.items():
+            names = {disease["human"].lower(), slug.replace("-", " ")}
+            pathogen = re.search(r"\(([^)]+)\)", disease["title"])
+            # Binomials and acronyms ("Phytophthora infestans", "ToMV"), not notes like "(abiotic)"
+            if pathogen and (" " in pathogen.group(1) or pathogen.group(1)[1:].lower() != pathogen.group(1)[1:]):
+                names.add(pathogen.group(1).lower())
+            self.aliases[slug] = sorted(names, key=len, reverse=True)
+
+    @classmethod
+    def load(cls, path=None):
+        path = Path(path or os.getenv("KNOWLEDGE_BUNDLE_PATH") or BUNDLE_FILE)
+        return cls(json.loads(path.read_text(encoding="utf-8")))
+
+    @property
+    def class_names(self):
+        return [row[0] for row in self._classes]
+
+    @property
+    def slugs(self):
+        return list(self._diseases)
+
+    def __len__(self):
+        return len(self._classes)
+
+    def entry(self, index):
+        """(class name, knowledge slug or None, human name) for a CNN output index."""
+        return self._classes[index]
+
+    def class_index(self, class_name):
+        return self._class_index.get(class_name)
+
+    def slug_for_class(self, class_name):
+        index = self._class_index.get(class_name)
+        return self._classes[index][1] if index is not None else None
+
+    def disease(self, slug):
+        return self._diseases.get(slug)
+
+    def human_name(self, slug):
+        disease = self._diseases.get(slug)
+        return disease["human"] if disease else slug.replace("-", " ").title()
+
+    def section(self, slug, name):
+        disease = self._diseases.get(slug)
+        if disease is None or name not in disease["sections"]:
+            return None
+        start, end = disease["sections"][name]
+        return self._text[start:end]
+
+    def items(self, slug, name):
+        """Bullet items of a list section (symptoms, favorable_conditions, management)."""
+        text = self.section(slug, name)
+        if text is None:
+            return []
+        return [line[2:].strip() for line in text.splitlines() if line.startswith("- ")]
+
+    def management(self, slug):
+        return self.items(slug, "management")
+
+
+@lru_cache(maxsize=None)
+def load_bundle(path=None):
+    """The bundle, parsed once per process."""
+    return KnowledgeBundle.load(path)
@@ -0,0 +1,203 @@
+"""
+Pickle-free persisted vector store.
+
+A store directory holds:
+    index.faiss      FAISS index, written with faiss.write_index and opened
+                     memory-mapped, so processes share its pages through the
+                     OS page cache instead of each holding a private copy
+    docstore.sqlite  one row per index position: chunk id, text and JSON
+                     metadata, looked up by row on demand
+
+Nothing is unpickled on load, so allow_dangerous_deserialization is not
+needed. Stores written by LangChain's save_local (index.pkl) are refused
+with LegacyStoreError; scripts/ingest.py rebuilds them from the knowledge
+files.
+"""
+import json
+import logging
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+DOCSTORE_FILE = "docstore.sqlite"
+INDEX_FILE = "index.faiss"
+
+logger = logging.getLogger(__name__)
+
+
+class LegacyStoreError(RuntimeError):
+    """The directory holds a pickled (save_local) store, which is never unpickled."""
+
+
+def _mmap_flags(faiss):
+    """Flag sets to try in order: in-place mmap of flat codes (faiss >= 1.8), then plain mmap."""
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    return [flags | ifc, flags] if ifc else [flags]
+
+
+def read_index(path, mmap=True):
+    """Open the index memory-mapped when faiss can, else read it into RAM (and say so).
+
+    Flat, HNSW and PQ indexes map with the in-place flag; IVF inverted lists
+    don't, but map as OnDiskInvertedLists with the plain mmap flag.
+    """
+    import faiss
+    if mmap:
+        errors = []
+        for flags in _mmap_flags(faiss):
+            try:
+                return faiss.read_index(str(path), flags)
+            except RuntimeError as e:
+                errors.append(str(e).strip().splitlines()[0])
+        logger.warning("Could not memory-map %s (%s); reading it fully into RAM, so each process "
+                       "holds its own copy", path, "; ".join(errors))
+    return faiss.read_index(str(path))
+
+
+class SQLiteDocstore(Docstore):
+    """Read-only docstore over docstore.sqlite; ids passed to search() are index rows."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        uri = f"{self.path.resolve().as_uri()}?mode=ro"
+        self._db = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        # Streamlit serves sessions from several threads
+        self._lock = threading.Lock()
+        with self._lock:
+            self._count = self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def __len__(self):
+        return self._count
+
+    @staticmethod
+    def _to_document(row, chunk_id, text, metadata):
+        return Document(id=chunk_id, page_content=text, metadata=json.loads(metadata))
+
+    def search(self, search):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT row, id, text, metadata FROM chunks WHERE row = ?", (int(search),)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return self._to_document(*row)
+
+    def by_rows(self, rows):
+        """Documents for the given index rows, keyed by row."""
+        rows = [int(r) for r in rows]
+        if not rows:
+            return {}
+        marks = ",".join("?" * len(rows))
+        with self._lock:
+            found = self._db.execute(
+                f"SELECT row, id, text, metadata FROM chunks WHERE row IN ({marks})", rows
+            ).fetchall()
+        return {r[0]: self._to_document(*r) for r in found}
+
+    def rows_where(self, key, value):
+        """Index rows whose metadata[key] == value."""
+        with self._lock:
+            found = self._db.execute(
+                "SELECT row FROM chunks WHERE json_extract(metadata, ?) = ?", (f"$.{key}", value)
+            ).fetchall()
+        return [r[0] for r in found]
+
+    def iter_all(self):
+        with self._lock:
+            found = self._db.execute("SELECT row, id, text, metadata FROM chunks ORDER BY row").fetchall()
+        for r in found:
+            yield r[0], self._to_document(*r)
+
+    def close(self):
+        self._db.close()
+
+
+class RowIds(Mapping):
+    """index_to_docstore_id stand-in: index row i maps to docstore key i, without a dict."""
+
+    def __init__(self, count):
+        self._count = count
+
+    def __getitem__(self, i):
+        if not 0 <= int(i) < self._count:
+            raise KeyError(i)
+        return int(i)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return iter(range(self._count))
+
+
+def is_sqlite_store(store_dir):
+    return (Path(store_dir) / DOCSTORE_FILE).exists()
+
+
+def _require_sqlite_store(store_dir):
+    if not is_sqlite_store(store_dir):
+        raise LegacyStoreError(
+            f"{store_dir} has no {DOCSTORE_FILE}; it was saved by an older version with pickle. "
+            "Run `python scripts/ingest.py` to rebuild it."
+        )
+
+
+def save_store(vs, store_dir):
+    """Write a LangChain FAISS store in this layout (rows follow index positions)."""
+    import faiss
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    faiss.write_index(vs.index, str(store_dir / INDEX_FILE))
+
+    db = sqlite3.connect(str(store_dir / DOCSTORE_FILE))
+    db.execute("CREATE TABLE chunks (row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)")
+    db.executemany(
+        "INSERT INTO chunks (row, id, text, metadata) VALUES (?, ?, ?, ?)",
+        (
+            (row, chunk_id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False))
+            for row, chunk_id in sorted(vs.index_to_docstore_id.items())
+            for doc in [vs.docstore.search(chunk_id)]
+        ),
+    )
+    db.commit()
+    db.close()
+
+
+def load_store(store_dir, embeddings, mmap=True):
+    """Read-only store for serving: memory-mapped index + lazy SQLite docstore."""
+    from langchain_community.vectorstores import FAISS
+    store_dir = Path(store_dir)
+    _require_sqlite_store(store_dir)
+    docstore = SQLiteDocstore(store_dir / DOCSTORE_FILE)
+    index = read_index(store_dir / INDEX_FILE, mmap=mmap)
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=RowIds(len(docstore)),
+    )
+
+
+def load_store_for_update(store_dir, embeddings):
+    """Fully in-memory, mutable store (for ingest to add/delete chunks)."""
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    store_dir = Path(store_dir)
+    _require_sqlite_store(store_dir)
+    reader = SQLiteDocstore(store_dir / DOCSTORE_FILE)
+    docs, mapping = {}, {}
+    for row, doc in reader.iter_all():
+        docs[doc.id] = doc
+        mapping[row] = doc.id
+    reader.close()
+    return FAISS(
+        embedding_function=embeddings,
+        index=read_index(store_dir / INDEX_FILE, mmap=False),
+        docstore=InMemoryDocstore(docs),
+        index_to_docstore_id=mapping,
+    )
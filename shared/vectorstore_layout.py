@@ -0,0 +1,68 @@
+"""
+On-disk layout of the vector store.
+
+scripts/ingest.py writes each build into its own generation directory under
+vectorstore/ and then atomically replaces vectorstore/CURRENT, a one-line
+pointer file naming the live generation. Readers resolve CURRENT first, so a
+running frontend sees either the old store or the new one, never a half-written
+mix. A flat vectorstore/ (index.faiss + index.pkl directly inside) from older
+ingests is still recognised.
+"""
+import os
+import shutil
+import time
+from pathlib import Path
+
+CURRENT_FILE = "CURRENT"
+GENERATION_PREFIX = "gen-"
+# The previous generation is kept so readers that resolved it mid-swap can finish
+KEEP_GENERATIONS = 2
+
+
+def current_store_dir(root):
+    """Directory holding the live index files, or None if nothing was ingested yet."""
+    root = Path(root)
+    pointer = root / CURRENT_FILE
+    if pointer.exists():
+        store_dir = root / pointer.read_text(encoding="utf-8").strip()
+        return store_dir if store_dir.is_dir() else None
+    if (root / "index.faiss").exists():
+        return root
+    return None
+
+
+def store_version(root):
+    """Opaque string that changes whenever a new store is published."""
+    store_dir = current_store_dir(root)
+    if store_dir is None:
+        return ""
+    stamps = [f"{p.name}:{p.stat().st_mtime_ns}" for p in sorted(store_dir.iterdir()) if p.is_file()]
+    return f"{store_dir.name}|" + "|".join(stamps)
+
+
+def new_generation_dir(root):
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    gen_dir = root / f"{GENERATION_PREFIX}{time.time_ns()}-{os.getpid()}"
+    gen_dir.mkdir()
+    return gen_dir
+
+
+def publish_generation(root, gen_dir):
+    """Atomically point CURRENT at `gen_dir` and prune old generations."""
+    root = Path(root)
+    tmp_pointer = root / f"{CURRENT_FILE}.tmp-{os.getpid()}"
+    tmp_pointer.write_text(Path(gen_dir).name, encoding="utf-8")
+    os.replace(tmp_pointer, root / CURRENT_FILE)
+
+    # Files from the legacy flat layout are superseded by the pointer
+    for legacy in ("index.faiss", "index.pkl"):
+        (root / legacy).unlink(missing_ok=True)
+
+    generations = sorted(
+        (p for p in root.iterdir() if p.is_dir() and p.name.startswith(GENERATION_PREFIX)),
+        key=lambda p: int(p.name[len(GENERATION_PREFIX):].split("-")[0]),
+    )
+    for old in generations[:-KEEP_GENERATIONS]:
+        if old.name != Path(gen_dir).name:
+            shutil.rmtree(old, ignore_errors=True)
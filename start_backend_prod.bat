@@ -0,0 +1,4 @@
+@echo off
+echo Starting Tomato Disease Backend API (production server)...
+python backend\serve.py
+pause
@@ -0,0 +1,39 @@
+"""
+Import paths and shared fixtures for the test suite.
+
+The backend is imported as a package (backend.X, shared.X) from the repo
+root, while the frontend and the scripts import shared/ modules (and their
+siblings) by bare name, exactly as the services and scripts do when run from
+their own directories. benchmarks/ provides the offline stubs.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+for path in (ROOT, ROOT / "shared", ROOT / "frontend", ROOT / "scripts", ROOT / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+
+@pytest.fixture(scope="session")
+def backend(tmp_path_factory):
+    """backend.app, warmed up on the stub runtime, with its job queue in a temp dir."""
+    with pytest.MonkeyPatch.context() as mp:
+        # Read at import time
+        mp.setenv("JOBS_PATH", str(tmp_path_factory.mktemp("jobs") / "jobs.sqlite"))
+        mp.delenv("PREDICTION_CACHE_PATH", raising=False)
+        mp.setenv("PREDICT_MAX_WAIT_MS", "2")
+        from backend import app as backend
+        from stubs import StubClassifier
+        assert backend.init_backend(runtime=StubClassifier(len(backend.knowledge)))
+    yield backend
+    backend.job_runner.stop(timeout=5)
+    backend.batcher.stop(timeout=5)
+
+
+@pytest.fixture
+def client(backend):
+    return backend.app.test_client()
+
@@ -0,0 +1,166 @@
+import io
+import json
+import time
+import zipfile
+
+from stubs import synthetic_jpegs
+
+
+def jpegs(count, seed):
+    """Distinct uploads; each test uses its own seed so the prediction cache starts cold."""
+    return synthetic_jpegs(count, size=(256, 256), seed=seed)
+
+
+def upload(data, name="leaf.jpg"):
+    return (io.BytesIO(data), name)
+
+
+def zip_bytes(entries):
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+    return out.getvalue()
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_predict_misses_then_hits_the_cache(client, backend):
+    image = jpegs(1, seed=101)[0]
+    first = client.post("/predict", data={"file": upload(image)})
+    assert first.status_code == 200
+    assert first.headers["X-Cache"] == "MISS"
+    assert first.json["className"] in backend.knowledge.class_names + ["No leaf detected"]
+
+    second = client.post("/predict", data={"file": upload(image)})
+    assert second.status_code == 200
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json == first.json
+
+
+def test_predict_rejects_missing_and_undecodable_files(client):
+    assert client.post("/predict", data={}).status_code == 400
+    response = client.post("/predict", data={"file": upload(b"not an image")})
+    assert response.status_code == 500
+    assert response.json == {"error": "Image preprocessing failed"}
+
+
+def test_readyz_reports_the_warm_model(client):
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json["ready"] is True
+
+
+def test_predict_batch_streams_ndjson_for_zip_and_files(client):
+    a, b, c = jpegs(3, seed=201)
+    archive = zip_bytes([("field/a.jpg", a), ("field/notes.txt", b"skipped"), ("field/b.jpeg", b)])
+    response = client.post("/predict/batch", data={
+        "archive": upload(archive, "field.zip"),
+        "files": [upload(c, "c.jpg"), upload(b"broken", "d.jpg")],
+    })
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+
+    lines = ndjson(response)
+    # files are read before archives
+    items, done = lines[:-1], lines[-1]
+    assert [(item["index"], item["filename"]) for item in items] == [
+        (0, "c.jpg"), (1, "d.jpg"), (2, "field/a.jpg"), (3, "field/b.jpeg")]
+    assert all("className" in item for item in items if item["index"] != 1)
+    assert items[1]["error"] == "Image preprocessing failed"
+    assert done == {"done": True, "total": 4, "failed": 1}
+
+
+def test_predict_batch_rejects_requests_without_images(client):
+    assert client.post("/predict/batch", data={}).status_code == 400
+    response = client.post("/predict/batch", data={"archive": upload(zip_bytes([("a.txt", b"x")]), "a.zip")})
+    assert response.status_code == 400
+
+
+def test_jobs_submit_poll_and_cancel(client):
+    images = jpegs(3, seed=301)
+    response = client.post("/jobs", data={"files": [upload(data, f"{i}.jpg") for i, data in enumerate(images)]})
+    assert response.status_code == 202
+    job_id = response.json["jobId"]
+    assert response.headers["Location"] == f"/jobs/{job_id}"
+    assert (response.json["state"], response.json["total"]) == ("queued", 3)
+
+    results, since = [], 0
+    for _ in range(40):
+        job = client.get(f"/jobs/{job_id}?since={since}&wait=0.5").json
+        results += job["results"]
+        since = job["next"]
+        if job["state"] == "done":
+            break
+    assert job["state"] == "done"
+    assert sorted(r["index"] for r in results) == [0, 1, 2]
+    assert all("className" in r for r in results)
+
+    # Finished jobs can't be cancelled
+    assert client.delete(f"/jobs/{job_id}").status_code == 409
+
+
+def test_jobs_unknown_and_bad_requests(client):
+    assert client.get("/jobs/nope").status_code == 404
+    assert client.delete("/jobs/nope").status_code == 404
+    assert client.post("/jobs", data={}).status_code == 400
+    assert client.get("/jobs/nope?since=x").status_code == 400
+
+
+def test_metrics_exposes_batcher_requests_as_a_counter(client):
+    client.post("/predict", data={"file": upload(jpegs(1, seed=401)[0])})
+    text = client.get("/metrics").get_data(as_text=True)
+    assert "# TYPE tomato_backend_batcher_requests_total counter" in text
+    assert "# TYPE tomato_backend_batcher_queue_depth gauge" in text
+
+
+class BrokenRuntime:
+    def predict(self, batch):
+        raise RuntimeError("weights missing")
+
+
+def test_failed_model_load_is_retried_after_a_backoff(backend, client, monkeypatch):
+    from stubs import StubClassifier
+    monkeypatch.setattr(backend, "startup", {**backend.startup, "state": "not_started", "attempts": 0})
+    monkeypatch.setattr(backend, "model", None)
+
+    assert not backend.init_backend(runtime=BrokenRuntime())
+    assert backend.startup["state"] == "failed"
+    assert client.get("/readyz").status_code == 503
+    assert client.post("/predict", data={"file": upload(b"x")}).status_code == 500
+    # Jobs aren't queued while there is no model to run them
+    assert client.post("/jobs", data={"files": [upload(b"x")]}).status_code == 500
+
+    # Within the backoff nothing is retried
+    assert not backend.init_due()
+    assert not backend.init_backend(runtime=StubClassifier(len(backend.knowledge)))
+
+    backend.startup["retryAt"] = 0
+    assert backend.init_due()
+    assert backend.init_backend(runtime=StubClassifier(len(backend.knowledge)))
+    assert (backend.startup["state"], backend.startup["attempts"]) == ("ready", 2)
+    assert client.get("/readyz").status_code == 200
+
+
+def test_retry_backoff_doubles_up_to_the_cap(backend, monkeypatch):
+    monkeypatch.setattr(backend, "startup", {**backend.startup, "state": "not_started", "attempts": 0})
+    monkeypatch.setattr(backend, "model", None)
+    monkeypatch.setattr(backend, "MODEL_INIT_RETRY_S", 10.0)
+    monkeypatch.setattr(backend, "MODEL_INIT_RETRY_MAX_S", 25.0)
+    delays = []
+    for _ in range(3):
+        backend.startup["retryAt"] = 0
+        started = time.time()
+        backend.init_backend(runtime=BrokenRuntime())
+        delays.append(round(backend.startup["retryAt"] - started))
+    assert delays == [10, 20, 25]
+
+
+def test_jobs_need_a_model_while_loading(backend, client, monkeypatch):
+    monkeypatch.setattr(backend, "startup", {**backend.startup, "state": "loading"})
+    monkeypatch.setattr(backend, "model", None)
+    response = client.post("/jobs", data={"files": [upload(b"x")]})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
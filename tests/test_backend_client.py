@@ -0,0 +1,67 @@
+import pytest
+import requests
+
+from backend_client import BackendClient, BackendUnavailable, CircuitBreaker
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._payload = payload
+
+    def json(self):
+        if self._payload is None:
+            raise ValueError("not JSON")
+        return self._payload
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = BackendClient("http://backend", retries=2, backoff_s=0, image_min_side=0)
+    client.calls = []
+
+    def respond(replies):
+        def request(method, url, **kwargs):
+            client.calls.append(url)
+            reply = replies.pop(0)
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+        monkeypatch.setattr(client.session, "request", request)
+
+    client.respond = respond
+    yield client
+    client.close()
+
+
+def test_connection_failures_are_retried(client):
+    client.respond([requests.ConnectionError("refused"), requests.ConnectTimeout("slow connect"),
+                    FakeResponse(payload={"className": "healthy"})])
+    assert client.predict(b"image") == {"className": "healthy"}
+    assert len(client.calls) == 3
+
+
+def test_read_timeout_is_not_resent(client):
+    client.respond([requests.ReadTimeout("still working"), FakeResponse(payload={})])
+    with pytest.raises(BackendUnavailable, match="did not answer"):
+        client.predict(b"image")
+    assert len(client.calls) == 1
+    assert client.breaker._failures == 1
+
+
+def test_unexpected_errors_do_not_leave_the_probe_stuck():
+    breaker = CircuitBreaker(failure_threshold=1, reset_after_s=0)
+    client = BackendClient("http://backend", retries=0, image_min_side=0, breaker=breaker)
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+
+    def broken(method, url, **kwargs):
+        raise requests.exceptions.InvalidHeader("bad header")
+
+    client.session.request = broken
+    with pytest.raises(requests.exceptions.InvalidHeader):
+        client.predict(b"image")
+    # Another probe may go out instead of the breaker refusing every call forever
+    assert breaker.allow()
+    client.close()
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from backend.batching import BULK, INTERACTIVE, MicroBatcher
+
+SHAPE = (2,)
+
+
+class Recorder:
+    """predict_fn that records each batch's first feature and can be held mid-pass."""
+
+    def __init__(self, hold=False):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+
+    def __call__(self, batch):
+        self.batches.append(batch[:, 0].tolist())
+        self.started.set()
+        self.release.wait(5)
+        return batch * 2.0
+
+
+def image(value):
+    return np.full(SHAPE, value, dtype=np.float32)
+
+
+@pytest.fixture
+def make_batcher():
+    batchers = []
+
+    def make(fn, **kwargs):
+        batcher = MicroBatcher(fn, input_shape=SHAPE, **kwargs)
+        batchers.append(batcher)
+        return batcher
+
+    yield make
+    for batcher in batchers:
+        batcher.stop(timeout=5)
+
+
+def test_full_batch_runs_without_waiting(make_batcher):
+    fn = Recorder()
+    batcher = make_batcher(fn, max_batch_size=4, max_wait_ms=5000)
+    started = time.perf_counter()
+    futures = [batcher.submit(image(i)) for i in range(4)]
+    results = [f.result(timeout=2) for f in futures]
+
+    assert time.perf_counter() - started < 2
+    assert fn.batches == [[0.0, 1.0, 2.0, 3.0]]
+    assert [r[0] for r in results] == [0.0, 2.0, 4.0, 6.0]
+    assert batcher.stats()['batchSizeCounts'] == {'4': 1}
+
+
+def test_partial_batch_waits_for_max_wait(make_batcher):
+    fn = Recorder()
+    batcher = make_batcher(fn, max_batch_size=16, max_wait_ms=50)
+    started = time.perf_counter()
+    result = batcher.predict(image(3), timeout=2)
+
+    assert time.perf_counter() - started >= 0.045
+    assert fn.batches == [[3.0]]
+    assert result.tolist() == [6.0, 6.0]
+
+
+def test_interactive_requests_jump_queued_bulk(make_batcher):
+    fn = Recorder(hold=True)
+    batcher = make_batcher(fn, max_batch_size=3, max_wait_ms=0)
+    first = batcher.submit(image(0), priority=BULK)
+    assert fn.started.wait(2)
+
+    # Queued while the first forward pass is still running
+    bulk = [batcher.submit(image(v), priority=BULK) for v in (1, 2)]
+    interactive = [batcher.submit(image(v), priority=INTERACTIVE) for v in (3, 4)]
+    assert batcher.queue_depth(BULK) == 2
+    fn.release.set()
+    for future in [first, *bulk, *interactive]:
+        future.result(timeout=2)
+
+    assert fn.batches == [[0.0], [3.0, 4.0, 1.0], [2.0]]
+    stats = batcher.stats()
+    assert stats['requestsTotal'] == 5
+    assert stats['bulkRequestsTotal'] == 3
+
+
+def test_errors_reach_every_request_in_the_batch(make_batcher):
+    def fail(batch):
+        raise RuntimeError('forward failed')
+
+    batcher = make_batcher(fail, max_batch_size=2, max_wait_ms=1000)
+    futures = [batcher.submit(image(i)) for i in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match='forward failed'):
+            future.result(timeout=2)
+    assert batcher.stats()['errorsTotal'] == 1
+
+
+def test_submit_rejects_bad_input(make_batcher):
+    batcher = make_batcher(Recorder())
+    with pytest.raises(ValueError):
+        batcher.submit(np.zeros((3,), dtype=np.float32))
+    with pytest.raises(ValueError):
+        batcher.submit(image(1), priority='urgent')
+
+
+def test_short_model_output_fails_the_batch_but_not_the_worker(make_batcher):
+    calls = []
+
+    def drop_last_row(batch):
+        calls.append(len(batch))
+        return batch[:-1] if len(calls) == 1 else batch
+
+    batcher = make_batcher(drop_last_row, max_batch_size=2, max_wait_ms=200)
+    futures = [batcher.submit(image(i)) for i in range(2)]
+    for future in futures:
+        with pytest.raises(ValueError, match='rows for a batch of 2'):
+            future.result(timeout=2)
+
+    # The worker thread survived and serves the next request
+    assert batcher.predict(image(5), timeout=2).tolist() == [5.0, 5.0]
+    assert batcher.stats()['errorsTotal'] == 1
@@ -0,0 +1,120 @@
+from langchain_core.documents import Document
+
+from context_assembly import (assemble_context, count_tokens, drop_near_duplicates, fit_budget, format_docs,
+                              merge_adjacent)
+
+TEXT = ("Late blight is caused by Phytophthora infestans. It spreads in cool, wet weather. "
+        "Lesions start as pale green spots that turn brown. White growth appears under leaves when humid. "
+        "Remove infected plants and apply a protectant fungicide before rain.")
+
+
+def chunk(start, end, source="late-blight.md", text=TEXT):
+    return Document(page_content=text[start:end], metadata={"source": source, "start_index": start})
+
+
+def test_overlapping_chunks_merge_into_the_source_text():
+    retrieved = [(chunk(60, 160), 0.9), (chunk(0, 80), 0.8), (chunk(140, len(TEXT)), 0.7)]
+    passages, merged = merge_adjacent(retrieved)
+
+    assert merged == 2
+    assert len(passages) == 1
+    doc, score = passages[0]
+    assert doc.page_content == TEXT
+    assert score == 0.9
+
+
+def test_touching_chunks_keep_the_separator_between_them():
+    text = "First paragraph about symptoms.\n\nSecond paragraph about management."
+    first = Document(page_content=text[:31], metadata={"source": "a.md", "start_index": 0})
+    second = Document(page_content=text[33:], metadata={"source": "a.md", "start_index": 33})
+    passages, merged = merge_adjacent([(first, 1.0), (second, 0.5)])
+    assert merged == 1
+    assert passages[0][0].page_content == text
+
+
+def test_chunks_of_other_sources_or_far_apart_stay_separate():
+    retrieved = [(chunk(0, 60), 1.0), (chunk(120, 200), 0.9), (chunk(40, 100, source="other.md"), 0.8)]
+    passages, merged = merge_adjacent(retrieved)
+    assert merged == 0
+    assert len(passages) == 3
+
+
+def test_overlap_found_from_text_without_start_index():
+    a = Document(page_content=TEXT[:100], metadata={"source": "late-blight.md"})
+    b = Document(page_content=TEXT[70:180], metadata={"source": "late-blight.md"})
+    passages, merged = merge_adjacent([(a, 1.0), (b, 0.5)])
+    assert merged == 1
+    assert passages[0][0].page_content == TEXT[:180]
+
+
+def test_near_duplicates_keep_the_better_ranked_passage():
+    first = Document(page_content=TEXT, metadata={"source": "a.md"})
+    repeat = Document(page_content=TEXT[:150], metadata={"source": "b.md"})
+    distinct = Document(page_content="Septoria leaf spot makes small circular spots.", metadata={"source": "c.md"})
+    kept, dropped = drop_near_duplicates([(first, 1.0), (repeat, 0.9), (distinct, 0.8)])
+    assert dropped == 1
+    assert [doc.metadata["source"] for doc, _ in kept] == ["a.md", "c.md"]
+
+
+def test_fit_budget_keeps_rank_order_and_trims_the_first_overflow():
+    docs = [(Document(page_content=TEXT, metadata={"source": f"{i}.md"}), 1.0 - i / 10) for i in range(4)]
+    one = count_tokens(format_docs([docs[0][0]])[0])
+    budget = 2 * one + 60
+    kept, trimmed, dropped = fit_budget(docs, budget)
+
+    assert [doc.metadata["source"] for doc, _ in kept] == ["0.md", "1.md", "2.md"]
+    assert (trimmed, dropped) == (1, 1)
+    assert kept[2][0].metadata["trimmed"] is True
+    assert len(kept[2][0].page_content) < len(TEXT)
+    assert count_tokens(format_docs([doc for doc, _ in kept])[0]) <= budget
+
+
+def test_assemble_context_reports_savings():
+    retrieved = [(chunk(0, 120), 0.9), (chunk(100, len(TEXT)), 0.8),
+                 (Document(page_content=TEXT[:150], metadata={"source": "copy.md"}), 0.7)]
+    context = assemble_context(retrieved, budget=10_000)
+
+    assert (context.merged, context.duplicates, context.dropped) == (1, 1, 0)
+    assert [doc.page_content for doc, _ in context.retrieved] == [TEXT]
+    assert context.tokens_out < context.tokens_in
+    assert context.tokens_saved == context.tokens_in - context.tokens_out
+    assert "merged" in context.summary()
+
+
+def test_assemble_context_without_budget_keeps_everything():
+    docs = [(Document(page_content=f"Passage {i} " + "word " * 400, metadata={"source": f"{i}.md"}), 1.0)
+            for i in range(3)]
+    context = assemble_context(docs, budget=None, dedup_threshold=1.1)
+    assert len(context.retrieved) == 3
+    assert context.tokens_in == context.tokens_out
+
+
+def test_stale_offsets_fall_back_to_the_text_overlap():
+    # start_index values from before text was inserted at the top of the file
+    a = Document(page_content=TEXT[:100], metadata={"source": "late-blight.md", "start_index": 0})
+    b = Document(page_content=TEXT[70:180], metadata={"source": "late-blight.md", "start_index": 40})
+    passages, merged = merge_adjacent([(a, 1.0), (b, 0.5)])
+    assert merged == 1
+    assert passages[0][0].page_content == TEXT[:180]
+
+
+def test_stale_offsets_never_stitch_unrelated_chunks():
+    a = Document(page_content=TEXT[:60], metadata={"source": "late-blight.md", "start_index": 0})
+    b = Document(page_content=TEXT[120:200], metadata={"source": "late-blight.md", "start_index": 30})
+    passages, merged = merge_adjacent([(a, 1.0), (b, 0.5)])
+    assert merged == 0
+    assert [doc.page_content for doc, _ in passages] == [TEXT[:60], TEXT[120:200]]
+
+
+def test_ingest_gives_moved_chunks_new_ids():
+    from ingest import split_with_ids
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=120, chunk_overlap=20, add_start_index=True)
+    body = "\n\n".join(f"Paragraph {i}. " + TEXT[:90] for i in range(6))
+    before, before_ids = split_with_ids(splitter, Document(page_content=body, metadata={"source": "a.md"}))
+    after, after_ids = split_with_ids(splitter, Document(page_content="New intro line.\n\n" + body,
+                                                         metadata={"source": "a.md"}))
+    # Unchanged text at a new offset is a new chunk, so no kept chunk carries a stale start_index
+    assert {c.page_content for c in before} & {c.page_content for c in after}
+    assert not set(before_ids) & set(after_ids)
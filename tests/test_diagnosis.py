@@ -0,0 +1,42 @@
+import pytest
+from langchain_core.documents import Document
+
+from diagnosis import diagnose
+from disease_mapping import format_cnn_prediction_for_prompt
+from knowledge_bundle import load_bundle
+from stubs import HashEmbeddings
+
+CHUNKS = [
+    ("late-blight.md", "Late blight: remove infected plants and apply copper before rain."),
+    ("early-blight.md", "Early blight: mulch and remove the lower leaves."),
+    ("septoria-leaf-spot.md", "Septoria leaf spot: avoid overhead watering."),
+]
+
+
+@pytest.fixture(scope="module")
+def vs():
+    from langchain_community.vectorstores import FAISS
+    docs = [Document(page_content=text, metadata={"source": source}) for source, text in CHUNKS]
+    return FAISS.from_documents(docs, HashEmbeddings())
+
+
+def test_detection_goes_into_the_prompt_and_narrows_the_search(vs):
+    def classify(image, filename):
+        return {"className": "Tomato_Late_blight", "confidence": 91.5}
+
+    diagnosis = diagnose(vs, classify, b"image", "leaf.jpg", "what should I do?", 2, bundle=load_bundle())
+    context = format_cnn_prediction_for_prompt("Tomato_Late_blight", 91.5)
+    assert diagnosis.cnn_context == context
+    assert diagnosis.final_question == f"{context}\n\nUser question: what should I do?"
+    assert {doc.metadata["source"] for doc, _ in diagnosis.retrieved} == {"late-blight.md"}
+    assert set(diagnosis.timings_ms) == {"cnn", "retrieval", "narrow", "context"}
+
+
+def test_failed_classification_answers_from_the_question_alone(vs):
+    def classify(image, filename):
+        raise RuntimeError("backend down")
+
+    diagnosis = diagnose(vs, classify, b"image", "leaf.jpg", "", 2, bundle=load_bundle())
+    assert diagnosis.cnn_error == "backend down"
+    assert diagnosis.cnn_context is None
+    assert diagnosis.final_question == diagnosis.question
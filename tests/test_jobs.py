@@ -0,0 +1,153 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from backend import jobs
+from backend.jobs import JobStore
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(tmp_path / "jobs.sqlite")
+
+
+def uploads(n):
+    return [(f"leaf{i}.jpg", f"image-{i}".encode()) for i in range(n)]
+
+
+def test_claim_hands_out_each_image_once_oldest_job_first(store):
+    first = store.create(uploads(3))
+    second = store.create(uploads(2))
+
+    batch = store.claim(4)
+    assert [(job_id, idx) for job_id, idx, _, _ in batch] == [(first, 0), (first, 1), (first, 2), (second, 0)]
+    assert batch[0][2:] == ("leaf0.jpg", b"image-0")
+    assert [(job_id, idx) for job_id, idx, _, _ in store.claim(4)] == [(second, 1)]
+    assert store.claim(4) == []
+    assert store.get(first)["state"] == "running"
+
+
+def test_complete_records_results_and_finishes_the_job(store):
+    job_id = store.create(uploads(2))
+    store.claim(2)
+    store.complete([(job_id, 1, {"className": "B"}), (job_id, 0, {"error": "bad image"})])
+
+    job = store.get(job_id)
+    assert (job["state"], job["completed"], job["failed"], job["pending"]) == ("done", 1, 1, 0)
+    assert job["finishedAt"] is not None
+    assert job["results"] == [
+        {"index": 1, "filename": "leaf1.jpg", "className": "B"},
+        {"index": 0, "filename": "leaf0.jpg", "error": "bad image"},
+    ]
+    assert store.progress(job_id) == ("done", 2)
+
+
+def test_complete_ignores_images_that_were_not_claimed(store):
+    job_id = store.create(uploads(2))
+    store.complete([(job_id, 0, {"className": "A"})])
+    assert store.get(job_id)["completed"] == 0
+
+
+def test_cancel_drops_pending_images(store):
+    job_id = store.create(uploads(3))
+    assert store.cancel(job_id)
+    assert store.claim(3) == []
+    job = store.get(job_id)
+    assert (job["state"], job["pending"]) == ("cancelled", 0)
+    assert not store.cancel(job_id)
+    assert not store.cancel("missing")
+
+
+def test_recover_releases_this_process_claims_on_restart(store):
+    job_id = store.create(uploads(2))
+    store.claim(2)
+    assert store.recover() == 0
+    assert store.recover(include_self=True) == 2
+    assert [idx for _, idx, _, _ in store.claim(2)] == [0, 1]
+    assert store.get(job_id)["state"] == "running"
+
+
+def test_recover_releases_claims_older_than_the_timeout(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite", claim_timeout_s=-1)
+    store.create(uploads(1))
+    store.claim(1)
+    assert store.recover() == 1
+
+
+def test_since_pages_through_results_in_completion_order(store):
+    job_id = store.create(uploads(5))
+    store.claim(5)
+    store.complete([(job_id, idx, {"className": f"C{idx}"}) for idx in (3, 0, 4)])
+
+    page = store.get(job_id, since=0, limit=2)
+    assert [r["index"] for r in page["results"]] == [3, 0]
+    page = store.get(job_id, since=page["next"], limit=2)
+    assert [r["index"] for r in page["results"]] == [4]
+
+    store.complete([(job_id, idx, {"className": f"C{idx}"}) for idx in (2, 1)])
+    page = store.get(job_id, since=page["next"])
+    assert [r["index"] for r in page["results"]] == [2, 1]
+    assert page["state"] == "done"
+    # Nothing new: the cursor stays put
+    assert store.get(job_id, since=page["next"])["results"] == []
+    assert store.get(job_id, since=page["next"])["next"] == page["next"]
+
+
+def test_cancel_lets_in_flight_images_report(store):
+    job_id = store.create(uploads(4))
+    in_flight = store.claim(2)
+    assert store.cancel(job_id)
+
+    store.complete([(job_id, idx, {"className": "A"}) for _, idx, _, _ in in_flight])
+    job = store.get(job_id)
+    assert (job["state"], job["completed"], job["pending"]) == ("cancelled", 2, 0)
+    assert [r["index"] for r in job["results"]] == [0, 1]
+    # The cancelled images are never handed out
+    assert store.claim(4) == []
+    assert store.recover(include_self=True) == 0
+
+
+def test_recover_returns_images_claimed_by_a_dead_process(store):
+    job_id = store.create(uploads(3))
+    # Claim two images from a short-lived child process, which then exits
+    subprocess.run(
+        [sys.executable, "-c", "import sys; from backend.jobs import JobStore; JobStore(sys.argv[1]).claim(2)",
+         str(store.path)],
+        cwd=ROOT, check=True,
+    )
+    live = store.claim(1)
+
+    assert store.recover() == 2
+    assert sorted(idx for _, idx, _, _ in store.claim(3)) == [0, 1]
+    store.complete([(job_id, idx, {"className": "A"}) for idx in (0, 1)] + [(job_id, live[0][1], {"className": "A"})])
+    assert store.get(job_id)["state"] == "done"
+
+
+def test_purge_deletes_only_jobs_finished_before_the_retention(tmp_path, monkeypatch):
+    clock = [1_000_000.0]
+    monkeypatch.setattr(jobs.time, "time", lambda: clock[0])
+    store = JobStore(tmp_path / "jobs.sqlite", retention_s=3600)
+
+    old = store.create(uploads(1))
+    store.claim(1)
+    store.complete([(old, 0, {"className": "A"})])
+    cancelled = store.create(uploads(1))
+    store.cancel(cancelled)
+    clock[0] += 1800
+    recent = store.create(uploads(1))
+    store.claim(1)
+    store.complete([(recent, 0, {"className": "A"})])
+    running = store.create(uploads(2))
+    store.claim(1)
+
+    clock[0] += 1801
+    assert store.purge() == 2
+    assert store.get(old) is None and store.get(cancelled) is None
+    assert store.get(recent)["results"] and store.get(running)["state"] == "running"
+    clock[0] += 3600
+    assert store.purge() == 1
+    assert store.get(running) is not None
@@ -0,0 +1,86 @@
+import sqlite3
+
+import pytest
+
+from backend import prediction_cache as pc
+from backend.prediction_cache import PredictionCache
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(pc.time, 'time', clock)
+    return clock
+
+
+def test_key_depends_on_image_and_model_version():
+    a = PredictionCache('v1')
+    b = PredictionCache('v2')
+    assert a.key(b'img') == a.key(b'img')
+    assert a.key(b'img') != a.key(b'other')
+    assert a.key(b'img') != b.key(b'img')
+
+
+def test_lru_evicts_least_recently_used(clock):
+    cache = PredictionCache('v1', max_entries=2)
+    cache.put('a', {'className': 'A'})
+    cache.put('b', {'className': 'B'})
+    assert cache.get('a') == {'className': 'A'}
+    cache.put('c', {'className': 'C'})
+
+    assert cache.get('b') is None
+    assert cache.get('a') == {'className': 'A'}
+    assert cache.get('c') == {'className': 'C'}
+    assert cache.stats()['entries'] == 2
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = PredictionCache('v1', ttl_s=60)
+    cache.put('a', {'className': 'A'})
+    clock.now += 59
+    assert cache.get('a') is not None
+    clock.now += 2
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_disk_tier_survives_a_restart(tmp_path, clock):
+    path = tmp_path / 'cache.sqlite'
+    PredictionCache('v1', disk_path=path).put('a', {'className': 'A'})
+
+    restarted = PredictionCache('v1', disk_path=path)
+    assert restarted.get('a') == {'className': 'A'}
+    assert restarted.get('a') == {'className': 'A'}
+    stats = restarted.stats()
+    assert (stats['hits'], stats['diskHits']) == (2, 1)
+
+
+def test_disk_tier_drops_other_model_versions(tmp_path, clock):
+    path = tmp_path / 'cache.sqlite'
+    PredictionCache('v1', disk_path=path).put('a', {'className': 'A'})
+
+    assert PredictionCache('v2', disk_path=path).get('a') is None
+    assert sqlite3.connect(str(path)).execute('SELECT COUNT(*) FROM predictions').fetchone()[0] == 0
+
+
+def test_disk_tier_is_pruned_and_capped(tmp_path, clock):
+    path = tmp_path / 'cache.sqlite'
+    cache = PredictionCache('v1', ttl_s=100, disk_path=path, disk_max_entries=3, prune_interval_s=10)
+    cache.put('old', {'n': 0})
+    clock.now += 101
+    for i in range(5):
+        cache.put(f'k{i}', {'n': i})
+        clock.now += 1
+    clock.now += 10
+    cache.put('last', {'n': 5})
+
+    rows = sqlite3.connect(str(path)).execute('SELECT key FROM predictions ORDER BY created').fetchall()
+    assert [key for (key,) in rows] == ['k3', 'k4', 'last']
@@ -0,0 +1,61 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend.preprocessing import BufferPool, ImagePreprocessor
+
+
+def encode(pixels, fmt="JPEG", mode=None):
+    img = Image.fromarray(pixels)
+    if mode:
+        img = img.convert(mode)
+    out = io.BytesIO()
+    img.save(out, format=fmt)
+    return out.getvalue()
+
+
+@pytest.fixture(scope="module")
+def preprocessor():
+    return ImagePreprocessor((32, 32), workers=2)
+
+
+def test_decode_into_resizes_and_scales_to_unit_range(preprocessor):
+    white = np.full((96, 64, 3), 255, dtype=np.uint8)
+    out = np.empty((32, 32, 3), dtype=np.float32)
+    preprocessor.decode_into(encode(white, "PNG"), out)
+    assert np.allclose(out, 1.0)
+
+    black = np.zeros((20, 20, 3), dtype=np.uint8)
+    preprocessor.decode_into(encode(black, "PNG"), out)
+    assert np.allclose(out, -1.0)
+
+
+def test_grayscale_and_large_jpegs_become_rgb(preprocessor):
+    pixels = np.full((640, 480, 3), 128, dtype=np.uint8)
+    out = np.empty((32, 32, 3), dtype=np.float32)
+    preprocessor.decode_into(encode(pixels, mode="L"), out)
+    assert np.allclose(out, 128 / 127.5 - 1.0, atol=0.05)
+
+    # Draft mode downscales during decode but never below the target size
+    img = preprocessor.decode(encode(pixels))
+    assert min(img.size) >= 32 and max(img.size) < 640
+
+
+def test_decode_many_reports_errors_per_image(preprocessor):
+    good = encode(np.zeros((40, 40, 3), dtype=np.uint8))
+    with preprocessor.buffer(3) as buf:
+        errors = preprocessor.decode_many([good, b"not an image", good], buf)
+        assert errors[0] is None and errors[2] is None
+        assert errors[1]
+        assert np.allclose(buf[0], buf[2])
+
+
+def test_buffer_pool_reuses_power_of_two_buffers():
+    pool = BufferPool((2, 2, 3), max_idle_per_bucket=1)
+    buf = pool.acquire(5)
+    assert buf.shape == (8, 2, 2, 3)
+    pool.release(buf)
+    assert pool.acquire(7) is buf
+    assert pool.acquire(7) is not buf
@@ -0,0 +1,99 @@
+import pytest
+
+from knowledge_bundle import load_bundle
+from quick_answers import match_disease, match_intent, quick_answer
+
+
+@pytest.fixture(scope="module")
+def bundle():
+    return load_bundle()
+
+
+@pytest.mark.parametrize("question, slug, section", [
+    ("management for late blight", "late-blight", "management"),
+    ("How do I treat late blight?", "late-blight", "management"),
+    ("symptoms of septoria leaf spot", "septoria-leaf-spot", "symptoms"),
+    ("What conditions favour early blight?", "early-blight", "favorable_conditions"),
+    ("What is late blight?", "late-blight", "overview"),
+    ("Treatment for Phytophthora infestans", "late-blight", "management"),
+])
+def test_plain_lookups_are_answered_from_the_bundle(bundle, question, slug, section):
+    quick = quick_answer(bundle, question)
+    assert quick is not None
+    assert (quick.slug, quick.section) == (slug, section)
+    assert quick.answer.endswith(bundle.section(slug, section))
+    doc, score = quick.retrieved[0]
+    assert doc.metadata == {"source": f"{slug}.md", "section": section}
+
+
+@pytest.mark.parametrize("question, section", [
+    ("how do I treat it?", "management"),
+    ("How do I stop it spreading?", "management"),
+    ("how do I treat my plant?", "management"),
+    ("what causes this?", "favorable_conditions"),
+])
+def test_detected_disease_is_used_when_the_question_points_at_it(bundle, question, section):
+    quick = quick_answer(bundle, question, default_slug="late-blight")
+    assert (quick.slug, quick.section) == ("late-blight", section)
+    assert quick_answer(bundle, question) is None
+
+
+@pytest.mark.parametrize("question", [
+    # Not in the knowledge bundle, or named too loosely to match; never the detected disease
+    "How do I treat spider mites?",
+    "what fungicide controls septoria?",
+    "how to control whiteflies",
+    "symptoms of powdery mildew",
+])
+def test_unknown_diseases_are_not_answered_with_the_detection(bundle, question):
+    assert quick_answer(bundle, question, default_slug="late-blight") is None
+
+
+def test_spread_means_conditions_unless_asking_to_stop_it():
+    assert match_intent("how does late blight spread") == "favorable_conditions"
+    assert match_intent("how to stop late blight spreading") == "management"
+
+
+@pytest.mark.parametrize("question", [
+    # Yes/no questions
+    "Does copper spray cure bacterial spot?",
+    "Is early blight caused by Alternaria solani?",
+    "Are tomatoes with late blight safe to eat?",
+    # Reasoning, comparisons and compound questions
+    "Why does late blight spread so fast?",
+    "Should I spray for early blight now?",
+    "difference between early blight and late blight",
+    "symptoms and management of late blight",
+    # Several diseases, or no section asked for
+    "management for early blight late blight",
+    "late blight",
+    # Too long to be a lookup
+    "what is the best organic way to manage late blight in a small greenhouse during a wet summer",
+])
+def test_other_questions_go_to_rag(bundle, question):
+    assert quick_answer(bundle, question, default_slug="late-blight") is None
+
+
+def test_match_disease_counts_every_named_disease(bundle):
+    assert match_disease(bundle, "late blight") == ("late-blight", 1)
+    assert match_disease(bundle, "early blight or late blight") == (None, 2)
+    assert match_disease(bundle, "my plant") == (None, 0)
+
+
+def test_match_intent_needs_exactly_one_section():
+    assert match_intent("control options") == "management"
+    assert match_intent("symptoms and treatment") is None
+    assert match_intent("tell me about it") == "overview"
+    assert match_intent("hello") is None
+
+
+def test_bundle_text_matches_the_seeded_knowledge_files(bundle):
+    from seed_knowledge import DISEASES, to_markdown
+
+    for d in DISEASES:
+        markdown = to_markdown(d)
+        assert "\\n" not in markdown
+        start, end = bundle.disease(d["slug"])["span"]
+        assert end - start == len(markdown)
+        for name in ("overview", "symptoms", "favorable_conditions", "management", "notes"):
+            assert bundle.section(d["slug"], name) in markdown
@@ -0,0 +1,116 @@
+import faiss
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from keyword_index import KeywordIndex, build_keyword_index
+from rag_pipeline import embed_query, hybrid_retrieve, reciprocal_rank_fusion, source_rows
+from stubs import HashEmbeddings
+from vectorstore_io import DOCSTORE_FILE, load_store, read_index, save_store
+
+CHUNKS = [
+    ("late-blight.md", "Late blight spreads fast in cool wet weather and kills foliage."),
+    ("late-blight.md", "Apply copper fungicide to manage late blight before rain."),
+    ("early-blight.md", "Early blight shows target-like rings on older leaves."),
+    ("early-blight.md", "Copper fungicide sprays also manage early blight lesions."),
+    ("septoria-leaf-spot.md", "Septoria leaf spot makes small circular spots with dark borders."),
+]
+
+
+def test_rrf_sums_reciprocal_ranks():
+    fused = dict(reciprocal_rank_fusion([[1, 2, 3], [3, 1]], k=60))
+    assert fused[1] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[3] == pytest.approx(1 / 63 + 1 / 61)
+    assert fused[2] == pytest.approx(1 / 62)
+
+
+def test_rrf_orders_by_agreement_between_rankings():
+    # 8 is never first but is ranked by every list
+    fused = reciprocal_rank_fusion([[7, 8, 9], [9, 8, 7], [8]])
+    assert fused[0][0] == 8
+    assert fused[1][1] == pytest.approx(fused[2][1])
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    from langchain_community.vectorstores import FAISS
+    store_dir = tmp_path_factory.mktemp("store")
+    embeddings = HashEmbeddings()
+    docs = [Document(page_content=text, metadata={"source": source}) for source, text in CHUNKS]
+    save_store(FAISS.from_documents(docs, embeddings), store_dir)
+    build_keyword_index(store_dir / DOCSTORE_FILE)
+    vs = load_store(store_dir, embeddings, mmap=False)
+    keywords = KeywordIndex.open(store_dir / DOCSTORE_FILE)
+    yield vs, keywords
+    keywords.close()
+
+
+def test_bm25_ranks_matching_chunks_first(store):
+    _, keywords = store
+    rows = [row for row, _ in keywords.search("copper fungicide", 5)]
+    assert set(rows) == {1, 3}
+
+
+def test_bm25_source_filter_keeps_only_that_file(store):
+    vs, keywords = store
+    rows = source_rows(vs, "early-blight.md")
+    assert rows == [2, 3]
+    assert [row for row, _ in keywords.search("copper fungicide", 5, rows)] == [3]
+    assert [row for row, _ in keywords.search("copper fungicide blight", 5, rows)] == [3, 2]
+
+
+def test_hybrid_retrieve_narrowed_to_a_source(store):
+    vs, keywords = store
+    query = "copper fungicide"
+    retrieved = hybrid_retrieve(vs, query, 3, embed_query(vs, query), keyword_index=keywords,
+                                source="late-blight.md")
+    assert retrieved
+    assert {doc.metadata["source"] for doc, _ in retrieved} == {"late-blight.md"}
+    assert "copper" in retrieved[0][0].page_content.lower()
+
+
+def test_hybrid_retrieve_unknown_source_searches_everything(store):
+    vs, keywords = store
+    query = "septoria spots"
+    retrieved = hybrid_retrieve(vs, query, 2, embed_query(vs, query), keyword_index=keywords,
+                                source="missing.md")
+    assert retrieved[0][0].metadata["source"] == "septoria-leaf-spot.md"
+
+
+@pytest.mark.parametrize("factory", ["Flat", "IVF4,Flat", "HNSW8,Flat"])
+def test_read_index_memory_maps_every_index_type(tmp_path, factory, caplog):
+    vectors = np.random.default_rng(0).normal(size=(400, 8)).astype(np.float32)
+    index = faiss.index_factory(8, factory)
+    index.train(vectors)
+    index.add(vectors)
+    faiss.write_index(index, str(tmp_path / "index.faiss"))
+
+    mapped = read_index(tmp_path / "index.faiss")
+    assert "Could not memory-map" not in caplog.text
+    if factory.startswith("IVF"):
+        invlists = faiss.downcast_InvertedLists(faiss.extract_index_ivf(mapped).invlists)
+        assert isinstance(invlists, faiss.OnDiskInvertedLists)
+    assert mapped.search(vectors[:3], 1)[1][:, 0].tolist() == [0, 1, 2]
+
+
+def test_search_knobs_are_per_query_and_leave_the_shared_index_alone():
+    from rag_pipeline import _dense_rows, search_params
+
+    vectors = np.random.default_rng(1).normal(size=(400, 8)).astype(np.float32)
+    ivf = faiss.index_factory(8, "IVF16,Flat")
+    ivf.train(vectors)
+    ivf.add(vectors)
+    hnsw = faiss.index_factory(8, "HNSW8,Flat")
+    hnsw.add(vectors)
+
+    assert search_params(ivf, nprobe=16).nprobe == 16
+    assert search_params(hnsw, ef_search=128).efSearch == 128
+    assert search_params(faiss.IndexFlatL2(8), nprobe=16, ef_search=128) is None
+
+    # Probing every list makes the IVF search exact, without changing the index's own setting
+    flat = faiss.IndexFlatL2(8)
+    flat.add(vectors)
+    assert _dense_rows(ivf, vectors[7], 5, nprobe=16) == _dense_rows(flat, vectors[7], 5)
+    assert faiss.extract_index_ivf(ivf).nprobe == 1
+    _dense_rows(hnsw, vectors[7], 5, ef_search=128)
+    assert hnsw.hnsw.efSearch == 16
@@ -0,0 +1,66 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from backend.runtime import TFLiteRuntime
+
+
+class FakeInterpreter:
+    """Stands in for tflite_runtime's Interpreter: doubles the first feature of each row."""
+
+    created = []
+
+    def __init__(self, model_path, num_threads=None):
+        self.shape = np.array([1, 2])
+        self.allocations = 0
+        self.tensor = None
+        FakeInterpreter.created.append(self)
+
+    def get_input_details(self):
+        return [{'index': 0, 'shape': self.shape, 'dtype': np.float32, 'quantization': (0.0, 0)}]
+
+    def get_output_details(self):
+        return [{'index': 1, 'shape': self.shape, 'dtype': np.float32, 'quantization': (0.0, 0)}]
+
+    def resize_tensor_input(self, index, shape):
+        self.shape = np.array(shape)
+
+    def allocate_tensors(self):
+        self.allocations += 1
+
+    def set_tensor(self, index, value):
+        assert value.shape == tuple(self.shape)
+        self.tensor = value
+
+    def invoke(self):
+        pass
+
+    def get_tensor(self, index):
+        return self.tensor * 2.0
+
+
+@pytest.fixture
+def runtime(monkeypatch):
+    module = types.ModuleType('tflite_runtime.interpreter')
+    module.Interpreter = FakeInterpreter
+    monkeypatch.setitem(sys.modules, 'tflite_runtime', types.ModuleType('tflite_runtime'))
+    monkeypatch.setitem(sys.modules, 'tflite_runtime.interpreter', module)
+    FakeInterpreter.created = []
+    return TFLiteRuntime('model.tflite')
+
+
+def test_batches_are_padded_to_a_bucket_and_sliced_back(runtime):
+    batch = np.arange(10, dtype=np.float32).reshape(5, 2)
+    out = runtime.predict(batch)
+    assert out.shape == (5, 2)
+    assert np.array_equal(out, batch * 2.0)
+    assert [tuple(i.shape) for i in FakeInterpreter.created] == [(1, 2), (8, 2)]
+
+
+def test_changing_batch_sizes_never_reallocate(runtime):
+    for n in (1, 3, 4, 2, 3, 1, 4):
+        runtime.predict(np.ones((n, 2), dtype=np.float32))
+    assert [int(i.shape[0]) for i in FakeInterpreter.created] == [1, 4, 2]
+    assert all(i.allocations == 1 for i in FakeInterpreter.created)
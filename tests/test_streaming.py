@@ -0,0 +1,46 @@
+import time
+
+from context_assembly import count_tokens
+from rag_pipeline import GenerationStats, stream_answer
+
+
+class StreamingService:
+    """Streams a fixed answer in multi-token chunks, pausing between them."""
+
+    def __init__(self, chunks, delay_s=0.01):
+        self.chunks = chunks
+        self.delay_s = delay_s
+
+    def build_rag_chain(self, retriever, system_prompt):
+        service = self
+
+        class Chain:
+            def stream(self, question):
+                for chunk in service.chunks:
+                    time.sleep(service.delay_s)
+                    yield chunk
+                yield ""
+
+        return Chain()
+
+
+def test_tokens_per_s_counts_tokens_not_chunks():
+    chunks = ["Remove infected leaves ", "and apply a copper fungicide ", "before the next rain."]
+    stats = GenerationStats()
+    answer = "".join(stream_answer(StreamingService(chunks), "system", "question", [], stats))
+
+    assert answer == "".join(chunks)
+    assert stats.chunks == 3
+    assert stats.tokens == count_tokens(answer)
+    assert stats.tokens_after_first == stats.tokens - count_tokens(chunks[0])
+    generating_s = (stats.total_ms - stats.ttft_ms) / 1000.0
+    assert abs(stats.tokens_per_s - stats.tokens_after_first / generating_s) < 1e-6
+    # Several tokens arrive per chunk, so the rate is well above chunks/s
+    assert stats.tokens_per_s > (stats.chunks - 1) / generating_s
+
+
+def test_single_chunk_answers_report_no_rate():
+    stats = GenerationStats()
+    list(stream_answer(StreamingService(["All at once."], delay_s=0), "system", "question", [], stats))
+    assert stats.tokens == count_tokens("All at once.")
+    assert stats.tokens_per_s == 0.0